@@ -0,0 +1,41 @@
+"""Keyset pagination indexes
+
+Revision ID: 3f9c2a1d8e47
+Revises: 7585f1246cf1
+Create Date: 2026-10-18 09:12:05.418233
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c2a1d8e47'
+down_revision: Union[str, None] = '7585f1246cf1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Build without blocking writes on large tables (Postgres); CONCURRENTLY
+    # cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        # Catalog pages ordered by (created_at, id)
+        op.create_index(
+            'ix_products_created_at_id', 'products', ['created_at', 'id'],
+            postgresql_concurrently=True
+        )
+
+        # Per-user order history ordered by (created_at, id)
+        op.create_index(
+            'ix_orders_user_id_created_at_id', 'orders', ['user_id', 'created_at', 'id'],
+            postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_orders_user_id_created_at_id', table_name='orders', postgresql_concurrently=True)
+        op.drop_index('ix_products_created_at_id', table_name='products', postgresql_concurrently=True)
@@ -0,0 +1,40 @@
+"""Cart summaries
+
+Revision ID: 5b8f0d3e6a72
+Revises: c9e3f57a2d18
+Create Date: 2026-10-18 23:48:26.157340
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b8f0d3e6a72'
+down_revision: Union[str, None] = 'c9e3f57a2d18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Cart versions grow into summaries with the cart's totals
+    op.rename_table('cart_versions', 'cart_summaries')
+    op.add_column('cart_summaries', sa.Column('item_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('cart_summaries', sa.Column('quantity', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('cart_summaries', sa.Column('total_amount', sa.DECIMAL(12, 2), server_default='0', nullable=False))
+    op.execute(
+        "UPDATE cart_summaries SET "
+        "item_count = (SELECT count(*) FROM carts WHERE carts.user_id = cart_summaries.user_id), "
+        "quantity = (SELECT coalesce(sum(carts.quantity), 0) FROM carts WHERE carts.user_id = cart_summaries.user_id), "
+        "total_amount = (SELECT coalesce(sum(products.price * carts.quantity), 0) FROM carts "
+        "JOIN products ON products.id = carts.product_id WHERE carts.user_id = cart_summaries.user_id)"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('cart_summaries', 'total_amount')
+    op.drop_column('cart_summaries', 'quantity')
+    op.drop_column('cart_summaries', 'item_count')
+    op.rename_table('cart_summaries', 'cart_versions')
@@ -0,0 +1,225 @@
+"""Partitioned orders and order archive
+
+Revision ID: d5e8a3f1c9b2
+Revises: c4a7f19e2b60
+Create Date: 2026-10-18 16:21:40.583117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5e8a3f1c9b2'
+down_revision: Union[str, None] = 'c4a7f19e2b60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Monthly partitions of orders and order_items from first_month through
+# months_ahead months after the current one; existing ones are skipped. Called
+# here and by `python -m app.archive`. Rows for a month without a partition land
+# in the DEFAULT partition; such a month keeps using it (moving rows out would
+# cascade to the order items), so run the job well ahead of time.
+CREATE_PARTITIONS_FUNCTION = """
+CREATE OR REPLACE FUNCTION create_order_partitions(first_month date, months_ahead integer)
+RETURNS integer LANGUAGE plpgsql AS $$
+DECLARE
+    month_start date := date_trunc('month', first_month)::date;
+    last_month date := (date_trunc('month', now()) + make_interval(months => months_ahead))::date;
+    month_end date;
+    parent text;
+    child text;
+    spilled boolean;
+    created integer := 0;
+BEGIN
+    WHILE month_start <= last_month LOOP
+        month_end := (month_start + interval '1 month')::date;
+        FOREACH parent IN ARRAY ARRAY['orders', 'order_items'] LOOP
+            child := parent || '_p' || to_char(month_start, 'YYYYMM');
+            CONTINUE WHEN to_regclass(child) IS NOT NULL;
+            EXECUTE format(
+                'SELECT EXISTS (SELECT 1 FROM %I WHERE created_at >= %L AND created_at < %L)',
+                parent || '_default', month_start, month_end
+            ) INTO spilled;
+            IF spilled THEN
+                RAISE WARNING '% has rows in %_default; partition % not created', month_start, parent, child;
+                CONTINUE;
+            END IF;
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                child, parent, month_start, month_end
+            );
+            created := created + 1;
+        END LOOP;
+        month_start := month_end;
+    END LOOP;
+    RETURN created;
+END
+$$
+"""
+
+
+def create_archive_tables() -> None:
+    # Closed orders moved out by app.archive; read by the order endpoints
+    op.create_table(
+        'orders_archive',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('total_amount', sa.DECIMAL(precision=10, scale=2), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('created_at', sa.TIMESTAMP(), nullable=False),
+        sa.Column('archived_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'ix_orders_archive_user_id_created_at_id', 'orders_archive', ['user_id', 'created_at', 'id']
+    )
+    op.create_table(
+        'order_items_archive',
+        sa.Column('order_id', sa.Integer(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('product_name', sa.String(length=255), nullable=False),
+        sa.Column('product_price', sa.DECIMAL(precision=10, scale=2), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.TIMESTAMP(), nullable=False),
+        sa.ForeignKeyConstraint(['order_id'], ['orders_archive.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('order_id', 'product_id')
+    )
+
+
+def upgrade() -> None:
+    if op.get_context().dialect.name != 'postgresql':
+        with op.batch_alter_table('order_items') as batch:
+            batch.add_column(sa.Column('created_at', sa.TIMESTAMP(), nullable=True))
+        op.execute(
+            "UPDATE order_items SET created_at = "
+            "(SELECT orders.created_at FROM orders WHERE orders.id = order_items.order_id)"
+        )
+        with op.batch_alter_table('order_items') as batch:
+            batch.alter_column('created_at', nullable=False)
+        create_archive_tables()
+        return
+
+    # Rebuilds both tables under an exclusive lock; plan a maintenance window
+    # proportional to the size of orders.
+    op.execute("ALTER TABLE order_items RENAME TO order_items_unpartitioned")
+    op.execute("ALTER INDEX order_items_pkey RENAME TO order_items_unpartitioned_pkey")
+    op.execute("ALTER TABLE orders RENAME TO orders_unpartitioned")
+    op.execute("ALTER INDEX orders_pkey RENAME TO orders_unpartitioned_pkey")
+    op.execute(
+        "ALTER INDEX ix_orders_user_id_created_at_id RENAME TO ix_orders_unpartitioned_user_id_created_at_id"
+    )
+
+    # The partition key must be part of every unique constraint, hence the
+    # (id, created_at) primary key; ids still come from the one sequence
+    op.execute("""
+        CREATE TABLE orders (
+            id INTEGER NOT NULL DEFAULT nextval('orders_id_seq'),
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            total_amount NUMERIC(10, 2) NOT NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'pending',
+            created_at TIMESTAMP NOT NULL DEFAULT now(),
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute("ALTER SEQUENCE orders_id_seq OWNED BY orders.id")
+    op.execute("CREATE INDEX ix_orders_user_id_created_at_id ON orders (user_id, created_at, id)")
+    op.execute("CREATE TABLE orders_default PARTITION OF orders DEFAULT")
+
+    # Items carry their order's created_at so they live in the same month
+    op.execute("""
+        CREATE TABLE order_items (
+            order_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            product_name VARCHAR(255) NOT NULL,
+            product_price NUMERIC(10, 2) NOT NULL,
+            quantity INTEGER NOT NULL,
+            created_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (order_id, product_id, created_at),
+            FOREIGN KEY (order_id, created_at) REFERENCES orders (id, created_at) ON DELETE CASCADE
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute("CREATE TABLE order_items_default PARTITION OF order_items DEFAULT")
+
+    op.execute(CREATE_PARTITIONS_FUNCTION)
+    op.execute(
+        "SELECT create_order_partitions("
+        "COALESCE((SELECT min(created_at) FROM orders_unpartitioned), now())::date, 3)"
+    )
+
+    op.execute("""
+        INSERT INTO orders (id, user_id, total_amount, status, created_at)
+        SELECT id, user_id, total_amount, status, COALESCE(created_at, now())
+        FROM orders_unpartitioned
+    """)
+    op.execute("""
+        INSERT INTO order_items (order_id, product_id, product_name, product_price, quantity, created_at)
+        SELECT i.order_id, i.product_id, i.product_name, i.product_price, i.quantity, o.created_at
+        FROM order_items_unpartitioned i JOIN orders o ON o.id = i.order_id
+    """)
+    op.execute("DROP TABLE order_items_unpartitioned")
+    op.execute("DROP TABLE orders_unpartitioned")
+
+    create_archive_tables()
+
+
+def downgrade() -> None:
+    if op.get_context().dialect.name != 'postgresql':
+        op.drop_table('order_items_archive')
+        op.drop_index('ix_orders_archive_user_id_created_at_id', table_name='orders_archive')
+        op.drop_table('orders_archive')
+        with op.batch_alter_table('order_items') as batch:
+            batch.drop_column('created_at')
+        return
+
+    # Back to plain tables; archived orders return to them
+    op.execute("ALTER TABLE order_items RENAME TO order_items_partitioned")
+    op.execute("ALTER TABLE orders RENAME TO orders_partitioned")
+    op.execute("ALTER INDEX orders_pkey RENAME TO orders_partitioned_pkey")
+    op.execute("ALTER INDEX order_items_pkey RENAME TO order_items_partitioned_pkey")
+    op.execute(
+        "ALTER INDEX ix_orders_user_id_created_at_id RENAME TO ix_orders_partitioned_user_id_created_at_id"
+    )
+    op.execute("""
+        CREATE TABLE orders (
+            id INTEGER NOT NULL DEFAULT nextval('orders_id_seq') PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            total_amount NUMERIC(10, 2) NOT NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT now()
+        )
+    """)
+    op.execute("ALTER SEQUENCE orders_id_seq OWNED BY orders.id")
+    op.execute("CREATE INDEX ix_orders_user_id_created_at_id ON orders (user_id, created_at, id)")
+    op.execute("""
+        CREATE TABLE order_items (
+            order_id INTEGER NOT NULL REFERENCES orders (id) ON DELETE CASCADE,
+            product_id INTEGER NOT NULL,
+            product_name VARCHAR(255) NOT NULL,
+            product_price NUMERIC(10, 2) NOT NULL,
+            quantity INTEGER NOT NULL,
+            PRIMARY KEY (order_id, product_id)
+        )
+    """)
+    op.execute("""
+        INSERT INTO orders (id, user_id, total_amount, status, created_at)
+        SELECT id, user_id, total_amount, status, created_at FROM orders_partitioned
+        UNION ALL
+        SELECT id, user_id, total_amount, status, created_at FROM orders_archive
+    """)
+    op.execute("""
+        INSERT INTO order_items (order_id, product_id, product_name, product_price, quantity)
+        SELECT order_id, product_id, product_name, product_price, quantity FROM order_items_partitioned
+        UNION ALL
+        SELECT order_id, product_id, product_name, product_price, quantity FROM order_items_archive
+    """)
+    op.execute("DROP TABLE order_items_partitioned")
+    op.execute("DROP TABLE orders_partitioned")
+    op.execute("DROP FUNCTION create_order_partitions(date, integer)")
+    op.drop_table('order_items_archive')
+    op.drop_index('ix_orders_archive_user_id_created_at_id', table_name='orders_archive')
+    op.drop_table('orders_archive')
@@ -0,0 +1,44 @@
+"""Outbox events
+
+Revision ID: e1b6c07d4f93
+Revises: d5e8a3f1c9b2
+Create Date: 2026-10-18 17:48:12.306951
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1b6c07d4f93'
+down_revision: Union[str, None] = 'd5e8a3f1c9b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Side effects of order changes, delivered by `python -m app.outbox`
+    op.create_table(
+        'outbox_events',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('topic', sa.String(length=100), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.TIMESTAMP(), nullable=False),
+        sa.Column('available_at', sa.TIMESTAMP(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('failed_at', sa.TIMESTAMP(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    # Only events still to deliver; the table stays small as handled ones are deleted
+    op.create_index(
+        'ix_outbox_events_due', 'outbox_events', ['available_at', 'id'],
+        postgresql_where=sa.text('failed_at IS NULL'), sqlite_where=sa.text('failed_at IS NULL')
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_outbox_events_due', table_name='outbox_events')
+    op.drop_table('outbox_events')
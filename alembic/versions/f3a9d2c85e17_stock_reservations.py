@@ -0,0 +1,49 @@
+"""Product stock and reservations
+
+Revision ID: f3a9d2c85e17
+Revises: e1b6c07d4f93
+Create Date: 2026-10-18 19:05:33.714829
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a9d2c85e17'
+down_revision: Union[str, None] = 'e1b6c07d4f93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Available units per product, optionally split over shard rows; products
+    # without rows keep unlimited stock
+    op.create_table(
+        'product_stock',
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('shard', sa.Integer(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.CheckConstraint('quantity >= 0', name='check_stock_not_negative'),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('product_id', 'shard')
+    )
+    # Stock held by pending orders until they are paid, cancelled or expire
+    op.create_table(
+        'stock_reservations',
+        sa.Column('order_id', sa.Integer(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('shard', sa.Integer(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('expires_at', sa.TIMESTAMP(), nullable=False),
+        sa.PrimaryKeyConstraint('order_id', 'product_id')
+    )
+    op.create_index('ix_stock_reservations_expires_at', 'stock_reservations', ['expires_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_stock_reservations_expires_at', table_name='stock_reservations')
+    op.drop_table('stock_reservations')
+    op.drop_table('product_stock')
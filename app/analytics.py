@@ -0,0 +1,201 @@
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from typing import Iterable, List, Optional
+from sqlalchemy import Date, and_, case, cast, delete, func, insert, select, text, type_coerce, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.archive import CLOSED_STATUSES
+from app.database import AsyncSessionLocal, async_engine, dialect_insert
+from app.models import ArchivedOrder, ArchivedOrderItem, DailySales, Order, OrderItem, ProductSales
+import argparse
+import asyncio
+import os
+import random
+
+# Sales rollups (per day the order was placed and per product) for reporting.
+#
+# Paying or cancelling an order adds it to the rollups in the same
+# transaction (record_sales), so the rollups always match the orders and
+# /admin/analytics never has to aggregate orders or order_items. Orders only
+# ever go pending -> paid or pending -> cancelled, so updates are pure
+# increments. rebuild_rollups recomputes everything with a full scan (live
+# and archived orders): run it once after creating the tables, or to repair.
+
+# Rows per rollup key; more spreads concurrent payments over more row locks
+SALES_ROLLUP_SHARDS = int(os.getenv("SALES_ROLLUP_SHARDS", "4"))
+
+COUNTERS = (
+    "paid_orders", "paid_units", "paid_revenue",
+    "cancelled_orders", "cancelled_units", "cancelled_revenue",
+)
+ORDER_TABLES = ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem))
+
+
+def _add(totals: dict, key, status: str, orders: int, units: int, revenue: Decimal):
+    row = totals.setdefault(key, dict.fromkeys(COUNTERS, 0))
+    row[f"{status}_orders"] += orders
+    row[f"{status}_units"] += units
+    row[f"{status}_revenue"] += revenue
+
+
+async def _increment(db: AsyncSession, model, rows: List[dict], *extra_columns: str):
+    insert_ = dialect_insert(db)
+    stmt = insert_(model)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[column.name for column in model.__table__.primary_key],
+        set_={
+            **{column: getattr(model, column) + getattr(stmt.excluded, column) for column in COUNTERS},
+            **{column: getattr(stmt.excluded, column) for column in extra_columns},
+        },
+    )
+    await db.execute(stmt, rows)
+
+
+async def record_sales(db: AsyncSession, orders: Iterable[Order]):
+    """Add orders just paid or cancelled to the rollups; call before committing."""
+    orders = [order for order in orders if order.status in CLOSED_STATUSES]
+    if not orders:
+        return
+    status = {order.id: order.status for order in orders}
+    items = (await db.execute(
+        select(OrderItem.order_id, OrderItem.product_id, OrderItem.product_name,
+               OrderItem.product_price, OrderItem.quantity)
+        .where(OrderItem.order_id.in_(status), OrderItem.created_at.in_({order.created_at for order in orders}))
+    )).all()
+
+    days, products, units = {}, {}, defaultdict(int)
+    names = {}
+    for item in items:
+        units[item.order_id] += item.quantity
+        names[item.product_id] = item.product_name
+        _add(products, item.product_id, status[item.order_id], 1, item.quantity,
+             item.product_price * item.quantity)
+    for order in orders:
+        _add(days, order.created_at.date(), order.status, 1, units[order.id], order.total_amount)
+
+    # One random shard per transaction; keys in order, so concurrent
+    # transactions lock rows in the same order
+    shard = random.randrange(SALES_ROLLUP_SHARDS)
+    await _increment(db, DailySales, [
+        {"day": day, "shard": shard, **counters} for day, counters in sorted(days.items())
+    ])
+    if products:
+        await _increment(db, ProductSales, [
+            {"product_id": product_id, "shard": shard, "product_name": names[product_id], **counters}
+            for product_id, counters in sorted(products.items())
+        ], "product_name")
+
+
+def day_of(column, dialect: str):
+    # SQLite has no date type: date() gives the ISO text a Date column holds
+    return cast(column, Date) if dialect == "postgresql" else type_coerce(func.date(column), Date)
+
+
+def _sums(status_column, orders, units, revenue) -> list:
+    sums = []
+    for status in CLOSED_STATUSES:
+        for name, value in (("orders", orders), ("units", units), ("revenue", revenue)):
+            sums.append(func.coalesce(func.sum(case((status_column == status, value), else_=0)), 0)
+                        .label(f"{status}_{name}"))
+    return sums
+
+
+def scan_sales_by_day(dialect: str):
+    """The sales_by_day rollup (shard 0) computed from the order tables."""
+    branches = []
+    for order, item in ORDER_TABLES:
+        units = (
+            select(func.coalesce(func.sum(item.quantity), 0))
+            .where(item.order_id == order.id, item.created_at == order.created_at)
+            .scalar_subquery()
+        )
+        branches.append(
+            select(order.created_at, order.status, order.total_amount, units.label("units"))
+            .where(order.status.in_(CLOSED_STATUSES))
+        )
+    orders = union_all(*branches).subquery()
+    day = day_of(orders.c.created_at, dialect)
+    return (
+        select(day.label("day"), *_sums(orders.c.status, 1, orders.c.units, orders.c.total_amount))
+        .group_by(day)
+    )
+
+
+def scan_sales_by_product():
+    """The sales_by_product rollup (shard 0) computed from the order tables."""
+    branches = [
+        select(item.product_id, item.product_name, item.product_price, item.quantity, order.status)
+        .join(order, and_(order.id == item.order_id, order.created_at == item.created_at))
+        .where(order.status.in_(CLOSED_STATUSES))
+        for order, item in ORDER_TABLES
+    ]
+    items = union_all(*branches).subquery()
+    return (
+        select(
+            items.c.product_id, func.max(items.c.product_name).label("product_name"),
+            *_sums(items.c.status, 1, items.c.quantity, items.c.product_price * items.c.quantity),
+        )
+        .group_by(items.c.product_id)
+    )
+
+
+async def rebuild_rollups(db: AsyncSession):
+    """Replace the rollups with a full recount of live and archived orders."""
+    dialect = (await db.connection()).dialect.name
+    if dialect == "postgresql":
+        # Payments and cancellations wait until the recount commits, so none is
+        # counted twice or missed; readers are not blocked
+        await db.execute(text("LOCK TABLE sales_by_day, sales_by_product IN EXCLUSIVE MODE"))
+    await db.execute(delete(DailySales))
+    await db.execute(delete(ProductSales))
+    await db.execute(insert(DailySales).from_select(["day", *COUNTERS], scan_sales_by_day(dialect)))
+    await db.execute(
+        insert(ProductSales).from_select(["product_id", "product_name", *COUNTERS], scan_sales_by_product())
+    )
+    await db.commit()
+
+
+def _summed(model) -> list:
+    return [func.sum(getattr(model, column)).label(column) for column in COUNTERS]
+
+
+async def sales_by_day(db: AsyncSession, since: Optional[date] = None, until: Optional[date] = None):
+    """Daily totals for orders placed in [since, until), oldest day first."""
+    stmt = select(DailySales.day, *_summed(DailySales)).group_by(DailySales.day).order_by(DailySales.day)
+    if since is not None:
+        stmt = stmt.where(DailySales.day >= since)
+    if until is not None:
+        stmt = stmt.where(DailySales.day < until)
+    return (await db.execute(stmt)).all()
+
+
+async def sales_by_product(db: AsyncSession, limit: int):
+    """All-time totals of the limit products with the most paid revenue."""
+    revenue = func.sum(ProductSales.paid_revenue)
+    return (await db.execute(
+        select(ProductSales.product_id, func.max(ProductSales.product_name).label("product_name"),
+               *_summed(ProductSales))
+        .group_by(ProductSales.product_id)
+        .order_by(revenue.desc(), ProductSales.product_id)
+        .limit(limit)
+    )).all()
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the sales rollups behind /admin/analytics.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("rebuild", help="recount the rollups from all orders (after migrating, or to repair)")
+    parser.parse_args(argv)
+
+    try:
+        async with AsyncSessionLocal() as db:
+            await rebuild_rollups(db)
+            days = await db.scalar(select(func.count(func.distinct(DailySales.day))))
+            products = await db.scalar(select(func.count(func.distinct(ProductSales.product_id))))
+        print(f"Rebuilt sales rollups: {days} days, {products} products.")
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.analytics import sales_by_day, sales_by_product
+from app.auth import get_current_admin
+from app.catalog import MEDIA_TYPES, FileFormat, export_products, import_products
+from app.database import get_db
+from app.order_export import OrderStatus, export_orders
+from app.replicas import get_read_db, read_session
+from app.schemas import CatalogImportResponse, DailySalesResponse, ProductSalesResponse
+from dataclasses import asdict
+from datetime import date, datetime
+from typing import List, Optional
+
+router = APIRouter(prefix="/admin", tags=["Admin"], dependencies=[Depends(get_current_admin)])
+
+def download(chunks, fmt: str, name: str) -> StreamingResponse:
+    return StreamingResponse(
+        chunks,
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{fmt}"'},
+    )
+
+@router.post("/products/import", response_model=CatalogImportResponse)
+async def import_catalog(
+    request: Request,
+    fmt: Optional[FileFormat] = Query(None, alias="format"),
+    skip_invalid: bool = False,
+    db: AsyncSession = Depends(get_db)
+):
+    # The body is the file itself, read as it arrives; the format defaults
+    # from the Content-Type
+    if fmt is None:
+        fmt = "ndjson" if "json" in request.headers.get("content-type", "") else "csv"
+    try:
+        result = await import_products(db, request.stream(), fmt, skip_invalid)
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc)
+        )
+    if result.rejected and not skip_invalid:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=asdict(result)
+        )
+    return result
+
+@router.get("/products/export")
+async def export_catalog(fmt: FileFormat = Query("csv", alias="format")):
+    # The session lives as long as the stream, not the request handler
+    async def body():
+        async with read_session() as db:
+            async for chunk in export_products(db, fmt):
+                yield chunk
+
+    return download(body(), fmt, "products")
+
+@router.get("/orders/export")
+async def export_all_orders(
+    fmt: FileFormat = Query("ndjson", alias="format"),
+    user_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    statuses: Optional[List[OrderStatus]] = Query(None, alias="status"),
+):
+    # Every user's orders (or user_id's) created in [since, until)
+    async def body():
+        async with read_session() as db:
+            async for chunk in export_orders(db, fmt, user_id=user_id, since=since, until=until, statuses=statuses):
+                yield chunk
+
+    return download(body(), fmt, "orders")
+
+# Reports read only the sales rollups (app.analytics), never the order tables
+
+@router.get("/analytics/sales-by-day", response_model=List[DailySalesResponse])
+async def get_sales_by_day(
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    # Orders placed on days in [since, until), by their status now
+    return await sales_by_day(db, since, until)
+
+@router.get("/analytics/sales-by-product", response_model=List[ProductSalesResponse])
+async def get_sales_by_product(
+    limit: int = Query(50, ge=1, le=1000),
+    db: AsyncSession = Depends(get_read_db)
+):
+    # All-time totals, best sellers (by paid revenue) first
+    return await sales_by_product(db, limit)
@@ -1,87 +1,181 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models import Cart, Product
-from app.schemas import CartItemCreate, CartResponse, CartItemResponse
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import Numeric, case, cast, delete, func, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import dialect_insert, get_db
+from app.replicas import get_read_db
+from app.models import Cart, CartSummary, Product
+from app.schemas import CartItemCreate, CartItemUpdate, CartResponse, CartItemResponse, CartSummaryResponse
 from app.auth import get_current_user
-from typing import List
+from app.cache import not_modified, validator_headers, version_etag
+from app.carts import lock_cart, refresh_cart
+from typing import Dict, List
 from decimal import Decimal
 
 router = APIRouter(prefix="/cart", tags=["Cart"])
 
+MAX_BULK_ITEMS = 500
+
 @router.post("/items")
-def add_to_cart(item: CartItemCreate, current_user=Depends(get_current_user), db: Session = Depends(get_db)):
-    # Check if product exists
-    product = db.query(Product).filter(Product.id == item.product_id).first()
-    if not product:
+async def add_to_cart(item: CartItemCreate, current_user=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    await lock_cart(db, current_user.id)
+    # Insert or update the line; selecting from products checks the product exists
+    if await upsert_cart_lines(db, current_user.id, {item.product_id: item.quantity}):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found"
         )
-    
-    # Check if item already exists in cart
-    cart_item = db.query(Cart).filter(
-        Cart.user_id == current_user.id,
-        Cart.product_id == item.product_id
-    ).first()
-    
-    if cart_item:
-        # Update quantity
-        cart_item.quantity = item.quantity
-    else:
-        # Create new cart item
-        cart_item = Cart(
-            user_id=current_user.id,
-            product_id=item.product_id,
-            quantity=item.quantity
-        )
-        db.add(cart_item)
-    
-    db.commit()
+    await refresh_cart(db, current_user.id)
+    await db.commit()
     return {"message": "Item added to cart"}
 
 @router.delete("/items/{product_id}")
-def remove_from_cart(product_id: int, current_user=Depends(get_current_user), db: Session = Depends(get_db)):
-    # Find cart item
-    cart_item = db.query(Cart).filter(
-        Cart.user_id == current_user.id,
-        Cart.product_id == product_id
-    ).first()
-    
-    if not cart_item:
+async def remove_from_cart(product_id: int, current_user=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    await lock_cart(db, current_user.id)
+    removed = await db.execute(delete(Cart).where(Cart.user_id == current_user.id, Cart.product_id == product_id))
+    if removed.rowcount == 0:
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Item not found in cart"
         )
-    
-    db.delete(cart_item)
-    db.commit()
+    await refresh_cart(db, current_user.id)
+    await db.commit()
     return {"message": "Item removed from cart"}
 
-@router.get("/", response_model=CartResponse)
-def get_cart(current_user=Depends(get_current_user), db: Session = Depends(get_db)):
-    # Get all cart items for the user
-    cart_items = db.query(Cart).filter(Cart.user_id == current_user.id).all()
-    
-    if not cart_items:
+async def load_cart(db: AsyncSession, user_id: int) -> CartResponse:
+    """Load a user's cart with line and cart totals in a single query."""
+    line_total = Product.price * Cart.quantity
+    rows = (await db.execute(select(
+        Cart.product_id,
+        Product.name.label("product_name"),
+        Product.price.label("product_price"),
+        Cart.quantity,
+        cast(line_total, Numeric(10, 2)).label("total_price"),
+        cast(func.sum(line_total).over(), Numeric(10, 2)).label("total_amount"),
+    ).join(Product, Product.id == Cart.product_id).where(
+        Cart.user_id == user_id
+    ).order_by(Cart.product_id))).all()
+
+    if not rows:
         return CartResponse(items=[], total_amount=Decimal("0.00"))
-    
-    items_response = []
-    total_amount = Decimal("0.00")
-    
-    for cart_item in cart_items:
-        product = db.query(Product).filter(Product.id == cart_item.product_id).first()
-        
-        if product:
-            item_total = product.price * cart_item.quantity
-            total_amount += item_total
-            
-            items_response.append(CartItemResponse(
-                product_id=product.id,
-                product_name=product.name,
-                product_price=product.price,
-                quantity=cart_item.quantity,
-                total_price=item_total
-            ))
-    
-    return CartResponse(items=items_response, total_amount=total_amount)
\ No newline at end of file
+
+    items_response = [
+        CartItemResponse(
+            product_id=row.product_id,
+            product_name=row.product_name,
+            product_price=row.product_price,
+            quantity=row.quantity,
+            total_price=row.total_price
+        )
+        for row in rows
+    ]
+    return CartResponse(items=items_response, total_amount=rows[0].total_amount)
+
+@router.get("/", response_model=CartResponse)
+async def get_cart(
+    request: Request,
+    response: Response,
+    current_user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    # Version first: a change landing between the two reads then makes the
+    # next request's ETag mismatch (a needless 200), never a stale 304
+    stamp = (await db.execute(
+        select(CartSummary.version, CartSummary.updated_at).where(CartSummary.user_id == current_user.id)
+    )).first()
+    version, updated_at = stamp or (0, None)  # never changed: empty
+    headers = validator_headers(version_etag("cart", current_user.id, version), updated_at)
+    if not_modified(request.headers, headers["ETag"], updated_at):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return await load_cart(db, current_user.id)
+
+@router.get("/summary", response_model=CartSummaryResponse)
+async def get_cart_summary(
+    request: Request,
+    response: Response,
+    current_user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    # Count and total for badges: one primary-key read, no cart lines
+    summary = await db.get(CartSummary, current_user.id)
+    if summary is None:  # never changed: empty
+        summary = CartSummary(item_count=0, quantity=0, total_amount=Decimal("0.00"), version=0)
+    headers = validator_headers(version_etag("cart-summary", current_user.id, summary.version), summary.updated_at)
+    if not_modified(request.headers, headers["ETag"], summary.updated_at):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return summary
+
+async def upsert_cart_lines(db: AsyncSession, user_id: int, quantities: Dict[int, int]) -> List[int]:
+    """Insert or update cart lines in one statement.
+
+    Returns the unknown product ids; if there are any, the transaction is
+    rolled back and nothing is written.
+    """
+    insert = dialect_insert(db)
+    # Selecting from products validates the ids in the same statement
+    source = select(
+        literal(user_id),
+        Product.id,
+        case(quantities, value=Product.id),
+    ).where(Product.id.in_(quantities))
+    stmt = insert(Cart).from_select(["user_id", "product_id", "quantity"], source)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Cart.user_id, Cart.product_id],
+        set_={"quantity": stmt.excluded.quantity},
+    ).returning(Cart.product_id)
+    stored = set((await db.scalars(stmt)).all())
+
+    missing = sorted(set(quantities) - stored)
+    if missing:
+        await db.rollback()
+    return missing
+
+def products_not_found(missing: List[int]) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Products not found: {missing}"
+    )
+
+def collect_quantities(items: List[CartItemUpdate]) -> Dict[int, int]:
+    if len(items) > MAX_BULK_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BULK_ITEMS} items per request"
+        )
+    # Later entries for the same product win
+    return {item.product_id: item.quantity for item in items}
+
+@router.put("/", response_model=CartResponse)
+async def replace_cart(items: List[CartItemUpdate], current_user=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    quantities = collect_quantities(items)
+    keep = {product_id: quantity for product_id, quantity in quantities.items() if quantity > 0}
+
+    await lock_cart(db, current_user.id)
+    if keep:
+        missing = await upsert_cart_lines(db, current_user.id, keep)
+        if missing:
+            raise products_not_found(missing)
+    # Drop every line that is not part of the new cart
+    await db.execute(delete(Cart).where(Cart.user_id == current_user.id, Cart.product_id.not_in(keep)))
+    await refresh_cart(db, current_user.id)
+    await db.commit()
+    return await load_cart(db, current_user.id)
+
+@router.patch("/", response_model=CartResponse)
+async def merge_cart(items: List[CartItemUpdate], current_user=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    quantities = collect_quantities(items)
+    upserts = {product_id: quantity for product_id, quantity in quantities.items() if quantity > 0}
+    removals = [product_id for product_id, quantity in quantities.items() if quantity == 0]
+
+    await lock_cart(db, current_user.id)
+    if upserts:
+        missing = await upsert_cart_lines(db, current_user.id, upserts)
+        if missing:
+            raise products_not_found(missing)
+    if removals:
+        await db.execute(delete(Cart).where(Cart.user_id == current_user.id, Cart.product_id.in_(removals)))
+    await refresh_cart(db, current_user.id)
+    await db.commit()
+    return await load_cart(db, current_user.id)
@@ -1,66 +1,139 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, delete, func, insert, literal, select, union_all, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
-from app.models import Cart, Product, Order, OrderItem
+from app.replicas import get_read_db, read_session, wrote_recently
+from app.models import ArchivedOrder, ArchivedOrderItem, Cart, Product, Order, OrderItem
 from app.schemas import OrderResponse, OrderDetailResponse
 from app.auth import get_current_user
-from typing import List
+from app.cache import not_modified, validator_headers, version_etag
+from app.carts import lock_cart
+from app.inventory import consume, release, reserve, shard_count, take_stock
+from app.analytics import record_sales
+from app.outbox import enqueue, order_payload
+from app.idempotency import claim_idempotency_key, request_fingerprint, store_idempotent_response
+from app.pagination import keyset_page, split_page
+from app.catalog import MEDIA_TYPES, FileFormat
+from app.order_export import OrderStatus, export_orders
+from typing import List, Optional
+from datetime import datetime
 from decimal import Decimal
 
 router = APIRouter(prefix="/orders", tags=["Orders"])
 
 @router.post("/", response_model=OrderResponse)
-def create_order(current_user=Depends(get_current_user), db: Session = Depends(get_db)):
-    # Get user's cart items
-    cart_items = db.query(Cart).filter(Cart.user_id == current_user.id).all()
-    
-    if not cart_items:
+async def create_order(
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    current_user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    # Retries with the same Idempotency-Key replay the first response
+    if idempotency_key:
+        replay = await claim_idempotency_key(db, current_user.id, idempotency_key, await request_fingerprint(request))
+        if replay is not None:
+            return replay
+
+    # Lock the user's cart (summary first, as every cart change does) and its
+    # lines; concurrent edits wait for this checkout, so deleting the locked
+    # lines below empties the cart
+    await lock_cart(db, current_user.id, emptying=True)
+    lines = (await db.execute(
+        select(Cart.product_id, Cart.quantity, shard_count(Cart.product_id).label("shards"))
+        .where(Cart.user_id == current_user.id)
+        .order_by(Cart.product_id)
+        .with_for_update(of=Cart)
+    )).all()
+
+    if not lines:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Cart is empty"
         )
-    
-    # Calculate total amount
-    total_amount = Decimal("0.00")
-    for cart_item in cart_items:
-        product = db.query(Product).filter(Product.id == cart_item.product_id).first()
-        if product:
-            total_amount += product.price * cart_item.quantity
-    
-    # Create order
+
+    locked_ids = [line.product_id for line in lines]
+    locked_lines = and_(Cart.user_id == current_user.id, Cart.product_id.in_(locked_ids))
+
+    # Take stock for tracked products up front; all lines fit or none are taken
+    tracked = {line.product_id: line.shards for line in lines if line.shards}
+    taken = await take_stock(db, current_user.id, tracked) if tracked else {}
+    short = sorted(set(tracked) - set(taken))
+    if short:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Insufficient stock for products: {short}"
+        )
+
+    # Create order; the total is filled in from the item snapshot below
     order = Order(
         user_id=current_user.id,
-        total_amount=total_amount,
+        total_amount=Decimal("0.00"),
         status="pending"
     )
     db.add(order)
-    db.flush()  # Get the order ID without committing
-    
-    # Create order items and copy product data
-    for cart_item in cart_items:
-        product = db.query(Product).filter(Product.id == cart_item.product_id).first()
-        if product:
-            order_item = OrderItem(
-                order_id=order.id,
-                product_id=product.id,
-                product_name=product.name,
-                product_price=product.price,
-                quantity=cart_item.quantity
-            )
-            db.add(order_item)
-    
-    # Clear user's cart
-    db.query(Cart).filter(Cart.user_id == current_user.id).delete()
-    
-    db.commit()
-    
-    # Refresh to get the created order with ID
-    db.refresh(order)
+    await db.flush()  # Get the order ID and created_at without committing
+
+    # Snapshot product data for every locked line in one statement
+    snapshot = await db.execute(
+        insert(OrderItem).from_select(
+            ["order_id", "product_id", "product_name", "product_price", "quantity", "created_at"],
+            select(
+                literal(order.id), Product.id, Product.name, Product.price, Cart.quantity,
+                literal(order.created_at, OrderItem.created_at.type)
+            ).join(Product, Product.id == Cart.product_id).where(locked_lines)
+        )
+    )
+    if snapshot.rowcount == 0:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cart is empty"
+        )
+
+    if taken:
+        await reserve(db, order.id, taken, {line.product_id: line.quantity for line in lines})
+
+    order_total = select(
+        func.sum(OrderItem.product_price * OrderItem.quantity)
+    ).where(OrderItem.order_id == order.id).scalar_subquery()
+    order = (await db.scalars(
+        update(Order)
+        .where(Order.id == order.id)
+        .values(total_amount=order_total)
+        .returning(Order)
+        .execution_options(populate_existing=True)
+    )).one()
+
+    # Clear the checked-out lines from the user's cart
+    await db.execute(delete(Cart).where(locked_lines))
+
+    # Follow-up work runs in the outbox worker, committed with the order
+    enqueue(db, "order.created", order_payload(order))
+
+    if idempotency_key:
+        await store_idempotent_response(db, current_user.id, idempotency_key, OrderResponse.model_validate(order))
+    await db.commit()
     return order
 
 @router.post("/{order_id}/pay", response_model=OrderResponse)
-def pay_order(order_id: int, current_user=Depends(get_current_user), db: Session = Depends(get_db)):
-    order = db.query(Order).filter(Order.id == order_id, Order.user_id == current_user.id).first()
+async def pay_order(
+    order_id: int,
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    current_user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    if idempotency_key:
+        replay = await claim_idempotency_key(db, current_user.id, idempotency_key, await request_fingerprint(request))
+        if replay is not None:
+            return replay
+
+    # Row lock: a concurrent cancel or reservation expiry waits for this payment
+    order = await db.scalar(
+        select(Order).where(Order.id == order_id, Order.user_id == current_user.id).with_for_update()
+    )
     
     if not order:
         raise HTTPException(
@@ -76,14 +149,21 @@ def pay_order(order_id: int, current_user=Depends(get_current_user), db: Session
     
     # Mock payment - just update status
     order.status = "paid"
-    db.commit()
-    db.refresh(order)
+    await consume(db, order.id)
+    await record_sales(db, [order])
+    enqueue(db, "order.paid", order_payload(order))
+    if idempotency_key:
+        await store_idempotent_response(db, current_user.id, idempotency_key, OrderResponse.model_validate(order))
+    await db.commit()
+    await db.refresh(order)
     
     return order
 
 @router.post("/{order_id}/cancel", response_model=OrderResponse)
-def cancel_order(order_id: int, current_user=Depends(get_current_user), db: Session = Depends(get_db)):
-    order = db.query(Order).filter(Order.id == order_id, Order.user_id == current_user.id).first()
+async def cancel_order(order_id: int, current_user=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    order = await db.scalar(
+        select(Order).where(Order.id == order_id, Order.user_id == current_user.id).with_for_update()
+    )
     
     if not order:
         raise HTTPException(
@@ -98,23 +178,70 @@ def cancel_order(order_id: int, current_user=Depends(get_current_user), db: Sess
         )
     
     order.status = "cancelled"
-    db.commit()
-    db.refresh(order)
+    await release(db, [order.id])
+    await record_sales(db, [order])
+    enqueue(db, "order.cancelled", order_payload(order))
+    await db.commit()
+    await db.refresh(order)
     
     return order
 
+@router.get("/export")
+async def export_my_orders(
+    fmt: FileFormat = Query("ndjson", alias="format"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    statuses: Optional[List[OrderStatus]] = Query(None, alias="status"),
+    current_user=Depends(get_current_user)
+):
+    # The whole history created in [since, until), streamed oldest first with
+    # items; unlike GET /orders nothing is paged or held in memory
+    primary = await wrote_recently(current_user.email)
+
+    async def body():
+        async with read_session(primary=primary) as db:
+            async for chunk in export_orders(
+                db, fmt, user_id=current_user.id, since=since, until=until, statuses=statuses
+            ):
+                yield chunk
+
+    return StreamingResponse(
+        body(),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="orders.{fmt}"'},
+    )
+
 @router.get("/{order_id}", response_model=OrderDetailResponse)
-def get_order(order_id: int, current_user=Depends(get_current_user), db: Session = Depends(get_db)):
-    order = db.query(Order).filter(Order.id == order_id, Order.user_id == current_user.id).first()
-    
+async def get_order(
+    order_id: int,
+    request: Request,
+    response: Response,
+    current_user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    order = await db.scalar(select(Order).where(Order.id == order_id, Order.user_id == current_user.id))
+    item_model = OrderItem
+    if not order:
+        # Closed orders move to the archive after ORDER_ARCHIVE_AFTER_DAYS
+        order = await db.scalar(
+            select(ArchivedOrder).where(ArchivedOrder.id == order_id, ArchivedOrder.user_id == current_user.id)
+        )
+        item_model = ArchivedOrderItem
+
     if not order:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Order not found"
         )
-    
+
+    # Unchanged since the client's copy: answer before loading the items
+    headers = validator_headers(version_etag("order", order.id, order.version), order.updated_at)
+    if not_modified(request.headers, headers["ETag"], order.updated_at):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+
     # Get order items
-    order_items = db.query(OrderItem).filter(OrderItem.order_id == order_id).all()
+    order_items = (await db.scalars(select(item_model).where(item_model.order_id == order_id))).all()
     
     return OrderDetailResponse(
         id=order.id,
@@ -126,6 +253,26 @@ def get_order(order_id: int, current_user=Depends(get_current_user), db: Session
     )
 
 @router.get("/", response_model=List[OrderResponse])
-def get_orders(current_user=Depends(get_current_user), db: Session = Depends(get_db)):
-    orders = db.query(Order).filter(Order.user_id == current_user.id).all()
+async def get_orders(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    current_user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    # Newest first; the next page's cursor is returned in the X-Next-Cursor header.
+    # One page from the live and the archived orders each, merged
+    pages = [
+        select(keyset_page(
+            select(model.id, model.user_id, model.total_amount, model.status, model.created_at)
+            .where(model.user_id == current_user.id),
+            model, cursor, limit, descending=True
+        ).subquery())
+        for model in (Order, ArchivedOrder)
+    ]
+    merged = union_all(*pages).subquery()
+    stmt = select(merged).order_by(merged.c.created_at.desc(), merged.c.id.desc()).limit(limit + 1)
+    orders, next_cursor = split_page((await db.execute(stmt)).all(), limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return orders
\ No newline at end of file
@@ -1,13 +1,113 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from pydantic import TypeAdapter
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, object_session
+from app.cache import REDIS_URL, VersionedCache, etag_matches, get_backend, make_etag
+from app.compression import compress, negotiate
 from app.models import Product
+from app.pagination import encode_key, keyset_page, split_page
+from app.replicas import READ_YOUR_WRITES_SECONDS, get_read_db, read_session
+from app.search import decode_search_cursor, search_statement, search_terms
 from app.schemas import ProductResponse, ProductCreate
-from typing import List
+from typing import List, Optional
+import os
+import time
 
 router = APIRouter(prefix="/products", tags=["Products"])
 
+# Rendered catalog pages; dropped whenever products change in this process,
+# and in every worker when REDIS_URL is set (the change publishes a new
+# generation there, checked on each request)
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "60"))
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", "256"))
+catalog_cache = VersionedCache(
+    maxsize=CATALOG_CACHE_SIZE,
+    ttl=CATALOG_CACHE_TTL,
+    shared=get_backend("catalog", ttl=CATALOG_CACHE_TTL) if REDIS_URL else None,
+)
+
+product_list = TypeAdapter(List[ProductResponse])
+
+@event.listens_for(Product, "after_insert")
+@event.listens_for(Product, "after_update")
+@event.listens_for(Product, "after_delete")
+def _track_catalog_change(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info["catalog_changed"] = True
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_catalog(session):
+    if session.info.pop("catalog_changed", False):
+        catalog_cache.invalidate()
+
+@event.listens_for(Session, "after_rollback")
+def _discard_catalog_change(session):
+    session.info.pop("catalog_changed", None)
+
+async def render_catalog_page(cursor: Optional[str], skip: int, limit: int):
+    """Query and serialize one catalog page.
+
+    Returns (body, etag, next_cursor, encoded); encoded collects the page's
+    compressed variants by encoding as clients ask for them.
+    """
+    stmt = keyset_page(select(Product), Product, cursor, limit)
+    if skip:
+        stmt = stmt.offset(skip)
+    # Right after a catalog change replicas may not have it yet; caching their
+    # view would serve the old catalog for the whole TTL
+    recently_changed = time.monotonic() - catalog_cache.invalidated_at < READ_YOUR_WRITES_SECONDS
+    async with read_session(primary=recently_changed) as db:
+        products, next_cursor = split_page((await db.scalars(stmt)).all(), limit)
+        body = product_list.dump_json(product_list.validate_python(products, from_attributes=True))
+    return body, make_etag(body), next_cursor, {}
+
 @router.get("/", response_model=List[ProductResponse])
-def get_products(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    products = db.query(Product).offset(skip).limit(limit).all()
-    return products
\ No newline at end of file
+async def get_products(
+    request: Request,
+    cursor: Optional[str] = None,
+    skip: int = Query(0, ge=0, description="Deprecated offset paging; use cursor"),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    # Pages are keyed by (created_at, id); the next page's cursor is returned in
+    # the X-Next-Cursor header
+    await catalog_cache.sync()
+    body, etag, next_cursor, encoded = await catalog_cache.get_or_load(
+        (cursor, skip, limit), lambda: render_catalog_page(cursor, skip, limit)
+    )
+    # Compressed once per cached page, not by the middleware on every hit;
+    # each encoding is its own representation with its own strong ETag
+    encoding = negotiate(request.headers.get("accept-encoding", ""), len(body))
+    if encoding is not None:
+        if encoding not in encoded:
+            encoded[encoding] = compress(body, encoding)
+        body, etag = encoded[encoding], f'{etag[:-1]}-{encoding}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.get("/search", response_model=List[ProductResponse])
+async def search_products(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db)
+):
+    # Every term matches as a prefix; best matches first, paged by (rank, id)
+    terms = search_terms(q)
+    if not terms:
+        return []
+
+    after = decode_search_cursor(cursor) if cursor else None
+    rows = (await db.execute(search_statement(db.bind.dialect.name, terms, after, limit))).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = encode_key(rows[-1].rank, rows[-1].Product.id)
+    return [row.Product for row in rows]
@@ -0,0 +1,139 @@
+from datetime import date, datetime, timedelta
+from typing import List
+from sqlalchemy import delete, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import AsyncSessionLocal, async_engine
+from app.models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+import asyncio
+import os
+import re
+
+# Order storage maintenance; run periodically (e.g. daily from cron).
+#
+# On Postgres, orders and order_items are partitioned by month of the order's
+# created_at (see the partitioned_orders migration). Each run creates the
+# partitions for the coming months, moves closed orders older than
+# ORDER_ARCHIVE_AFTER_DAYS to orders_archive/order_items_archive, and drops
+# old partitions left empty. On SQLite only the archiving applies.
+
+ORDER_ARCHIVE_AFTER_DAYS = float(os.getenv("ORDER_ARCHIVE_AFTER_DAYS", "365"))
+ORDER_ARCHIVE_BATCH = int(os.getenv("ORDER_ARCHIVE_BATCH", "1000"))
+# Months of partitions kept ready ahead of the current one
+ORDER_PARTITION_MONTHS_AHEAD = int(os.getenv("ORDER_PARTITION_MONTHS_AHEAD", "3"))
+
+CLOSED_STATUSES = ("paid", "cancelled")
+PARTITIONED_TABLES = ("order_items", "orders")  # referencing table first
+PARTITION_NAME = re.compile(r"^(orders|order_items)_p(\d{4})(\d{2})$")
+
+ORDER_COLUMNS = ["id", "user_id", "total_amount", "status", "created_at", "version", "updated_at"]
+ITEM_COLUMNS = ["order_id", "product_id", "product_name", "product_price", "quantity", "created_at"]
+
+
+def _month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def _next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+async def create_partitions(db: AsyncSession, months_ahead: int = ORDER_PARTITION_MONTHS_AHEAD) -> int:
+    """Create the monthly partitions up to months_ahead; returns how many were new."""
+    created = await db.scalar(
+        text("SELECT create_order_partitions(CAST(:first_month AS date), :months_ahead)"),
+        {"first_month": _month_start(datetime.utcnow()), "months_ahead": months_ahead},
+    )
+    await db.commit()
+    return created
+
+
+async def archive_closed_orders(
+    db: AsyncSession,
+    older_than: timedelta = timedelta(days=ORDER_ARCHIVE_AFTER_DAYS),
+    batch_size: int = ORDER_ARCHIVE_BATCH,
+) -> int:
+    """Move paid and cancelled orders created before now - older_than to the archive.
+
+    Each batch is its own transaction, so locks stay short and an interrupted
+    run loses nothing; the next run continues where it stopped.
+    """
+    cutoff = datetime.utcnow() - older_than
+    moved = 0
+    while True:
+        # The created_at bound lets Postgres prune to the old partitions
+        ids = (await db.scalars(
+            select(Order.id)
+            .where(Order.status.in_(CLOSED_STATUSES), Order.created_at < cutoff)
+            .order_by(Order.created_at, Order.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )).all()
+        if not ids:
+            return moved
+
+        orders = (Order.id.in_(ids), Order.created_at < cutoff)
+        items = (OrderItem.order_id.in_(ids), OrderItem.created_at < cutoff)
+        await db.execute(insert(ArchivedOrder).from_select(
+            ORDER_COLUMNS, select(*(getattr(Order, name) for name in ORDER_COLUMNS)).where(*orders)
+        ))
+        await db.execute(insert(ArchivedOrderItem).from_select(
+            ITEM_COLUMNS, select(*(getattr(OrderItem, name) for name in ITEM_COLUMNS)).where(*items)
+        ))
+        await db.execute(delete(OrderItem).where(*items))
+        await db.execute(delete(Order).where(*orders))
+        await db.commit()
+        moved += len(ids)
+
+
+async def drop_empty_partitions(db: AsyncSession, before: datetime) -> List[str]:
+    """Detach and drop monthly partitions ending before `before` that hold no rows."""
+    names = (await db.scalars(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "WHERE parent.relname IN ('orders', 'order_items')"
+    ))).all()
+    months = set()
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            month = date(int(match[2]), int(match[3]), 1)
+            if _next_month(month) <= before.date():
+                months.add(month)
+
+    dropped = []
+    for month in sorted(months):
+        suffix = month.strftime("_p%Y%m")
+        # Items reference their order, so an empty orders partition means
+        # the matching order_items partition is empty too
+        if await db.scalar(text(f'SELECT EXISTS (SELECT 1 FROM "orders{suffix}")')):
+            continue
+        for table in PARTITIONED_TABLES:
+            if table + suffix in names:
+                await db.execute(text(f'ALTER TABLE "{table}" DETACH PARTITION "{table}{suffix}"'))
+                await db.execute(text(f'DROP TABLE "{table}{suffix}"'))
+                dropped.append(table + suffix)
+        await db.commit()
+    return dropped
+
+
+async def maintain():
+    partitioned = async_engine.dialect.name == "postgresql"
+    try:
+        async with AsyncSessionLocal() as db:
+            if partitioned:
+                created = await create_partitions(db)
+                print(f"Created {created} order partitions.")
+            moved = await archive_closed_orders(db)
+            print(f"Archived {moved} closed orders.")
+            if partitioned:
+                # Whole months before the archive cutoff hold only open orders by now
+                cutoff = datetime.utcnow() - timedelta(days=ORDER_ARCHIVE_AFTER_DAYS)
+                dropped = await drop_empty_partitions(db, cutoff)
+                print(f"Dropped {len(dropped)} empty partitions.")
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(maintain())
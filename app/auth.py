@@ -1,36 +1,108 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, object_session
+from app.cache import LocalBackend, TTLCache, get_backend
 from app.database import get_db
 from app.models import User
 from app.schemas import TokenData
+import asyncio
 import os
+import time
 
 # Secret key for JWT (in production, use a strong secret from environment)
 SECRET_KEY = os.getenv("SECRET_KEY", "your-super-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing context; hashes made with a different cost are upgraded on login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+# bcrypt worker pool: size and how many calls may wait before shedding load
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "32"))
 
 # Security scheme for API
 security = HTTPBearer()
 
+# Authenticated-principal cache (shared across workers when REDIS_URL is set)
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+principal_cache = get_backend("principal", maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+
+# Verified token claims, memoized until the token expires
+token_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE)
+
+# Users allowed to call the /admin endpoints (comma-separated emails)
+ADMIN_EMAILS = frozenset(
+    email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()
+)
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated user as seen by request handlers."""
+    id: int
+    email: str
+
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password):
     return pwd_context.hash(password)
 
-def authenticate_user(db: Session, email: str, password: str):
-    user = db.query(User).filter(User.email == email).first()
-    if not user or not verify_password(password, user.password_hash):
+class PasswordHasher:
+    """Runs bcrypt on a dedicated, bounded thread pool.
+
+    bcrypt releases the GIL, so threads hash in parallel without blocking the
+    event loop. Once every worker is busy and the queue is full, callers get
+    a fast 503 instead of waiting behind the backlog.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_queue: int = PASSWORD_HASH_QUEUE):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self.limit = workers + max_queue
+        self.in_flight = 0
+
+    async def run(self, func, *args):
+        if self.in_flight >= self.limit:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication is busy, retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.in_flight -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self.run(get_password_hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str):
+        return await self.run(pwd_context.verify_and_update, password, hashed_password)
+
+password_hasher = PasswordHasher()
+
+async def authenticate_user(db: AsyncSession, email: str, password: str):
+    user = await db.scalar(select(User).where(User.email == email))
+    if not user:
         return False
+    valid, new_hash = await password_hasher.verify_and_update(password, user.password_hash)
+    if not valid:
+        return False
+    if new_hash:
+        # Cost factor changed since this hash was made; upgrade it transparently
+        user.password_hash = new_hash
+        await db.commit()
     return user
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -43,10 +115,48 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
+def decode_token(token: str) -> dict:
+    """Verify a JWT, reusing the result for repeat requests until it expires."""
+    claims = token_cache.get(token)
+    if claims is None:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        token_cache.set(token, claims, ttl=claims.get("exp", 0) - time.time())
+    return claims
+
+async def invalidate_principal(email: str):
+    await principal_cache.delete(email)
+
+_pending_invalidations = set()
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _track_changed_user(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        changed = session.info.setdefault("changed_principals", set())
+        changed.update({target.email, *inspect(target).attrs.email.history.deleted})
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session):
+    for email in session.info.pop("changed_principals", ()):
+        if isinstance(principal_cache, LocalBackend):
+            principal_cache.cache.delete(email)
+            continue
+        try:
+            task = asyncio.get_running_loop().create_task(invalidate_principal(email))
+        except RuntimeError:
+            continue  # no event loop (scripts); the shared TTL bounds staleness
+        _pending_invalidations.add(task)
+        task.add_done_callback(_pending_invalidations.discard)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_users(session):
+    session.info.pop("changed_principals", None)
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: AsyncSession = Depends(get_db)):
     token = credentials.credentials
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token)
         email: str = payload.get("sub")
         if email is None:
             raise HTTPException(
@@ -55,18 +165,34 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
                 headers={"WWW-Authenticate": "Bearer"},
             )
         token_data = TokenData(email=email)
+        # Lets commits on this session mark the user for read-your-writes
+        db.info["principal_email"] = email
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
-    user = db.query(User).filter(User.email == token_data.email).first()
+
+    cached = await principal_cache.get(token_data.email)
+    if cached is not None:
+        return Principal(**cached)
+
+    user = await db.scalar(select(User).where(User.email == token_data.email))
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    return user
\ No newline at end of file
+    principal = Principal(id=user.id, email=user.email)
+    await principal_cache.set(principal.email, asdict(principal))
+    return principal
+
+async def get_current_admin(user: Principal = Depends(get_current_user)) -> Principal:
+    if user.email.lower() not in ADMIN_EMAILS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    return user
@@ -0,0 +1,237 @@
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Hashable, Mapping, Optional
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+# Optional shared cache (Redis protocol); unset means in-process only
+REDIS_URL = os.getenv("REDIS_URL")
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire after a time-to-live."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0, timer=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+            value, expires_at = item
+            if expires_at <= self.timer():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, self.timer() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class VersionedCache:
+    """In-process cache of rendered values, dropped wholesale on invalidate().
+
+    Fills are single-flight: concurrent misses for the same key share one
+    loader call instead of each running their own query. With a shared
+    backend, invalidate() also publishes a new generation there, and sync()
+    drops the entries of every other process that sees it.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 60.0, shared=None):
+        self.version = 0
+        self.invalidated_at = float("-inf")
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._inflight = {}
+        self.shared = shared
+        self.generation = None
+        self._publishing = set()
+
+    def invalidate(self, publish: bool = True):
+        self.version += 1
+        self.invalidated_at = time.monotonic()
+        self.entries.clear()
+        if not publish or self.shared is None:
+            return
+        self.generation = uuid.uuid4().hex
+        try:
+            # Entries live for the TTL, so the generation need not outlive them
+            task = asyncio.get_running_loop().create_task(
+                self.shared.set("generation", self.generation, ttl=self.entries.ttl)
+            )
+        except RuntimeError:
+            return  # no event loop (scripts); the TTL bounds staleness
+        self._publishing.add(task)
+        task.add_done_callback(self._publishing.discard)
+
+    async def sync(self):
+        """Drop the entries if another process invalidated since the last call."""
+        if self.shared is None:
+            return
+        generation = await self.shared.get("generation")
+        if generation is not None and generation != self.generation:
+            self.generation = generation
+            self.invalidate(publish=False)
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]):
+        versioned_key = (self.version, key)
+        value = self.entries.get(versioned_key)
+        if value is not None:
+            return value
+
+        task = self._inflight.get(versioned_key)
+        if task is None:
+            task = asyncio.ensure_future(loader())
+            self._inflight[versioned_key] = task
+            task.add_done_callback(lambda done: self._filled(versioned_key, done))
+        # shield: a cancelled caller must not cancel the fill others wait on
+        return await asyncio.shield(task)
+
+    def _filled(self, versioned_key, task):
+        self._inflight.pop(versioned_key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        # Results loaded before an invalidation are stale; don't store them
+        if versioned_key[0] == self.version:
+            self.entries.set(versioned_key, task.result())
+
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag derived from the response body."""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match comparison (weak, per RFC 9110)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+
+def version_etag(*parts) -> str:
+    """Strong ETag from a row version, without rendering the body."""
+    return '"' + "-".join(str(part) for part in parts) + '"'
+
+
+def http_date(value: datetime) -> str:
+    """IMF-fixdate for a naive UTC timestamp (Last-Modified)."""
+    return format_datetime(value.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+
+def validator_headers(etag: str, last_modified: Optional[datetime]) -> dict:
+    # private: per-user resources; no-cache: clients revalidate every time
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def not_modified(request_headers: Mapping[str, str], etag: str, last_modified: Optional[datetime]) -> bool:
+    """Whether a conditional GET can be answered 304 (RFC 9110 13.2.2).
+
+    If-None-Match decides when present; If-Modified-Since is only consulted
+    without it, at the header's one-second resolution.
+    """
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = request_headers.get("if-modified-since")
+    if not if_modified_since or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False  # an invalid date is ignored
+    if since.tzinfo is None:
+        return False
+    return last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= since
+
+
+class LocalBackend:
+    """In-process async cache backend on top of TTLCache."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def get(self, key: str) -> Optional[Any]:
+        return self.cache.get(key)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self.cache.set(key, value, ttl)
+
+    async def delete(self, key: str):
+        self.cache.delete(key)
+
+    async def clear(self):
+        self.cache.clear()
+
+
+class RedisBackend:
+    """Shared async cache backend speaking the Redis protocol; values are JSON."""
+
+    def __init__(self, client, prefix: str = "lampshades:", ttl: float = 60.0):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs):
+        import redis.asyncio as redis  # optional dependency
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self.client.get(self.prefix + key)
+        return None if raw is None else json.loads(raw)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        await self.client.set(self.prefix + key, json.dumps(value), px=max(1, int(ttl * 1000)))
+
+    async def delete(self, key: str):
+        await self.client.delete(self.prefix + key)
+
+    async def clear(self):
+        keys = [key async for key in self.client.scan_iter(match=self.prefix + "*")]
+        if keys:
+            await self.client.delete(*keys)
+
+
+def get_backend(prefix: str, maxsize: int = 1024, ttl: float = 60.0):
+    """Shared backend when REDIS_URL is configured, otherwise in-process."""
+    if REDIS_URL:
+        return RedisBackend.from_url(REDIS_URL, prefix=f"lampshades:{prefix}:", ttl=ttl)
+    return LocalBackend(maxsize=maxsize, ttl=ttl)
@@ -0,0 +1,92 @@
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import event, func, inspect, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import dialect_insert
+from app.models import Cart, CartSummary, Product
+
+# Cart summaries: each user's line count, units and total, plus the version
+# behind GET /cart's ETag, so badges and totals read one row.
+#
+# A cart change runs lock_cart (creating the summary row if needed, bumping
+# its version and locking it), changes the lines, then refresh_cart
+# recomputes the totals from the lines. Every writer takes the summary lock
+# first, so one user's cart changes serialize. The recount is a new statement
+# that sees everything committed before the lock was granted, so no
+# concurrent change is lost. Checkout, which empties the cart, zeroes the
+# totals with the lock instead and skips the recount. Renaming, repricing or deleting a product
+# recounts every cart holding it, in the same way. Like the catalog cache
+# invalidation in app.api.products, these product changes are seen through
+# the ORM only; bulk UPDATEs of products must refresh the carts themselves.
+
+
+def _recount(excluded_product: Optional[int] = None) -> dict:
+    # Correlated to the summary row being updated; a cart is a handful of lines
+    lines = select().select_from(Cart).where(Cart.user_id == CartSummary.user_id)
+    if excluded_product is not None:
+        lines = lines.where(Cart.product_id != excluded_product)
+    priced = lines.join(Product, Product.id == Cart.product_id)
+    return {
+        "item_count": lines.add_columns(func.count()).scalar_subquery(),
+        "quantity": lines.add_columns(func.coalesce(func.sum(Cart.quantity), 0)).scalar_subquery(),
+        "total_amount": priced.add_columns(
+            func.coalesce(func.sum(Product.price * Cart.quantity), 0)
+        ).scalar_subquery(),
+    }
+
+
+async def lock_cart(db: AsyncSession, user_id: int, emptying: bool = False):
+    """Take the user's cart summary lock and bump its version; call before changing lines.
+
+    Pass emptying=True when every line is deleted before committing: the
+    totals are zeroed here and refresh_cart is not needed.
+    """
+    insert = dialect_insert(db)
+    stmt = insert(CartSummary).values(
+        user_id=user_id, item_count=0, quantity=0, total_amount=0, version=1, updated_at=datetime.utcnow()
+    )
+    changes = {"version": CartSummary.version + 1, "updated_at": stmt.excluded.updated_at}
+    if emptying:
+        changes.update(item_count=0, quantity=0, total_amount=0)
+    stmt = stmt.on_conflict_do_update(index_elements=[CartSummary.user_id], set_=changes)
+    await db.execute(stmt)
+
+
+async def refresh_cart(db: AsyncSession, user_id: int):
+    """Recount the summary from the lines; call after changing them, before committing."""
+    await db.flush()  # pending ORM line changes
+    await db.execute(update(CartSummary).where(CartSummary.user_id == user_id).values(**_recount()))
+
+
+def _refresh_carts_holding(connection, product_id: int, deleted: bool = False):
+    holders = select(Cart.user_id).where(Cart.product_id == product_id)
+    # Lock first (in key order), then recount in a statement that sees every
+    # cart change committed meanwhile
+    connection.execute(
+        select(CartSummary.user_id)
+        .where(CartSummary.user_id.in_(holders))
+        .order_by(CartSummary.user_id)
+        .with_for_update()
+    )
+    connection.execute(
+        update(CartSummary)
+        .where(CartSummary.user_id.in_(holders))
+        .values(
+            **_recount(excluded_product=product_id if deleted else None),
+            version=CartSummary.version + 1,
+            updated_at=datetime.utcnow(),
+        )
+    )
+
+
+@event.listens_for(Product, "after_update")
+def _product_updated(mapper, connection, target):
+    attrs = inspect(target).attrs
+    if attrs.price.history.has_changes() or attrs.name.history.has_changes():
+        _refresh_carts_holding(connection, target.id)
+
+
+# Before, not after: the delete cascades to the cart lines that find the carts
+@event.listens_for(Product, "before_delete")
+def _product_deleted(mapper, connection, target):
+    _refresh_carts_holding(connection, target.id, deleted=True)
@@ -0,0 +1,309 @@
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from typing import AsyncIterable, AsyncIterator, List, Literal, Tuple, get_args
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import AsyncSessionLocal, async_engine
+from app.models import Product
+import argparse
+import asyncio
+import codecs
+import csv
+import io
+import json
+import os
+import sys
+
+# Bulk catalog import and export, streamed both ways.
+#
+# Imports read CSV (with a header row) or NDJSON (one object per line) a chunk
+# at a time and validate each row against the products table's constraints.
+# Valid rows go into one transaction: COPY on Postgres, batched executemany
+# elsewhere. By default nothing is committed if any row is invalid. Exports
+# stream rows off a server-side cursor. Memory stays flat whatever the file
+# size.
+
+IMPORT_BATCH_SIZE = int(os.getenv("CATALOG_IMPORT_BATCH_SIZE", "5000"))
+EXPORT_BATCH_SIZE = int(os.getenv("CATALOG_EXPORT_BATCH_SIZE", "5000"))
+# Row errors kept for the report (all of them are counted)
+IMPORT_MAX_ERRORS = int(os.getenv("CATALOG_IMPORT_MAX_ERRORS", "100"))
+# Longest CSV record, so an unbalanced quote cannot buffer the rest of the file
+MAX_RECORD_CHARS = 1 << 20
+
+FileFormat = Literal["csv", "ndjson"]
+FORMATS = get_args(FileFormat)
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+COLUMNS = ("name", "description", "price")
+EXPORT_COLUMNS = ("id", "name", "description", "price", "created_at")
+
+_NAME_LENGTH = Product.__table__.c.name.type.length
+_PRICE_TYPE = Product.__table__.c.price.type
+_PRICE_LIMIT = Decimal(10) ** (_PRICE_TYPE.precision - _PRICE_TYPE.scale)
+_PRICE_STEP = Decimal(1).scaleb(-_PRICE_TYPE.scale)
+
+
+@dataclass
+class ImportResult:
+    imported: int = 0
+    rejected: int = 0
+    errors: List[str] = field(default_factory=list)
+
+    def reject(self, line: int, error: Exception):
+        self.rejected += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append(f"line {line}: {error}")
+
+
+def guess_format(filename: str) -> str:
+    return "ndjson" if filename.lower().endswith((".ndjson", ".jsonl", ".json")) else "csv"
+
+
+def validate_row(fields) -> Tuple[str, object, Decimal]:
+    """(name, description, price) for one parsed row; ValueError if it would not fit the table."""
+    if not isinstance(fields, dict):
+        raise ValueError("expected an object")
+    name = fields.get("name")
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError("name is required")
+    name = name.strip()
+    if len(name) > _NAME_LENGTH:
+        raise ValueError(f"name is longer than {_NAME_LENGTH} characters")
+
+    description = fields.get("description") or None
+    if description is not None and not isinstance(description, str):
+        raise ValueError("description must be text")
+
+    price = fields.get("price")
+    if price is None or price == "":
+        raise ValueError("price is required")
+    if isinstance(price, bool) or not isinstance(price, (str, int, float)):
+        raise ValueError("price must be a number")
+    try:
+        price = Decimal(str(price).strip())
+    except InvalidOperation:
+        raise ValueError(f"price {fields['price']!r} is not a number")
+    if not price.is_finite() or price <= 0:
+        raise ValueError("price must be positive")
+    if price >= _PRICE_LIMIT:
+        raise ValueError(f"price must be below {_PRICE_LIMIT}")
+    if price != price.quantize(_PRICE_STEP):
+        raise ValueError(f"price has more than {_PRICE_TYPE.scale} decimal places")
+    return name, description, price.quantize(_PRICE_STEP)
+
+
+async def iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    """UTF-8 lines (without endings) from byte chunks, however the chunks split them."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        *lines, pending = (pending + decoder.decode(chunk)).split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def csv_rows(lines: AsyncIterable[str]):
+    """(line number, fields dict or ValueError) per CSV record after the header."""
+    header = None
+    record, quotes, size, start, number = [], 0, 0, 0, 0
+    async for line in lines:
+        number += 1
+        if not record:
+            start = number
+        record.append(line)
+        quotes += line.count('"')
+        size += len(line)
+        if quotes % 2:
+            # Inside a quoted field that continues on the next line
+            if size > MAX_RECORD_CHARS:
+                raise ValueError(f"line {start}: unterminated quoted field")
+            continue
+        text = "\n".join(record)
+        record, quotes, size = [], 0, 0
+        if not text.strip():
+            continue
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [name.strip().lower() for name in values]
+            if "name" not in header or "price" not in header:
+                raise ValueError("the CSV header must include name and price")
+            continue
+        if len(values) != len(header):
+            yield start, ValueError(f"expected {len(header)} fields, got {len(values)}")
+        else:
+            yield start, dict(zip(header, values))
+    if record:
+        yield start, ValueError("unterminated quoted field")
+
+
+async def ndjson_rows(lines: AsyncIterable[str]):
+    """(line number, parsed object or ValueError) per non-blank NDJSON line."""
+    number = 0
+    async for line in lines:
+        number += 1
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as exc:
+            yield number, ValueError(f"invalid JSON ({exc})")
+
+
+async def _valid_rows(rows, result: ImportResult, skip_invalid: bool):
+    async for line, fields in rows:
+        try:
+            if isinstance(fields, Exception):
+                raise fields
+            row = validate_row(fields)
+        except ValueError as exc:
+            result.reject(line, exc)
+            continue
+        # After a rejection a strict import only keeps reading to report errors
+        if skip_invalid or not result.rejected:
+            yield row
+
+
+async def _copy(db: AsyncSession, rows) -> int:
+    # COPY ... FROM STDIN (binary), fed from the stream as asyncpg asks for rows
+    count = 0
+
+    async def counted():
+        nonlocal count
+        async for row in rows:
+            count += 1
+            yield row
+
+    raw = await (await db.connection()).get_raw_connection()
+    await raw.driver_connection.copy_records_to_table(
+        Product.__tablename__, records=counted(), columns=COLUMNS
+    )
+    return count
+
+
+async def _insert_batches(db: AsyncSession, rows) -> int:
+    count, batch = 0, []
+    async for row in rows:
+        batch.append(dict(zip(COLUMNS, row)))
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            await db.execute(insert(Product.__table__), batch)
+            count, batch = count + len(batch), []
+    if batch:
+        await db.execute(insert(Product.__table__), batch)
+        count += len(batch)
+    return count
+
+
+async def import_products(
+    db: AsyncSession, chunks: AsyncIterable[bytes], fmt: str, skip_invalid: bool = False
+) -> ImportResult:
+    """Load a CSV/NDJSON byte stream into products in one transaction.
+
+    Invalid rows are reported by line number; unless skip_invalid is set, any
+    of them rolls the whole import back. Raises ValueError for a file that
+    cannot be read at all (e.g. a CSV header without name and price).
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format {fmt!r}; expected one of {', '.join(FORMATS)}")
+    result = ImportResult()
+    parse = csv_rows if fmt == "csv" else ndjson_rows
+    rows = _valid_rows(parse(iter_lines(chunks)), result, skip_invalid)
+    load = _copy if (await db.connection()).dialect.name == "postgresql" else _insert_batches
+    try:
+        imported = await load(db, rows)
+        if result.rejected and not skip_invalid:
+            await db.rollback()
+            return result
+        # COPY bypasses the ORM events that invalidate the catalog cache
+        db.info["catalog_changed"] = True
+        await db.commit()
+    except BaseException:
+        await db.rollback()
+        raise
+    result.imported = imported
+    return result
+
+
+def _render(rows, fmt: str) -> bytes:
+    if fmt == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerows(
+            (row.id, row.name, row.description or "", row.price, row.created_at.isoformat()) for row in rows
+        )
+        return buffer.getvalue().encode()
+    return "".join(
+        json.dumps({
+            "id": row.id, "name": row.name, "description": row.description,
+            "price": str(row.price), "created_at": row.created_at.isoformat(),
+        }) + "\n"
+        for row in rows
+    ).encode()
+
+
+async def export_products(db: AsyncSession, fmt: str) -> AsyncIterator[bytes]:
+    """The catalog by id as CSV/NDJSON, one chunk per EXPORT_BATCH_SIZE rows."""
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format {fmt!r}; expected one of {', '.join(FORMATS)}")
+    if fmt == "csv":
+        yield (",".join(EXPORT_COLUMNS) + "\n").encode()
+    result = await db.stream(
+        select(*(getattr(Product, column) for column in EXPORT_COLUMNS))
+        .order_by(Product.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    async for rows in result.partitions():
+        yield _render(rows, fmt)
+
+
+async def read_file(path: str, chunk_size: int = 1 << 16) -> AsyncIterator[bytes]:
+    """Chunks of a file, or of stdin for "-"; blocking reads are fine in the CLI."""
+    stream = sys.stdin.buffer if path == "-" else open(path, "rb")
+    try:
+        while chunk := stream.read(chunk_size):
+            yield chunk
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import or export the product catalog.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    load = commands.add_parser("import", help="load products from a CSV or NDJSON file")
+    load.add_argument("file", help='file to read ("-" for stdin)')
+    load.add_argument("--format", choices=FORMATS, help="default: from the file extension, else csv")
+    load.add_argument("--skip-invalid", action="store_true", help="load the valid rows even if some are not")
+    dump = commands.add_parser("export", help="write the catalog as CSV or NDJSON")
+    dump.add_argument("-o", "--output", default="-", help='file to write ("-" for stdout)')
+    dump.add_argument("--format", choices=FORMATS, help="default: from the file extension, else csv")
+    args = parser.parse_args(argv)
+    fmt = args.format or guess_format(args.file if args.command == "import" else args.output)
+
+    try:
+        async with AsyncSessionLocal() as db:
+            if args.command == "export":
+                output = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+                try:
+                    async for chunk in export_products(db, fmt):
+                        output.write(chunk)
+                finally:
+                    if output is not sys.stdout.buffer:
+                        output.close()
+                return
+            result = await import_products(db, read_file(args.file), fmt, args.skip_invalid)
+    finally:
+        # Pooled aiosqlite connections are threads that would keep the process alive
+        await async_engine.dispose()
+
+    for error in result.errors:
+        print(error, file=sys.stderr)
+    if result.rejected > len(result.errors):
+        print(f"... and {result.rejected - len(result.errors)} more", file=sys.stderr)
+    if result.rejected and not args.skip_invalid:
+        print(f"Nothing imported: {result.rejected} invalid rows.", file=sys.stderr)
+        raise SystemExit(1)
+    print(f"Imported {result.imported} products ({result.rejected} rejected).")
+
+if __name__ == "__main__":
+    asyncio.run(main())
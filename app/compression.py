@@ -0,0 +1,156 @@
+from typing import Optional
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.database import env_flag
+import os
+import zlib
+
+try:
+    import brotli  # optional dependency; gzip only without it
+except ImportError:
+    brotli = None
+
+# Response compression negotiated from Accept-Encoding: brotli when the client
+# prefers or equally accepts it (and the brotli package is installed), else
+# gzip. Bodies under COMPRESSION_MIN_SIZE go out as they are, since
+# compressing them saves less than it costs. Streamed bodies (exports) are
+# compressed chunk by chunk and flushed, so they still arrive as they are
+# produced. Responses that already vary on Accept-Encoding chose their
+# encoding themselves (cached catalog pages are compressed once, with a strong
+# ETag per encoding) and pass through untouched.
+
+COMPRESSION_ENABLED = env_flag("COMPRESSION_ENABLED", "true")
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+# Formats that compress well; images and archives are compressed already
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/x-ndjson", "application/xml", "application/javascript")
+
+
+def choose_encoding(accept_encoding: str, brotli_available: bool = brotli is not None) -> Optional[str]:
+    """The best of br/gzip the client accepts (q > 0), or None for identity."""
+    weights = {}
+    for entry in accept_encoding.lower().split(","):
+        name, _, params = entry.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip()] = q
+    wildcard = weights.get("*", 0.0)
+    offered = ("br", "gzip") if brotli_available else ("gzip",)
+    ranked = [(weights.get(name, wildcard), name) for name in offered]
+    q, name = max(ranked, key=lambda entry: entry[0])  # first (br) wins a tie
+    return name if q > 0 else None
+
+
+class GzipEncoder:
+    def __init__(self, level: int = GZIP_LEVEL):
+        self.stream = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def encode(self, data: bytes, final: bool) -> bytes:
+        return self.stream.compress(data) + self.stream.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class BrotliEncoder:
+    def __init__(self, quality: int = BROTLI_QUALITY):
+        self.stream = brotli.Compressor(quality=quality)
+
+    def encode(self, data: bytes, final: bool) -> bytes:
+        return self.stream.process(data) + (self.stream.finish() if final else self.stream.flush())
+
+
+ENCODERS = {"gzip": GzipEncoder, "br": BrotliEncoder}
+
+
+def negotiate(accept_encoding: str, size: int) -> Optional[str]:
+    """Encoding for a body the route compresses itself, as the middleware would pick it."""
+    if not COMPRESSION_ENABLED or size < COMPRESSION_MIN_SIZE:
+        return None
+    return choose_encoding(accept_encoding)
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    return ENCODERS[encoding]().encode(body, True)
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        await CompressionResponder(self.app, encoding, self.minimum_size)(scope, receive, send)
+
+
+class CompressionResponder:
+    """Compresses one response, deciding at its first body chunk."""
+
+    def __init__(self, app: ASGIApp, encoding: Optional[str], minimum_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.send: Send = None
+        self.start: Optional[Message] = None
+        self.encoder = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    def compressible(self, headers: MutableHeaders) -> bool:
+        return (
+            "content-encoding" not in headers
+            and headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+        )
+
+    async def send_compressed(self, message: Message):
+        if message["type"] == "http.response.start":
+            # Held back until the first body chunk shows whether to compress
+            self.start = message
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+        if self.start is None:
+            if self.encoder is not None:
+                message["body"] = self.encoder.encode(message.get("body", b""), not message.get("more_body", False))
+            await self.send(message)
+            return
+
+        start, self.start = self.start, None
+        headers = MutableHeaders(raw=start["headers"])
+        body, more_body = message.get("body", b""), message.get("more_body", False)
+        if "accept-encoding" in headers.get("vary", "").lower():
+            # Negotiated by the route; its ETags already match its bytes
+            await self.send(start)
+            await self.send(message)
+            return
+        if self.compressible(headers):
+            # The representation depends on Accept-Encoding whether or not
+            # this one is compressed
+            headers.add_vary_header("Accept-Encoding")
+            if self.encoding is not None and (more_body or len(body) >= self.minimum_size):
+                self.encoder = ENCODERS[self.encoding]()
+                message["body"] = self.encoder.encode(body, not more_body)
+                headers["Content-Encoding"] = self.encoding
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    headers["Content-Length"] = str(len(message["body"]))
+        # Compressed bytes differ from the identity response's, so a strong
+        # ETag would be wrong. Weaken it for every response to this client
+        # (304s included) so it stays stable; If-None-Match compares weakly
+        etag = headers.get("etag")
+        if self.encoding is not None and etag and not etag.startswith("W/"):
+            headers["ETag"] = "W/" + etag
+        await self.send(start)
+        await self.send(message)
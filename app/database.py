@@ -1,19 +1,190 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+from typing import Optional
+from uuid import uuid4
 import os
+import time
 
 # Database URL from environment variable
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://user:password@db:5432/lampshades")
 
+# Async drivers used by the API for each sync backend
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def get_async_url(url: str) -> str:
+    """Map a sync database URL onto the matching async driver."""
+    url = make_url(url)
+    drivername = ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername)
+    return url.set(drivername=drivername).render_as_string(hide_password=False)
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", get_async_url(DATABASE_URL))
+
+def env_flag(name: str, default: str = "false") -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+# Connection pool settings for the API engine
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = env_flag("DB_POOL_PRE_PING", "true")
+# Transaction-pooling mode for running behind PgBouncer
+DB_PGBOUNCER = env_flag("DB_PGBOUNCER")
+# How long a SQLite writer waits for the database lock (sqlite3's own default
+# is 5 s); Postgres row locks wait without a limit
+DB_SQLITE_BUSY_TIMEOUT = float(os.getenv("DB_SQLITE_BUSY_TIMEOUT", "30"))
+
+
+class PoolStats:
+    """Checkout counters and time spent waiting for a pooled connection."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.timeouts = 0
+        self.waits = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record_wait(self, seconds: float):
+        self.waits += 1
+        self.wait_total += seconds
+        self.wait_max = max(self.wait_max, seconds)
+
+    def snapshot(self, pool) -> dict:
+        data = {
+            "pool": type(pool).__name__,
+            "connects": self.connects,
+            "checkouts": self.checkouts,
+            "checkins": self.checkins,
+            "checked_out": self.checkouts - self.checkins,
+            "timeouts": self.timeouts,
+            "wait_avg_ms": round(self.wait_total / self.waits * 1000, 3) if self.waits else 0.0,
+            "wait_max_ms": round(self.wait_max * 1000, 3),
+        }
+        if isinstance(pool, AsyncAdaptedQueuePool):
+            data.update(size=pool.size(), idle=pool.checkedin(), overflow=pool.overflow())
+        return data
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """Async queue pool that records how long callers wait for a connection."""
+
+    stats: Optional[PoolStats] = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            if self.stats is not None:
+                self.stats.timeouts += 1
+            raise
+        finally:
+            if self.stats is not None:
+                self.stats.record_wait(time.perf_counter() - started)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+def get_engine_options(url: str, pgbouncer: bool = DB_PGBOUNCER) -> dict:
+    """Engine keyword arguments for the configured pooling mode."""
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # In-memory SQLite must keep its single static connection
+        return {}
+
+    if pgbouncer:
+        # PgBouncer owns pooling; server-side prepared statements do not
+        # survive transaction pooling, so disable asyncpg's statement caches
+        options = {"poolclass": NullPool}
+        if url.get_backend_name() == "postgresql":
+            options["connect_args"] = {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+            }
+        return options
+
+    options = {
+        "poolclass": TimedAsyncQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if url.get_backend_name() == "sqlite":
+        # One writer at a time: queue for the lock instead of failing with
+        # "database is locked" under a burst of cart writes
+        options["connect_args"] = {"timeout": DB_SQLITE_BUSY_TIMEOUT}
+    return options
+
+
+def create_api_engine(url: str = ASYNC_DATABASE_URL, stats: Optional[PoolStats] = None, **overrides):
+    """Create an async engine with pooling configured from the environment."""
+    options = get_engine_options(url)
+    options.update(overrides)
+    api_engine = create_async_engine(url, **options)
+
+    stats = stats if stats is not None else PoolStats()
+    pool = api_engine.sync_engine.pool
+    if isinstance(pool, TimedAsyncQueuePool):
+        pool.stats = stats
+
+    @event.listens_for(api_engine.sync_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        stats.connects += 1
+
+    @event.listens_for(api_engine.sync_engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        stats.checkouts += 1
+
+    @event.listens_for(api_engine.sync_engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        stats.checkins += 1
+
+    api_engine.sync_engine.pool_stats = stats
+    return api_engine
+
+
+def get_pool_stats(api_engine=None) -> dict:
+    """Pool checkout/wait statistics for monitoring."""
+    api_engine = api_engine or async_engine
+    return api_engine.sync_engine.pool_stats.snapshot(api_engine.sync_engine.pool)
+
+
+# Sync engine for scripts and migrations (init_data, alembic helpers)
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine used by the API
+async_engine = create_api_engine()
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+def dialect_insert(db):
+    """INSERT construct with ON CONFLICT support for the session's backend."""
+    return postgresql.insert if db.bind.dialect.name == "postgresql" else sqlite.insert
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi import HTTPException, Request, Response, status
+from pydantic import BaseModel
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import AsyncSessionLocal, dialect_insert
+from app.models import IdempotencyKey
+import asyncio
+import hashlib
+import os
+
+# How long a stored response answers retries of the same Idempotency-Key
+IDEMPOTENCY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+
+async def request_fingerprint(request: Request) -> str:
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(request.url.path.encode())
+    digest.update(await request.body())
+    return digest.hexdigest()
+
+async def claim_idempotency_key(db: AsyncSession, user_id: int, key: str, fingerprint: str) -> Optional[Response]:
+    """Claim key inside the request's transaction, or return the stored response.
+
+    The claim row is written in the same transaction as the work it guards, so
+    a concurrent retry blocks on it until the first attempt commits (and then
+    replays its response) or rolls back (and then runs the work itself).
+    """
+    now = datetime.utcnow()
+    insert = dialect_insert(db)
+    stmt = insert(IdempotencyKey).values(
+        user_id=user_id,
+        key=key,
+        fingerprint=fingerprint,
+        created_at=now,
+        expires_at=now + timedelta(hours=IDEMPOTENCY_TTL_HOURS),
+    )
+    # An expired key is taken over as if it were new
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[IdempotencyKey.user_id, IdempotencyKey.key],
+        set_={
+            "fingerprint": stmt.excluded.fingerprint,
+            "status_code": None,
+            "response_body": None,
+            "created_at": stmt.excluded.created_at,
+            "expires_at": stmt.excluded.expires_at,
+        },
+        where=IdempotencyKey.expires_at <= now,
+    ).returning(IdempotencyKey.key)
+    if (await db.execute(stmt)).first() is not None:
+        return None
+
+    stored = await db.scalar(
+        select(IdempotencyKey).where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+    )
+    if stored.fingerprint != fingerprint:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used for a different request"
+        )
+    return Response(
+        content=stored.response_body,
+        status_code=stored.status_code,
+        media_type="application/json",
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+async def store_idempotent_response(db: AsyncSession, user_id: int, key: str, response: BaseModel, status_code: int = 200):
+    """Record the response for key; call before committing the guarded work."""
+    await db.execute(
+        update(IdempotencyKey)
+        .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+        .values(status_code=status_code, response_body=response.model_dump_json())
+    )
+
+async def purge_expired_keys(db: AsyncSession) -> int:
+    result = await db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= datetime.utcnow()))
+    await db.commit()
+    return result.rowcount
+
+async def purge():
+    async with AsyncSessionLocal() as db:
+        removed = await purge_expired_keys(db)
+    print(f"Removed {removed} expired idempotency keys.")
+
+if __name__ == "__main__":
+    asyncio.run(purge())
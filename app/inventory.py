@@ -0,0 +1,185 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List
+from sqlalchemy import bindparam, case, delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from app.analytics import record_sales
+from app.database import AsyncSessionLocal, async_engine
+from app.models import Cart, Order, ProductStock, StockReservation
+from app.outbox import enqueue, order_payload
+import argparse
+import asyncio
+import os
+import random
+
+# Stock reservation for checkout.
+#
+# Checkout takes stock with one conditional UPDATE (quantity >= wanted), so a
+# line either fits entirely or is rejected; there is no read-then-write
+# window to oversell in. The stock then belongs to the pending order until it
+# is paid (kept), cancelled or left unpaid for RESERVATION_TTL_MINUTES
+# (returned; see expire_reservations).
+#
+# Sharding: a product with n stock rows takes each checkout from a random
+# row, so up to n checkouts proceed in parallel instead of queueing on one row
+# lock. A line must fit in one row: if its random row is short, it retries on
+# the fullest row, and fails if that is short too.
+
+RESERVATION_TTL_MINUTES = float(os.getenv("RESERVATION_TTL_MINUTES", "15"))
+RESERVATION_EXPIRY_BATCH = int(os.getenv("RESERVATION_EXPIRY_BATCH", "500"))
+
+
+def shard_count(product_id_column):
+    """Scalar subquery: number of stock rows for the product (0 = untracked)."""
+    stock = aliased(ProductStock)
+    return select(func.count()).where(stock.product_id == product_id_column).scalar_subquery()
+
+
+async def _take(db: AsyncSession, user_id: int, product_ids: List[int], shard) -> Dict[int, int]:
+    # shard(product_id_column) picks each product's row. Lock the picked rows
+    # in key order first, as release() does: the UPDATE ... FROM below locks
+    # them in join order, so two checkouts sharing products could deadlock
+    locked = dict((await db.execute(
+        select(ProductStock.product_id, ProductStock.shard)
+        .where(ProductStock.product_id.in_(product_ids), ProductStock.shard == shard(ProductStock.product_id))
+        .order_by(ProductStock.product_id, ProductStock.shard)
+        .with_for_update()
+    )).all())
+    if not locked:
+        return {}
+    # Decrement only where the row covers the cart line; returns {product: shard}
+    rows = await db.execute(
+        update(ProductStock)
+        .where(
+            Cart.user_id == user_id,
+            Cart.product_id.in_(locked),
+            ProductStock.product_id == Cart.product_id,
+            ProductStock.shard == case(locked, value=Cart.product_id),
+            ProductStock.quantity >= Cart.quantity,
+        )
+        .values(quantity=ProductStock.quantity - Cart.quantity)
+        .returning(ProductStock.product_id, ProductStock.shard)
+        .execution_options(synchronize_session=False)
+    )
+    return dict(rows.all())
+
+
+async def take_stock(db: AsyncSession, user_id: int, shards: Dict[int, int]) -> Dict[int, int]:
+    """Take the quantities in user's cart for the tracked products in shards.
+
+    shards maps product id to its number of stock rows. Returns the stock row
+    each product was taken from; products missing from the result are short.
+    """
+    choice = {product_id: random.randrange(count) for product_id, count in shards.items()}
+    taken = await _take(db, user_id, list(shards), lambda product_id: case(choice, value=product_id))
+    retry = [product_id for product_id in shards if product_id not in taken and shards[product_id] > 1]
+    if retry:
+        stock = aliased(ProductStock)
+
+        def fullest(product_id):
+            return (
+                select(stock.shard)
+                .where(stock.product_id == product_id)
+                .order_by(stock.quantity.desc())
+                .limit(1)
+                .scalar_subquery()
+            )
+        taken.update(await _take(db, user_id, retry, fullest))
+    return taken
+
+
+async def reserve(db: AsyncSession, order_id: int, taken: Dict[int, int], quantities: Dict[int, int]):
+    expires_at = datetime.utcnow() + timedelta(minutes=RESERVATION_TTL_MINUTES)
+    await db.execute(insert(StockReservation), [
+        {"order_id": order_id, "product_id": product_id, "shard": shard,
+         "quantity": quantities[product_id], "expires_at": expires_at}
+        for product_id, shard in taken.items()
+    ])
+
+
+async def release(db: AsyncSession, order_ids: List[int]):
+    """Return the stock reserved by order_ids to the rows it came from."""
+    reserved = (await db.execute(
+        delete(StockReservation)
+        .where(StockReservation.order_id.in_(order_ids))
+        .returning(StockReservation.product_id, StockReservation.shard, StockReservation.quantity)
+    )).all()
+    if not reserved:
+        return
+    returned = defaultdict(int)
+    for product_id, shard, quantity in reserved:
+        returned[product_id, shard] += quantity
+    stock = ProductStock.__table__
+    # In key order, so concurrent releases lock rows in the same order
+    await db.execute(
+        update(stock)
+        .where(stock.c.product_id == bindparam("b_product_id"), stock.c.shard == bindparam("b_shard"))
+        .values(quantity=stock.c.quantity + bindparam("b_quantity")),
+        [{"b_product_id": product_id, "b_shard": shard, "b_quantity": quantity}
+         for (product_id, shard), quantity in sorted(returned.items())],
+    )
+
+
+async def consume(db: AsyncSession, order_id: int):
+    """The order was paid: its reserved stock is sold for good."""
+    await db.execute(delete(StockReservation).where(StockReservation.order_id == order_id))
+
+
+async def expire_reservations(db: AsyncSession, batch_size: int = RESERVATION_EXPIRY_BATCH) -> int:
+    """Cancel pending orders whose reservations expired and return their stock."""
+    expired_total = 0
+    while True:
+        expired = select(StockReservation.order_id).where(StockReservation.expires_at <= datetime.utcnow())
+        # SKIP LOCKED: orders being paid or cancelled right now are left to that request
+        orders = (await db.scalars(
+            select(Order)
+            .where(Order.status == "pending", Order.id.in_(expired))
+            .order_by(Order.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )).all()
+        if not orders:
+            return expired_total
+        for order in orders:
+            order.status = "cancelled"
+            enqueue(db, "order.cancelled", {**order_payload(order), "reason": "expired"})
+        await release(db, [order.id for order in orders])
+        await record_sales(db, orders)
+        await db.commit()
+        expired_total += len(orders)
+
+
+async def set_stock(db: AsyncSession, product_id: int, quantity: int, shards: int = 1):
+    """Replace the product's available stock, spread evenly over shards rows."""
+    await db.execute(delete(ProductStock).where(ProductStock.product_id == product_id))
+    await db.execute(insert(ProductStock), [
+        {"product_id": product_id, "shard": shard, "quantity": quantity // shards + (shard < quantity % shards)}
+        for shard in range(shards)
+    ])
+    await db.commit()
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage product stock and expire stale reservations.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("expire", help="cancel unpaid orders whose reservations expired")
+    stock = commands.add_parser("set", help="set a product's available stock")
+    stock.add_argument("product_id", type=int)
+    stock.add_argument("quantity", type=int)
+    stock.add_argument("--shards", type=int, default=1, help="stock rows to spread it over (hot products)")
+    args = parser.parse_args(argv)
+
+    try:
+        async with AsyncSessionLocal() as db:
+            if args.command == "expire":
+                print(f"Expired {await expire_reservations(db)} unpaid orders.")
+            else:
+                await set_stock(db, args.product_id, args.quantity, args.shards)
+                print(f"Product {args.product_id}: {args.quantity} in stock over {args.shards} shard(s).")
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,16 +1,24 @@
-from fastapi import FastAPI
-from app.api import auth, products, cart, orders
-from app.database import engine, Base
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse
+from app import replicas, startup
+from app.api import admin, auth, products, cart, orders
+from app.compression import COMPRESSION_ENABLED, CompressionMiddleware
+from app.database import async_engine, get_pool_stats
+from app.metrics import CONTENT_TYPE, METRICS_ENABLED, MetricsMiddleware, instrument_engine, render_metrics
+from app.ratelimit import RATE_LIMIT_ENABLED, RateLimitMiddleware
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Create database tables on startup
-    Base.metadata.create_all(bind=engine)
+    # Verify the schema revision and warm the pool and catalog cache; tables
+    # are created by `alembic upgrade head` (or DB_CREATE_ALL for development)
+    await startup.start()
     yield
-    # Cleanup on shutdown if needed
-    pass
+    # Stop advertising readiness, then release pooled connections
+    startup.readiness.ready = False
+    await async_engine.dispose()
+    await replicas.read_replicas.dispose()
 
 app = FastAPI(
     title="LampShades MVP API", 
@@ -19,20 +27,39 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-# Add CORS middleware
+# gzip/brotli for responses over COMPRESSION_MIN_SIZE, when the client accepts it
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+# Per-client rate limits (429) and load shedding (503); added before the
+# metrics middleware so rejected requests are still counted
+if RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware, routes=app.router.routes)
+
+# Add CORS middleware; outside the rate limiter so browsers can read its 429
+# and 503 responses (and Retry-After)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # In production, specify exact origins
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],
 )
 
+# Per-route latency, status and DB usage; exported on /metrics
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    instrument_engine(async_engine.sync_engine)
+    for replica in replicas.read_replicas.replicas:
+        instrument_engine(replica.engine.sync_engine)
+
 # Include API routes
 app.include_router(auth.router)
 app.include_router(products.router)
 app.include_router(cart.router)
 app.include_router(orders.router)
+app.include_router(admin.router)
 
 @app.get("/")
 def read_root():
@@ -40,4 +67,22 @@ def read_root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+@app.get("/ready")
+def readiness_check():
+    # 503 until startup finishes (and again while shutting down)
+    state = startup.readiness.snapshot()
+    return JSONResponse(state, status_code=200 if state["ready"] else 503)
+
+@app.get("/health/pool")
+def pool_health():
+    return get_pool_stats()
+
+@app.get("/health/replicas")
+def replica_health():
+    return replicas.read_replicas.snapshot()
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return Response(render_metrics(get_pool_stats()), media_type=CONTENT_TYPE)
@@ -0,0 +1,233 @@
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Dict, Optional, Sequence, Tuple
+from sqlalchemy import event
+from app.database import env_flag
+import logging
+import os
+import time
+
+# Prometheus metrics for HTTP requests and the database queries they issue.
+#
+# Request bookkeeping is a pure ASGI middleware plus two engine events; there
+# is no locking because everything runs on the event loop thread.
+
+METRICS_ENABLED = env_flag("METRICS_ENABLED", "true")
+# Log queries slower than this many milliseconds (0 disables)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))
+# Log requests that run one statement at least this many times (0 disables)
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "0"))
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+logger = logging.getLogger("app.metrics")
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        self.values: Dict[Tuple, float] = defaultdict(float)
+
+    def inc(self, labels: Tuple = (), amount: float = 1.0):
+        self.values[labels] += amount
+
+    def render(self):
+        lines = self.header()
+        for labels, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels: Tuple = (), amount: float = 1.0):
+        self.values[labels] -= amount
+
+    def set(self, value: float, labels: Tuple = ()):
+        self.values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        # per label set: [count per bucket (last is +Inf), sum]
+        self.values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, labels: Tuple = ()):
+        state = self.values.get(labels)
+        if state is None:
+            state = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    def render(self):
+        lines = self.header()
+        for labels, (counts, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                bucket_labels = _format_labels(self.labels, labels, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, labels)} {cumulative}")
+        return lines
+
+
+REQUESTS = Counter("http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency.", ("method", "route"))
+IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being served.")
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "SQL statements issued per HTTP request.", ("method", "route"),
+    buckets=QUERY_COUNT_BUCKETS,
+)
+REQUEST_DB_TIME = Histogram("http_request_db_seconds", "Time spent in SQL per HTTP request.", ("method", "route"))
+QUERY_LATENCY = Histogram("db_query_duration_seconds", "SQL statement latency.")
+
+METRICS = [REQUESTS, REQUEST_LATENCY, IN_FLIGHT, REQUEST_QUERIES, REQUEST_DB_TIME, QUERY_LATENCY]
+
+# Pool statistics (see app.database.get_pool_stats) exported at scrape time
+POOL_METRICS = {
+    "connects": ("db_pool_connects_total", "counter", "Connections opened by the pool."),
+    "checkouts": ("db_pool_checkouts_total", "counter", "Connections checked out of the pool."),
+    "timeouts": ("db_pool_timeouts_total", "counter", "Checkouts that timed out waiting for a connection."),
+    "checked_out": ("db_pool_checked_out", "gauge", "Connections currently checked out."),
+    "size": ("db_pool_size", "gauge", "Configured pool size."),
+    "idle": ("db_pool_idle", "gauge", "Idle connections in the pool."),
+    "overflow": ("db_pool_overflow", "gauge", "Connections open beyond the pool size."),
+}
+
+
+class RequestStats:
+    """Statements issued while serving one request."""
+
+    __slots__ = ("queries", "db_time", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = defaultdict(int) if N_PLUS_ONE_THRESHOLD else None
+
+
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context so failed statements leave nothing behind
+    context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._metrics_started
+    QUERY_LATENCY.observe(elapsed)
+    stats = _current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += elapsed
+        if stats.statements is not None:
+            stats.statements[statement] += 1
+    if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+        logger.warning("slow query (%.1f ms): %s", elapsed * 1000, " ".join(statement.split())[:500])
+
+
+def instrument_engine(sync_engine):
+    """Time every statement on sync_engine and attribute it to the current request."""
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def record_request(method: str, route: str, status_code: int, elapsed: float, stats: RequestStats):
+    labels = (method, route)
+    REQUESTS.inc((method, route, str(status_code)))
+    REQUEST_LATENCY.observe(elapsed, labels)
+    REQUEST_QUERIES.observe(stats.queries, labels)
+    REQUEST_DB_TIME.observe(stats.db_time, labels)
+    if stats.statements:
+        statement, count = max(stats.statements.items(), key=lambda item: item[1])
+        if count >= N_PLUS_ONE_THRESHOLD:
+            logger.warning(
+                "possible N+1 on %s %s: statement ran %d times: %s",
+                method, route, count, " ".join(statement.split())[:500]
+            )
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and DB usage per route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            IN_FLIGHT.dec()
+            _current_request.reset(token)
+            # Label by route template, not raw path, to keep cardinality bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            record_request(scope["method"], route, status_code, elapsed, stats)
+
+
+def render_metrics(pool_stats: Optional[dict] = None) -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for key, (name, kind, documentation) in POOL_METRICS.items():
+        if pool_stats and key in pool_stats:
+            lines += [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}", f"{name} {pool_stats[key]}"]
+    return "\n".join(lines) + "\n"
@@ -1,14 +1,19 @@
-from sqlalchemy import Column, Integer, String, Text, DECIMAL, TIMESTAMP, ForeignKey, CheckConstraint
+from sqlalchemy import Column, Date, Integer, String, Text, DECIMAL, TIMESTAMP, ForeignKey, CheckConstraint, Index
+from sqlalchemy.dialects import sqlite
 from sqlalchemy.sql import func
 from app.database import Base
 
+# SQLite stores CURRENT_TIMESTAMP without fractional seconds; bind values in the
+# same format so (created_at, id) keyset comparisons line up
+Timestamp = TIMESTAMP().with_variant(sqlite.DATETIME(truncate_microseconds=True), "sqlite")
+
 class User(Base):
     __tablename__ = "users"
 
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String(255), unique=True, index=True, nullable=False)
     password_hash = Column(Text, nullable=False)
-    created_at = Column(TIMESTAMP, server_default=func.now())
+    created_at = Column(Timestamp, server_default=func.now())
 
 
 class Product(Base):
@@ -18,10 +23,11 @@ class Product(Base):
     name = Column(String(255), nullable=False)
     description = Column(Text)
     price = Column(DECIMAL(10, 2), nullable=False)
-    created_at = Column(TIMESTAMP, server_default=func.now())
+    created_at = Column(Timestamp, server_default=func.now())
 
     __table_args__ = (
         CheckConstraint("price > 0", name="check_price_positive"),
+        Index("ix_products_created_at_id", "created_at", "id"),
     )
 
 
@@ -37,6 +43,35 @@ class Cart(Base):
     )
 
 
+# Totals of a user's cart, kept in step with its lines and their products'
+# prices (see app.carts). version is bumped by every change; with updated_at
+# it is the cart's ETag and Last-Modified
+class CartSummary(Base):
+    __tablename__ = "cart_summaries"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    item_count = Column(Integer, nullable=False, default=0)  # lines
+    quantity = Column(Integer, nullable=False, default=0)  # units over all lines
+    total_amount = Column(DECIMAL(12, 2), nullable=False, default=0)
+    version = Column(Integer, nullable=False)
+    updated_at = Column(Timestamp, nullable=False)
+
+
+# Units available to sell; no rows means the product's stock is not tracked.
+# Hot products can be split over several shard rows (0..n-1) so concurrent
+# checkouts do not all queue on one row lock; see app.inventory
+class ProductStock(Base):
+    __tablename__ = "product_stock"
+
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    shard = Column(Integer, primary_key=True, default=0)
+    quantity = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        CheckConstraint("quantity >= 0", name="check_stock_not_negative"),
+    )
+
+
 class Order(Base):
     __tablename__ = "orders"
 
@@ -44,7 +79,17 @@ class Order(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     total_amount = Column(DECIMAL(10, 2), nullable=False)
     status = Column(String(20), nullable=False, default='pending')  # 'pending', 'paid', 'cancelled'
-    created_at = Column(TIMESTAMP, server_default=func.now())
+    created_at = Column(Timestamp, nullable=False, server_default=func.now())
+    # Bumped by every ORM update of the row; the order's ETag and Last-Modified
+    version = Column(Integer, nullable=False, server_default="1")
+    updated_at = Column(Timestamp, nullable=False, server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index("ix_orders_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
+    # Load created_at with the INSERT (RETURNING); order items copy it as
+    # their partition key
+    __mapper_args__ = {"eager_defaults": True, "version_id_col": version}
 
 
 class OrderItem(Base):
@@ -54,4 +99,111 @@ class OrderItem(Base):
     product_id = Column(Integer, nullable=False, primary_key=True)
     product_name = Column(String(255), nullable=False)  # snapshot at order time
     product_price = Column(DECIMAL(10, 2), nullable=False)
-    quantity = Column(Integer, nullable=False)
\ No newline at end of file
+    quantity = Column(Integer, nullable=False)
+    created_at = Column(Timestamp, nullable=False)  # the order's; partition key on Postgres
+
+
+# Closed orders moved out of the hot tables by app.archive; same shape
+class ArchivedOrder(Base):
+    __tablename__ = "orders_archive"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    total_amount = Column(DECIMAL(10, 2), nullable=False)
+    status = Column(String(20), nullable=False)
+    created_at = Column(Timestamp, nullable=False)
+    version = Column(Integer, nullable=False, server_default="1")
+    updated_at = Column(Timestamp, nullable=False, server_default=func.now())
+    archived_at = Column(Timestamp, nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_orders_archive_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
+
+
+class ArchivedOrderItem(Base):
+    __tablename__ = "order_items_archive"
+
+    order_id = Column(Integer, ForeignKey("orders_archive.id", ondelete="CASCADE"), primary_key=True)
+    product_id = Column(Integer, nullable=False, primary_key=True)
+    product_name = Column(String(255), nullable=False)
+    product_price = Column(DECIMAL(10, 2), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    created_at = Column(Timestamp, nullable=False)
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    key = Column(String(255), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)  # hash of method, path and body
+    status_code = Column(Integer)
+    response_body = Column(Text)
+    created_at = Column(Timestamp, nullable=False)
+    expires_at = Column(Timestamp, nullable=False, index=True)
+
+
+# Stock taken by a pending order: returned on cancel or expiry, dropped on
+# payment. (No foreign key: orders is partitioned on Postgres.)
+class StockReservation(Base):
+    __tablename__ = "stock_reservations"
+
+    order_id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, primary_key=True)
+    shard = Column(Integer, nullable=False)  # the product_stock row it came from
+    quantity = Column(Integer, nullable=False)
+    expires_at = Column(Timestamp, nullable=False, index=True)
+
+
+# Sales rollups, updated by app.analytics in the transaction that pays or
+# cancels an order: per day the order was placed, and per product. Each key
+# is spread over shard rows (0..SALES_ROLLUP_SHARDS-1) so concurrent payments
+# do not all queue on the day's row lock; reads sum the shards
+class DailySales(Base):
+    __tablename__ = "sales_by_day"
+
+    day = Column(Date, primary_key=True)
+    shard = Column(Integer, primary_key=True, default=0)
+    paid_orders = Column(Integer, nullable=False, default=0)
+    paid_units = Column(Integer, nullable=False, default=0)
+    paid_revenue = Column(DECIMAL(16, 2), nullable=False, default=0)
+    cancelled_orders = Column(Integer, nullable=False, default=0)
+    cancelled_units = Column(Integer, nullable=False, default=0)
+    cancelled_revenue = Column(DECIMAL(16, 2), nullable=False, default=0)
+
+
+class ProductSales(Base):
+    __tablename__ = "sales_by_product"
+
+    product_id = Column(Integer, primary_key=True)
+    shard = Column(Integer, primary_key=True, default=0)
+    product_name = Column(String(255), nullable=False)  # snapshot from its order items
+    paid_orders = Column(Integer, nullable=False, default=0)
+    paid_units = Column(Integer, nullable=False, default=0)
+    paid_revenue = Column(DECIMAL(16, 2), nullable=False, default=0)
+    cancelled_orders = Column(Integer, nullable=False, default=0)
+    cancelled_units = Column(Integer, nullable=False, default=0)
+    cancelled_revenue = Column(DECIMAL(16, 2), nullable=False, default=0)
+
+
+# Side effect of an order change, written in the change's transaction;
+# delivered by the app.outbox worker and deleted once handled
+class OutboxEvent(Base):
+    __tablename__ = "outbox_events"
+
+    id = Column(Integer, primary_key=True)
+    topic = Column(String(100), nullable=False)  # e.g. 'order.paid'
+    payload = Column(Text, nullable=False)  # JSON
+    created_at = Column(Timestamp, nullable=False)
+    available_at = Column(Timestamp, nullable=False)  # next attempt; pushed out while claimed
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text)
+    failed_at = Column(Timestamp)  # set when retries are exhausted
+
+    __table_args__ = (
+        Index(
+            "ix_outbox_events_due", "available_at", "id",
+            postgresql_where=failed_at.is_(None), sqlite_where=failed_at.is_(None),
+        ),
+    )
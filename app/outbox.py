@@ -0,0 +1,248 @@
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import AsyncSessionLocal, async_engine
+from app.metrics import CONTENT_TYPE, Counter, Gauge, Histogram
+from app.models import OutboxEvent
+import asyncio
+import json
+import logging
+import os
+import random
+import signal
+
+# Transactional outbox for work that follows an order change.
+#
+# Endpoints call enqueue() before committing, so an event exists exactly when
+# the change it describes does. The worker (`python -m app.outbox`) claims due
+# events in batches, runs their handlers concurrently and deletes them once
+# handled. A claim is a lease: claimed events are pushed OUTBOX_LEASE_SECONDS
+# into the future in one short transaction, so handlers run outside any
+# transaction and a crashed worker's events are picked up again when the lease
+# ends. Delivery is therefore at-least-once; handlers must be idempotent.
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_CONCURRENCY = int(os.getenv("OUTBOX_CONCURRENCY", "10"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1"))
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "60"))
+# Handlers taking longer count as failed; keep well under the lease
+OUTBOX_HANDLER_TIMEOUT = float(os.getenv("OUTBOX_HANDLER_TIMEOUT", "30"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10"))
+# Retry n waits about OUTBOX_BACKOFF_BASE * 2**(n-1) seconds, capped
+OUTBOX_BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", "1"))
+OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", "300"))
+# Worker's Prometheus endpoint (0 disables)
+OUTBOX_METRICS_PORT = int(os.getenv("OUTBOX_METRICS_PORT", "9101"))
+
+logger = logging.getLogger("app.outbox")
+
+Handler = Callable[[dict], Awaitable[None]]
+HANDLERS: Dict[str, Handler] = {}
+
+EVENTS = Counter("outbox_events_total", "Outbox events handled, by outcome.", ("topic", "outcome"))
+EVENT_LAG = Histogram(
+    "outbox_event_lag_seconds", "Time from enqueue to successful handling.", ("topic",),
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0),
+)
+HANDLER_LATENCY = Histogram("outbox_handler_duration_seconds", "Handler run time.", ("topic",))
+PENDING = Gauge("outbox_pending_events", "Events waiting to be handled (read at scrape time).")
+OLDEST = Gauge("outbox_oldest_pending_seconds", "Age of the oldest waiting event (read at scrape time).")
+DEAD = Gauge("outbox_failed_events", "Events that exhausted their retries (read at scrape time).")
+
+METRICS = [EVENTS, EVENT_LAG, HANDLER_LATENCY, PENDING, OLDEST, DEAD]
+
+
+def handler(topic: str):
+    """Register an async function as the handler for topic."""
+    def register(fn: Handler) -> Handler:
+        HANDLERS[topic] = fn
+        return fn
+    return register
+
+
+def enqueue(db: AsyncSession, topic: str, payload: dict):
+    """Add an event to db's transaction; it is delivered only if that commits."""
+    now = datetime.utcnow()
+    db.add(OutboxEvent(topic=topic, payload=json.dumps(payload), created_at=now, available_at=now, attempts=0))
+
+
+def order_payload(order) -> dict:
+    return {
+        "order_id": order.id,
+        "user_id": order.user_id,
+        "status": order.status,
+        "total_amount": str(order.total_amount),
+    }
+
+
+def backoff(attempts: int) -> float:
+    delay = min(OUTBOX_BACKOFF_MAX, OUTBOX_BACKOFF_BASE * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)  # jitter spreads out retries of a failed burst
+
+
+@handler("order.created")
+@handler("order.paid")
+@handler("order.cancelled")
+async def log_order_event(payload: dict):
+    # Placeholder until notifications/payments subscribe to these topics
+    logger.info("order %s is %s", payload["order_id"], payload["status"])
+
+
+class OutboxWorker:
+    """Claims due events in batches and runs their handlers concurrently."""
+
+    def __init__(
+        self,
+        session_factory=AsyncSessionLocal,
+        handlers: Dict[str, Handler] = HANDLERS,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        concurrency: int = OUTBOX_CONCURRENCY,
+    ):
+        self.session_factory = session_factory
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.limit = asyncio.Semaphore(concurrency)
+
+    async def claim(self) -> List[OutboxEvent]:
+        now = datetime.utcnow()
+        # SKIP LOCKED: concurrent workers take disjoint batches without waiting
+        due = (
+            select(OutboxEvent.id)
+            .where(OutboxEvent.failed_at.is_(None), OutboxEvent.available_at <= now)
+            .order_by(OutboxEvent.available_at, OutboxEvent.id)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        async with self.session_factory() as db:
+            events = (await db.scalars(
+                update(OutboxEvent)
+                .where(OutboxEvent.id.in_(due.scalar_subquery()))
+                .values(
+                    available_at=now + timedelta(seconds=OUTBOX_LEASE_SECONDS),
+                    attempts=OutboxEvent.attempts + 1,
+                )
+                .returning(OutboxEvent)
+            )).all()
+            await db.commit()
+        return events
+
+    async def handle(self, event: OutboxEvent) -> Optional[str]:
+        """Run event's handler; returns the error, or None on success."""
+        fn = self.handlers.get(event.topic)
+        if fn is None:
+            logger.warning("no handler for outbox topic %r; dropping event %d", event.topic, event.id)
+            return None
+        async with self.limit:
+            started = asyncio.get_running_loop().time()
+            try:
+                await asyncio.wait_for(fn(json.loads(event.payload)), OUTBOX_HANDLER_TIMEOUT)
+            except Exception as exc:
+                return f"{type(exc).__name__}: {exc}"
+            finally:
+                HANDLER_LATENCY.observe(asyncio.get_running_loop().time() - started, (event.topic,))
+        return None
+
+    async def complete(self, events: List[OutboxEvent], errors: List[Optional[str]]):
+        now = datetime.utcnow()
+        async with self.session_factory() as db:
+            done = [event.id for event, error in zip(events, errors) if error is None]
+            if done:
+                await db.execute(delete(OutboxEvent).where(OutboxEvent.id.in_(done)))
+            for event, error in zip(events, errors):
+                if error is None:
+                    EVENTS.inc((event.topic, "done"))
+                    EVENT_LAG.observe((now - event.created_at).total_seconds(), (event.topic,))
+                    continue
+                values = {"last_error": error[:2000]}
+                if event.attempts >= OUTBOX_MAX_ATTEMPTS:
+                    values["failed_at"] = now
+                    EVENTS.inc((event.topic, "failed"))
+                    logger.error("outbox event %d (%s) failed for good: %s", event.id, event.topic, error)
+                else:
+                    values["available_at"] = now + timedelta(seconds=backoff(event.attempts))
+                    EVENTS.inc((event.topic, "retry"))
+                    logger.warning("outbox event %d (%s) attempt %d failed: %s",
+                                   event.id, event.topic, event.attempts, error)
+                await db.execute(update(OutboxEvent).where(OutboxEvent.id == event.id).values(**values))
+            await db.commit()
+
+    async def run_once(self) -> int:
+        """Claim and handle one batch; returns the number of events claimed."""
+        events = await self.claim()
+        if events:
+            errors = await asyncio.gather(*(self.handle(event) for event in events))
+            await self.complete(events, errors)
+        return len(events)
+
+    async def run(self, stop: asyncio.Event, poll_interval: float = OUTBOX_POLL_INTERVAL):
+        while not stop.is_set():
+            try:
+                claimed = await self.run_once()
+            except Exception:
+                # A database outage must not stop delivery for good; claimed
+                # events are retried once their lease runs out
+                logger.exception("outbox batch failed; retrying in %ss", poll_interval)
+                claimed = 0
+            # A full batch means more are probably waiting; otherwise sleep
+            if claimed < self.batch_size:
+                try:
+                    await asyncio.wait_for(stop.wait(), poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def refresh_backlog(self):
+        now = datetime.utcnow()
+        async with self.session_factory() as db:
+            pending, oldest = (await db.execute(
+                select(func.count(), func.min(OutboxEvent.created_at)).where(OutboxEvent.failed_at.is_(None))
+            )).one()
+            dead = await db.scalar(select(func.count()).where(OutboxEvent.failed_at.is_not(None)))
+        PENDING.set(pending)
+        OLDEST.set((now - oldest).total_seconds() if oldest else 0)
+        DEAD.set(dead)
+
+    async def render_metrics(self) -> str:
+        await self.refresh_backlog()
+        return "\n".join(line for metric in METRICS for line in metric.render()) + "\n"
+
+
+async def serve_metrics(worker: OutboxWorker, port: int):
+    """Minimal HTTP endpoint for Prometheus; every path returns the metrics."""
+    async def respond(reader, writer):
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            body = (await worker.render_metrics()).encode()
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: " + CONTENT_TYPE.encode()
+                + b"\r\nContent-Length: " + str(len(body)).encode()
+                + b"\r\nConnection: close\r\n\r\n" + body
+            )
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+    return await asyncio.start_server(respond, "0.0.0.0", port)
+
+
+async def main():
+    worker = OutboxWorker()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)  # finish the current batch, then exit
+    server = await serve_metrics(worker, OUTBOX_METRICS_PORT) if OUTBOX_METRICS_PORT else None
+    logger.info("outbox worker started")
+    try:
+        await worker.run(stop)
+    finally:
+        if server is not None:
+            server.close()
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    logger.setLevel(logging.INFO)
+    asyncio.run(main())
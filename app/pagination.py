@@ -0,0 +1,65 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from typing import Optional, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import tuple_
+import binascii
+import json
+
+# Keyset (cursor) pagination, by default over (created_at, id).
+#
+# A cursor is the opaque, url-safe encoding of the last row's sort key; the
+# next page is everything strictly after it, so page N costs the same index
+# range scan as page 1.
+
+def encode_key(*values) -> str:
+    """Encode a JSON-serializable sort key as an opaque cursor."""
+    raw = json.dumps(list(values), separators=(",", ":")).encode()
+    return urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+def decode_key(cursor: str, size: int) -> list:
+    try:
+        values = json.loads(urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != size:
+            raise ValueError(cursor)
+        return values
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    return encode_key(created_at.isoformat(), row_id)
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    created_at, row_id = decode_key(cursor, 2)
+    try:
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def keyset_page(stmt, model, cursor: Optional[str], limit: int, descending: bool = False):
+    """Order stmt by (created_at, id) and restrict it to the page after cursor.
+
+    Selects one extra row so callers can tell whether another page follows.
+    """
+    sort_key = tuple_(model.created_at, model.id)
+    if cursor:
+        position = decode_cursor(cursor)
+        stmt = stmt.where(sort_key < position if descending else sort_key > position)
+    if descending:
+        stmt = stmt.order_by(model.created_at.desc(), model.id.desc())
+    else:
+        stmt = stmt.order_by(model.created_at, model.id)
+    return stmt.limit(limit + 1)
+
+def split_page(rows, limit: int):
+    """Trim the look-ahead row and return (rows, next_cursor)."""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
@@ -0,0 +1,299 @@
+from collections import deque
+from typing import List, NamedTuple, Optional, Tuple
+from starlette.routing import Match
+from app.auth import decode_token
+from app.cache import REDIS_URL, TTLCache
+from app.database import env_flag
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+
+# Rate limiting and load shedding, as one pure ASGI middleware.
+#
+# Rate limits are token buckets per (rule, client, route): a client may burst
+# up to N requests, then continues at N per period; beyond that it gets 429
+# with Retry-After. Buckets live in process, or in Redis when REDIS_URL is set
+# so all workers share them.
+#
+# Load shedding caps the requests a worker serves at once. Requests beyond the
+# cap queue briefly; one that would wait longer than LOAD_SHED_MAX_WAIT_MS gets
+# 503 with Retry-After instead, so a burst cannot push every request's latency
+# up without bound.
+
+RATE_LIMIT_ENABLED = env_flag("RATE_LIMIT_ENABLED", "true")
+# "METHOD ROUTE KEY N/SECONDS" entries separated by ";". ROUTE is a route
+# template as declared (e.g. /orders/{order_id}) and METHOD/ROUTE may be "*";
+# KEY is "ip" or "user" (the token subject; anonymous requests skip user rules)
+RATE_LIMITS = os.getenv(
+    "RATE_LIMITS",
+    "POST /auth/login ip 10/60; POST /auth/register ip 10/60; * * user 50/1; * * ip 100/1",
+)
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# Requests served at once per worker (0 disables shedding)
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "100"))
+LOAD_SHED_MAX_WAIT_MS = float(os.getenv("LOAD_SHED_MAX_WAIT_MS", "500"))
+LOAD_SHED_MAX_QUEUE = int(os.getenv("LOAD_SHED_MAX_QUEUE", "1000"))
+# Probes and scrapes are never limited
+EXEMPT_PATHS = frozenset(["/health", "/ready", "/metrics"])
+
+logger = logging.getLogger("app.ratelimit")
+
+
+class Rule(NamedTuple):
+    method: str
+    route: str
+    key: str
+    limit: int
+    period: float
+
+    @property
+    def rate(self) -> float:
+        return self.limit / self.period
+
+    def applies(self, method: str, route: str) -> bool:
+        return self.method in ("*", method) and self.route in ("*", route)
+
+
+def parse_rules(spec: str) -> List[Rule]:
+    rules = []
+    for entry in filter(None, (part.strip() for part in spec.split(";"))):
+        try:
+            method, route, key, rate = entry.split()
+            limit, period = rate.split("/")
+            rule = Rule(method.upper(), route, key, int(limit), float(period))
+        except ValueError:
+            raise ValueError(f"bad rate limit {entry!r}; expected 'METHOD ROUTE ip|user N/SECONDS'")
+        if rule.key not in ("ip", "user") or rule.limit < 1 or rule.period <= 0:
+            raise ValueError(f"bad rate limit {entry!r}")
+        rules.append(rule)
+    return rules
+
+
+def refill(tokens: Optional[float], updated_at: float, now: float, rate: float, capacity: float) -> Tuple[float, float]:
+    """Token bucket step: returns (tokens left, seconds until allowed; 0 = allowed).
+
+    A bucket never seen before (tokens None) starts full.
+    """
+    tokens = capacity if tokens is None else min(capacity, tokens + max(0.0, now - updated_at) * rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / rate
+
+
+class LocalBuckets:
+    """Token buckets in this process; a bucket idle long enough to refill is dropped."""
+
+    def __init__(self, maxsize: int = RATE_LIMIT_MAX_KEYS, timer=time.monotonic):
+        self.buckets = TTLCache(maxsize=maxsize, timer=timer)
+        self.timer = timer
+
+    async def take(self, key: str, rate: float, capacity: float) -> float:
+        now = self.timer()
+        tokens, updated_at = self.buckets.get(key, (None, now))
+        tokens, wait = refill(tokens, updated_at, now, rate, capacity)
+        self.buckets.set(key, (tokens, now), ttl=capacity / rate)
+        return wait
+
+
+# Same step as refill(), atomic in Redis; Redis' clock keeps workers consistent
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'at')
+local tokens = capacity
+if state[1] then
+    tokens = math.min(capacity, tonumber(state[1]) + math.max(0, now - tonumber(state[2])) * rate)
+end
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'at', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return tostring(wait)
+"""
+
+
+class RedisBuckets:
+    """Token buckets shared by every worker through Redis."""
+
+    def __init__(self, client, prefix: str = "lampshades:ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+        # Runs by EVALSHA, reloading the script if Redis has lost it
+        self.script = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs):
+        import redis.asyncio as redis  # optional dependency
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    async def take(self, key: str, rate: float, capacity: float) -> float:
+        try:
+            result = await self.script(keys=[self.prefix + key], args=[repr(rate), repr(capacity)])
+        except Exception:
+            # Fail open: an unreachable Redis must not take the API down with it
+            logger.warning("rate limit backend unavailable; allowing request", exc_info=True)
+            return 0.0
+        return float(result)
+
+
+def get_buckets():
+    """Shared buckets when REDIS_URL is configured, otherwise in-process."""
+    if REDIS_URL:
+        return RedisBuckets.from_url(REDIS_URL)
+    return LocalBuckets()
+
+
+class ConcurrencyLimiter:
+    """At most `limit` holders; others wait in FIFO order up to max_wait seconds."""
+
+    def __init__(self, limit: int, max_wait: float, max_queue: int):
+        self.limit = limit
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiters = deque()
+
+    async def acquire(self) -> bool:
+        """Take a slot; False means shed (queue full or waited too long)."""
+        if self.active < self.limit:
+            self.active += 1
+            return True
+        if len(self.waiters) >= self.max_queue:
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            # shield: on timeout, check whether the slot arrived meanwhile
+            await asyncio.wait_for(asyncio.shield(waiter), self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+            if waiter.done():
+                if isinstance(exc, asyncio.TimeoutError):
+                    return True  # handed a slot just as the wait ran out
+                self.release()  # the client went away holding a slot
+            else:
+                waiter.cancel()
+                self.waiters.remove(waiter)
+            if isinstance(exc, asyncio.CancelledError):
+                raise
+            return False
+        return True
+
+    def release(self):
+        # Hand the slot straight to the next waiter, if any
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+def _client_ip(scope) -> str:
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def _token_subject(scope) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer":
+                return None
+            try:
+                return decode_token(token).get("sub")
+            except Exception:
+                return None  # the route's own authentication rejects it
+    return None
+
+
+async def _reject(send, status_code: int, detail: str, retry_after: float):
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class RateLimitMiddleware:
+    """Rejects over-limit clients with 429 and sheds excess load with 503."""
+
+    def __init__(
+        self,
+        app,
+        routes: list,
+        rules: Optional[List[Rule]] = None,
+        buckets=None,
+        max_concurrent: int = MAX_CONCURRENT_REQUESTS,
+        max_wait: float = LOAD_SHED_MAX_WAIT_MS / 1000,
+        max_queue: int = LOAD_SHED_MAX_QUEUE,
+    ):
+        self.app = app
+        self.routes = routes  # the router's list; routes added later are seen too
+        self.rules = parse_rules(RATE_LIMITS) if rules is None else rules
+        self.buckets = get_buckets() if buckets is None else buckets
+        self.limiter = ConcurrencyLimiter(max_concurrent, max_wait, max_queue) if max_concurrent else None
+
+    def match_route(self, scope):
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route
+        return None
+
+    async def retry_after(self, scope, method: str, route: str) -> float:
+        subject = None
+        for index, rule in enumerate(self.rules):
+            if not rule.applies(method, route):
+                continue
+            if rule.key == "ip":
+                identity = _client_ip(scope)
+            else:
+                subject = subject or _token_subject(scope)
+                if subject is None:
+                    continue
+                identity = subject
+            # One bucket per rule: overlapping rules must not drain each other's
+            wait = await self.buckets.take(f"{rule.key}:{identity}:{method} {route}:{index}", rule.rate, rule.limit)
+            if wait:
+                return wait
+        return 0.0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        route = self.match_route(scope)
+        if route is not None:
+            scope["route"] = route  # lets the metrics label rejections by route
+        method = scope["method"]
+        wait = await self.retry_after(scope, method, getattr(route, "path", "unmatched"))
+        if wait:
+            await _reject(send, 429, "Too many requests", wait)
+            return
+
+        if self.limiter is None:
+            await self.app(scope, receive, send)
+            return
+        if not await self.limiter.acquire():
+            await _reject(send, 503, "Server busy, retry shortly", self.limiter.max_wait)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.limiter.release()
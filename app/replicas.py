@@ -0,0 +1,227 @@
+from contextlib import asynccontextmanager
+from fastapi import Depends
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jose import JWTError
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from app.auth import decode_token
+from app.cache import LocalBackend, get_backend
+from app.database import AsyncSessionLocal, async_engine, create_api_engine, get_async_url
+import asyncio
+import itertools
+import os
+import time
+
+# Read-replica routing for read-only endpoints.
+#
+# Reads go round-robin to healthy replicas. A replica is taken out of rotation
+# when it cannot be reached or lags more than DB_REPLICA_MAX_LAG seconds, and
+# reads fall back to the primary when none is left. A replica that fails in
+# the middle of a read is taken out too, and the statement is retried on the
+# primary (streamed reads cannot be retried once rows have been sent). A user
+# who has just written reads from the primary for READ_YOUR_WRITES_SECONDS,
+# so they always see their own changes.
+
+# Comma-separated sync URLs, like DATABASE_URL; unset means primary only
+DB_REPLICA_URLS = [url.strip() for url in os.getenv("DB_REPLICA_URLS", "").split(",") if url.strip()]
+DB_REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", "5"))
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "5"))
+DB_REPLICA_CHECK_TIMEOUT = float(os.getenv("DB_REPLICA_CHECK_TIMEOUT", "1"))
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
+# Users (by token subject) who committed a write recently; shared across
+# workers when REDIS_URL is set
+recent_writers = get_backend("recent-writers", ttl=READ_YOUR_WRITES_SECONDS)
+
+optional_bearer = HTTPBearer(auto_error=False)
+
+# Replay lag in seconds; zero when the replica has applied everything it received
+PG_LAG_QUERY = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() "
+    "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+async def measure_lag(conn) -> float:
+    if conn.dialect.name == "postgresql":
+        return float(await conn.scalar(PG_LAG_QUERY))
+    await conn.execute(text("SELECT 1"))  # no replication to measure; liveness only
+    return 0.0
+
+
+class Replica:
+    def __init__(self, url: str, engine):
+        self.url = url
+        self.engine = engine
+        self.healthy = True
+        self.lag = 0.0
+        self.checked_at = float("-inf")
+        self.checking = False
+
+    def snapshot(self) -> dict:
+        return {
+            "url": make_url(self.url).render_as_string(hide_password=True),
+            "healthy": self.healthy,
+            "lag_seconds": round(self.lag, 3),
+        }
+
+
+class ReplicaSet:
+    """Round-robin over replicas, skipping those that are down or lagging."""
+
+    def __init__(self, replicas: List[Replica]):
+        self.replicas = replicas
+        self._turn = itertools.count()
+
+    @classmethod
+    def from_urls(cls, urls: List[str], **engine_overrides):
+        return cls([Replica(url, create_api_engine(get_async_url(url), **engine_overrides)) for url in urls])
+
+    async def check(self, replica: Replica):
+        replica.checking = True
+        try:
+            async with replica.engine.connect() as conn:
+                replica.lag = await asyncio.wait_for(measure_lag(conn), DB_REPLICA_CHECK_TIMEOUT)
+            replica.healthy = replica.lag <= DB_REPLICA_MAX_LAG
+        except (DBAPIError, OSError, asyncio.TimeoutError):
+            replica.healthy = False
+        finally:
+            replica.checked_at = time.monotonic()
+            replica.checking = False
+
+    async def choose(self) -> Optional[Replica]:
+        if not self.replicas:
+            return None
+        start = next(self._turn)
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            # Re-check lazily; concurrent requests use the last result meanwhile
+            if not replica.checking and time.monotonic() - replica.checked_at > DB_REPLICA_CHECK_INTERVAL:
+                await self.check(replica)
+            if replica.healthy:
+                return replica
+        return None
+
+    def mark_failed(self, replica: Replica):
+        replica.healthy = False
+        replica.checked_at = time.monotonic()
+
+    async def dispose(self):
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    def snapshot(self) -> list:
+        return [replica.snapshot() for replica in self.replicas]
+
+
+read_replicas = ReplicaSet.from_urls(DB_REPLICA_URLS)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session, flush_context):
+    session.info["wrote"] = True
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_dml(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["wrote"] = True
+
+@event.listens_for(Session, "after_commit")
+def _remember_writer(session):
+    # get_current_user records the principal on the request's session
+    email = session.info.get("principal_email")
+    if not session.info.pop("wrote", False) or email is None:
+        return
+    if isinstance(recent_writers, LocalBackend):
+        recent_writers.cache.set(email, True)
+        return
+    try:
+        asyncio.get_running_loop().create_task(recent_writers.set(email, True))
+    except RuntimeError:
+        pass  # no event loop (scripts)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_write(session):
+    session.info.pop("wrote", None)
+
+
+def token_subject(credentials: Optional[HTTPAuthorizationCredentials]) -> Optional[str]:
+    if credentials is None:
+        return None
+    try:
+        return decode_token(credentials.credentials).get("sub")
+    except JWTError:
+        return None  # the route's own authentication rejects it
+
+
+def _replica_failed(exc: DBAPIError) -> bool:
+    # Lost connections and server-side failures, not errors in the statement
+    return exc.connection_invalidated or isinstance(exc, (OperationalError, InterfaceError))
+
+
+class ReplicaSession(AsyncSession):
+    """Read session on a replica; moves to the primary if the replica fails."""
+
+    def __init__(self, replica: Replica, conn):
+        super().__init__(bind=conn, autoflush=False, expire_on_commit=False)
+        self.replica = replica
+
+    async def _retry_on_primary(self, method, *args, **kwargs):
+        try:
+            return await method(*args, **kwargs)
+        except DBAPIError as exc:
+            if self.replica is None or not _replica_failed(exc):
+                raise
+        read_replicas.mark_failed(self.replica)
+        self.replica = None
+        await self.rollback()
+        self.bind = async_engine
+        self.sync_session.bind = async_engine.sync_engine
+        return await method(*args, **kwargs)
+
+    async def execute(self, *args, **kwargs):
+        return await self._retry_on_primary(super().execute, *args, **kwargs)
+
+    async def scalar(self, *args, **kwargs):
+        return await self._retry_on_primary(super().scalar, *args, **kwargs)
+
+    async def get(self, *args, **kwargs):
+        return await self._retry_on_primary(super().get, *args, **kwargs)
+
+
+@asynccontextmanager
+async def read_session(primary: bool = False):
+    """Session on a healthy replica, or on the primary if primary or none is usable."""
+    replica = None if primary else await read_replicas.choose()
+    if replica is not None:
+        try:
+            conn = await replica.engine.connect()
+        except (DBAPIError, OSError):
+            read_replicas.mark_failed(replica)
+            replica = None
+    if replica is None:
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
+    try:
+        async with ReplicaSession(replica, conn) as db:
+            yield db
+    finally:
+        await conn.close()
+
+
+async def wrote_recently(email: Optional[str]) -> bool:
+    """Whether the user committed a write within READ_YOUR_WRITES_SECONDS."""
+    return email is not None and await recent_writers.get(email) is not None
+
+
+async def get_read_db(credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_bearer)):
+    """Session for read-only routes; the primary for users who just wrote."""
+    email = token_subject(credentials) if read_replicas.replicas else None
+    async with read_session(primary=await wrote_recently(email)) as db:
+        yield db
@@ -1,7 +1,7 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import List, Optional
 from decimal import Decimal
-from datetime import datetime
+from datetime import date, datetime
 
 # User schemas
 class UserCreate(BaseModel):
@@ -49,6 +49,10 @@ class CartItemCreate(BaseModel):
     product_id: int
     quantity: int
 
+class CartItemUpdate(BaseModel):
+    product_id: int
+    quantity: int = Field(ge=0)  # 0 removes the line
+
 class CartItemResponse(BaseModel):
     product_id: int
     product_name: str
@@ -66,6 +70,15 @@ class CartResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class CartSummaryResponse(BaseModel):
+    item_count: int
+    quantity: int
+    total_amount: Decimal
+    version: int
+
+    class Config:
+        from_attributes = True
+
 # Order schemas
 class OrderCreate(BaseModel):
     pass  # Empty for now, we'll use cart contents
@@ -102,4 +115,32 @@ class OrderDetailResponse(BaseModel):
 
 # Payment/Order status schemas
 class OrderStatusUpdate(BaseModel):
-    status: str
\ No newline at end of file
+    status: str
+
+# Catalog import schemas
+class CatalogImportResponse(BaseModel):
+    imported: int
+    rejected: int
+    errors: List[str]
+
+    class Config:
+        from_attributes = True
+
+# Analytics schemas
+class SalesTotals(BaseModel):
+    paid_orders: int
+    paid_units: int
+    paid_revenue: Decimal
+    cancelled_orders: int
+    cancelled_units: int
+    cancelled_revenue: Decimal
+
+    class Config:
+        from_attributes = True
+
+class DailySalesResponse(SalesTotals):
+    day: date
+
+class ProductSalesResponse(SalesTotals):
+    product_id: int
+    product_name: str
@@ -0,0 +1,101 @@
+from sqlalchemy import DDL, column, event, func, literal_column, or_, select, table
+from fastapi import HTTPException, status
+from app.models import Product
+from app.pagination import decode_key
+from typing import List, Optional
+import re
+
+# Full-text product search over name and description.
+#
+# Postgres: a generated, weighted tsvector column with a GIN index, queried
+# with to_tsquery and ranked with ts_rank.
+# SQLite: an external-content FTS5 table kept current by triggers, ranked
+# with bm25. Both match every term as a prefix and page by (rank, id).
+
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+PG_SEARCH_DDL = [
+    """
+    ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_products_search_vector ON products USING GIN (search_vector)",
+]
+
+SQLITE_SEARCH_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        name, description, content='products', content_rowid='id', tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO products_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+    "INSERT INTO products_fts(products_fts) VALUES ('rebuild')",
+]
+
+# Keep Base.metadata.create_all/drop_all in step with the migration
+for statement in PG_SEARCH_DDL:
+    event.listen(Product.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+for statement in SQLITE_SEARCH_DDL:
+    event.listen(Product.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+event.listen(
+    Product.__table__, "before_drop",
+    DDL("DROP TABLE IF EXISTS products_fts").execute_if(dialect="sqlite")
+)
+
+
+def search_terms(query: str) -> List[str]:
+    return _TERM.findall(query.lower())[:16]
+
+
+def decode_search_cursor(cursor: str) -> list:
+    rank, row_id = decode_key(cursor, 2)
+    try:
+        return [float(rank), int(row_id)]
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def search_statement(dialect: str, terms: List[str], after: Optional[list], limit: int):
+    """Select (Product, rank) for terms, best match first, after the (rank, id) cursor."""
+    if dialect == "postgresql":
+        vector = literal_column("products.search_vector")
+        query = func.to_tsquery(literal_column("'english'::regconfig"), " & ".join(f"{term}:*" for term in terms))
+        rank = func.ts_rank(vector, query)
+        stmt = select(Product, rank.label("rank")).where(vector.op("@@")(query))
+    else:
+        fts = table("products_fts", column("rowid"))
+        # bm25 is lower-is-better; negate so both backends rank descending
+        rank = -func.bm25(literal_column("products_fts"), 10.0, 1.0)
+        stmt = (
+            select(Product, rank.label("rank"))
+            .join(fts, fts.c.rowid == Product.id)
+            .where(literal_column("products_fts").op("MATCH")(" AND ".join(f'"{term}"*' for term in terms)))
+        )
+
+    if after is not None:
+        after_rank, after_id = after
+        stmt = stmt.where(or_(rank < after_rank, (rank == after_rank) & (Product.id > after_id)))
+    return stmt.order_by(rank.desc(), Product.id).limit(limit + 1)
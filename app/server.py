@@ -0,0 +1,189 @@
+"""
+Production server: a pre-forking supervisor running uvicorn workers.
+
+Usage:
+    python -m app.server --workers 4 --port 8000
+
+The application is imported once in the supervisor and the listening socket
+bound once; workers are forked afterwards, so they share the loaded code
+(copy-on-write) and accept from the same socket. Each worker replaces the
+inherited engine pools and runs its own startup (schema check, warm-up).
+
+SIGTERM or SIGINT drains: workers stop accepting, finish in-flight requests
+for up to GRACEFUL_TIMEOUT seconds and exit; stragglers are killed. A worker
+that dies unexpectedly is replaced.
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+# Defaults, all overridable on the command line
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+# Longer than common load balancer idle timeouts (60 s), so the balancer
+# closes idle connections first and never reuses one we just dropped
+KEEP_ALIVE = int(os.getenv("KEEP_ALIVE", "75"))
+BACKLOG = int(os.getenv("BACKLOG", "2048"))
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+
+logger = logging.getLogger("app.server")
+
+
+def cpu_count() -> int:
+    """CPUs this process may run on (respects affinity/cpusets)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def worker_count() -> int:
+    # One event loop per core; WEB_CONCURRENCY follows the uvicorn/gunicorn convention
+    return int(os.getenv("WEB_CONCURRENCY", "0")) or cpu_count()
+
+
+def bind_socket(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def uvicorn_config(app, args):
+    import uvicorn
+    return uvicorn.Config(
+        app,
+        loop="auto",
+        http="auto",
+        lifespan="on",
+        timeout_keep_alive=args.keep_alive,
+        backlog=args.backlog,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        access_log=args.access_log,
+        proxy_headers=True,
+        forwarded_allow_ips=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+    )
+
+
+def reset_after_fork():
+    """Give a freshly forked worker its own connection pools."""
+    from app.database import async_engine, engine
+    from app.replicas import read_replicas
+    # close=False: the connections (if any) belong to the supervisor; only
+    # drop the references so this process opens its own
+    async_engine.sync_engine.dispose(close=False)
+    engine.dispose(close=False)
+    for replica in read_replicas.replicas:
+        replica.engine.sync_engine.dispose(close=False)
+
+
+def run_worker(app, sock, args):
+    import uvicorn
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, signal.SIG_DFL)
+    reset_after_fork()
+    server = uvicorn.Server(uvicorn_config(app, args))
+    # uvicorn installs its own SIGTERM/SIGINT handlers and drains on them
+    server.run(sockets=[sock])
+    # startup failures (e.g. schema out of date) leave started False
+    return 0 if server.started else 3
+
+
+def serve(args):
+    from app.main import app  # preload: imported once, shared by all workers
+    from app.startup import DB_CREATE_ALL
+
+    if DB_CREATE_ALL:
+        # Create tables once here; workers racing to do it would collide
+        from app.database import Base, engine
+        Base.metadata.create_all(bind=engine)
+        engine.dispose()
+
+    sock = bind_socket(args.host, args.port, args.backlog)
+    workers = {}
+    stopping = False
+    deadline = None
+
+    def spawn(index):
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                code = run_worker(app, sock, args)
+            finally:
+                os._exit(code)
+        workers[pid] = (index, time.monotonic())
+
+    def stop(signum, frame):
+        nonlocal stopping, deadline
+        if stopping:
+            return
+        stopping = True
+        deadline = time.monotonic() + args.graceful_timeout + 5
+        logger.info("draining %d workers", len(workers))
+        for pid in workers:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for index in range(args.workers):
+        spawn(index)
+    logger.info("listening on %s:%d with %d workers", args.host, args.port, args.workers)
+
+    exit_code = 0
+    while workers:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid:
+            index, started = workers.pop(pid)
+            code = os.waitstatus_to_exitcode(status)
+            if stopping:
+                continue
+            if code == 3:
+                # The worker could not start; others would fail the same way
+                logger.error("worker %d failed to start, shutting down", index)
+                exit_code = code
+                stop(signal.SIGTERM, None)
+                continue
+            logger.warning("worker %d exited with %d, restarting", index, code)
+            if time.monotonic() - started < 1:
+                time.sleep(1)  # don't spin on a crash loop
+            spawn(index)
+        elif stopping and time.monotonic() > deadline:
+            for pid in workers:
+                os.kill(pid, signal.SIGKILL)
+            time.sleep(0.1)
+        else:
+            time.sleep(0.1)
+
+    sock.close()
+    return exit_code
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=worker_count())
+    parser.add_argument("--keep-alive", type=int, default=KEEP_ALIVE, help="idle keep-alive seconds")
+    parser.add_argument("--backlog", type=int, default=BACKLOG, help="listen queue length")
+    parser.add_argument("--graceful-timeout", type=int, default=GRACEFUL_TIMEOUT,
+                        help="seconds to finish in-flight requests on shutdown")
+    parser.add_argument("--access-log", action="store_true")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    logger.setLevel(logging.INFO)
+    sys.exit(serve(parse_args()))
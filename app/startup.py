@@ -0,0 +1,120 @@
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from app.api.products import catalog_cache, render_catalog_page
+from app.database import DB_POOL_SIZE, Base, async_engine, env_flag
+from contextlib import AsyncExitStack
+import ast
+import os
+import time
+
+# Startup checks and warm-up run once per worker by the app lifespan.
+#
+# Schema changes belong to `alembic upgrade head`; a worker only confirms the
+# database is at the revision its code expects, with one query.
+
+# Create tables with metadata.create_all instead of checking migrations
+# (local SQLite development and tests)
+DB_CREATE_ALL = env_flag("DB_CREATE_ALL")
+# Connections opened before the worker reports ready
+DB_WARM_CONNECTIONS = int(os.getenv("DB_WARM_CONNECTIONS", str(min(DB_POOL_SIZE, 2))))
+ALEMBIC_SCRIPT_LOCATION = os.getenv(
+    "ALEMBIC_SCRIPT_LOCATION",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic"),
+)
+
+
+class SchemaOutOfDate(RuntimeError):
+    pass
+
+
+class Readiness:
+    """Whether this worker should receive traffic, with startup timings."""
+
+    def __init__(self):
+        self.ready = False
+        self.timings = {}
+
+    def snapshot(self) -> dict:
+        return {"ready": self.ready, "startup_ms": {k: round(v * 1000, 2) for k, v in self.timings.items()}}
+
+
+readiness = Readiness()
+
+
+def _revision_ids(value) -> set:
+    if value is None:
+        return set()
+    return {value} if isinstance(value, str) else set(value)
+
+
+def expected_heads(script_location: str = ALEMBIC_SCRIPT_LOCATION) -> set:
+    """Head revisions of the migration scripts.
+
+    Read from each script's `revision`/`down_revision` assignments rather than
+    through alembic.script, whose import alone costs more than the whole check.
+    """
+    revisions, parents = set(), set()
+    versions = os.path.join(script_location, "versions")
+    for name in os.listdir(versions):
+        if not name.endswith(".py"):
+            continue
+        with open(os.path.join(versions, name)) as f:
+            tree = ast.parse(f.read(), name)
+        for node in tree.body:
+            if isinstance(node, (ast.Assign, ast.AnnAssign)) and node.value is not None:
+                targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+                names = {target.id for target in targets if isinstance(target, ast.Name)}
+                if "revision" in names:
+                    revisions |= _revision_ids(ast.literal_eval(node.value))
+                elif "down_revision" in names:
+                    parents |= _revision_ids(ast.literal_eval(node.value))
+    return revisions - parents
+
+
+async def check_schema(api_engine=async_engine, heads: set = None):
+    """Raise SchemaOutOfDate unless the database is at the Alembic head revision."""
+    heads = expected_heads() if heads is None else heads
+    try:
+        async with api_engine.connect() as conn:
+            current = set((await conn.scalars(text("SELECT version_num FROM alembic_version"))).all())
+    except DBAPIError:
+        current = set()
+    if current != heads:
+        raise SchemaOutOfDate(
+            f"database is at revision {sorted(current) or 'none'}, code expects {sorted(heads)}; "
+            "run `alembic upgrade head`"
+        )
+
+
+async def create_schema(api_engine=async_engine):
+    async with api_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def warm_pool(api_engine=async_engine, connections: int = DB_WARM_CONNECTIONS):
+    """Open connections up front so the first requests do not pay for them."""
+    async with AsyncExitStack() as stack:
+        # Hold each connection until all are open, so the pool has to create them
+        for _ in range(connections):
+            conn = await stack.enter_async_context(api_engine.connect())
+            await conn.execute(text("SELECT 1"))
+
+
+async def warm_catalog():
+    """Render the default first catalog page into the cache."""
+    await catalog_cache.get_or_load((None, 0, 100), lambda: render_catalog_page(None, 0, 100))
+
+
+async def start(api_engine=async_engine):
+    """Prepare this worker for traffic, recording how long each step took."""
+    readiness.ready = False
+    steps = [
+        ("schema", lambda: create_schema(api_engine) if DB_CREATE_ALL else check_schema(api_engine)),
+        ("pool", lambda: warm_pool(api_engine)),
+        ("catalog", warm_catalog),
+    ]
+    for name, step in steps:
+        started = time.perf_counter()
+        await step()
+        readiness.timings[name] = time.perf_counter() - started
+    readiness.ready = True
@@ -0,0 +1,119 @@
+"""
+Analytics benchmark: rollup reads against full-scan aggregation as order
+history grows.
+
+Usage:
+    python -m benchmarks.analytics_benchmark --items 1000000,10000000
+    DATABASE_URL=postgresql://... python -m benchmarks.analytics_benchmark --items 10000000
+
+For each size it recreates the schema in DATABASE_URL (a temporary SQLite
+database by default; never point it at real data) with --items order items,
+three per order, spread over a year of orders (mostly paid, some cancelled
+or pending). It then times each report two ways: aggregating the order
+tables (the query `python -m app.analytics rebuild` runs) and reading the
+rollups behind /admin/analytics. Full scans grow with the history; rollup
+reads stay about the same.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+from sqlalchemy import insert
+
+from app.analytics import rebuild_rollups, sales_by_day, sales_by_product, scan_sales_by_day, scan_sales_by_product
+from app.database import AsyncSessionLocal, Base, async_engine, engine
+from app.models import Order, OrderItem, Product, User
+
+BATCH = 30_000
+PRODUCTS = 1000
+ITEMS_PER_ORDER = 3
+
+
+def seed(items: int):
+    """Recreate the schema with items order items over a year of orders."""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(42)
+    start = datetime(2025, 1, 1)
+    orders = items // ITEMS_PER_ORDER
+    per_order = 60 * 24 * 365 / orders
+    with engine.begin() as conn:
+        conn.execute(insert(Product), [
+            {"name": f"Lamp {i}", "description": "Bench lamp", "price": 10 + i % 90} for i in range(PRODUCTS)
+        ])
+        user_id = conn.execute(
+            insert(User).values(email="buyer@example.com", password_hash="unused").returning(User.id)
+        ).scalar_one()
+    for offset in range(0, orders, BATCH):
+        ids = range(offset + 1, min(offset + BATCH, orders) + 1)
+        created = {order_id: start + timedelta(minutes=order_id * per_order) for order_id in ids}
+        lines = {order_id: [(product_id, 1 + rng.randrange(3))
+                            for product_id in rng.sample(range(1, PRODUCTS + 1), ITEMS_PER_ORDER)]
+                 for order_id in ids}
+        with engine.begin() as conn:
+            conn.execute(insert(Order.__table__), [
+                {"id": order_id, "user_id": user_id, "created_at": created[order_id],
+                 "status": rng.choices(("paid", "cancelled", "pending"), (7, 1, 2))[0],
+                 "total_amount": sum((10 + product_id % 90) * quantity for product_id, quantity in lines[order_id])}
+                for order_id in ids
+            ])
+            conn.execute(insert(OrderItem.__table__), [
+                {"order_id": order_id, "product_id": product_id, "product_name": f"Lamp {product_id - 1}",
+                 "product_price": 10 + product_id % 90, "quantity": quantity, "created_at": created[order_id]}
+                for order_id in ids for product_id, quantity in lines[order_id]
+            ])
+
+
+async def timed(query, repeat: int) -> float:
+    """Median milliseconds of query(db) over repeat runs."""
+    runs = []
+    async with AsyncSessionLocal() as db:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await query(db)
+            runs.append((time.perf_counter() - started) * 1000)
+    return statistics.median(runs)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--items", default="1000000,10000000", help="comma-separated order item counts")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per query (median reported)")
+    args = parser.parse_args()
+
+    dialect = async_engine.dialect.name
+    month = (date(2025, 6, 1), date(2025, 7, 1))
+    reports = {
+        "by day, full scan": lambda db: db.execute(scan_sales_by_day(dialect)),
+        "by day, rollup": lambda db: sales_by_day(db),
+        "one month, rollup": lambda db: sales_by_day(db, *month),
+        "by product, full scan": lambda db: db.execute(scan_sales_by_product()),
+        "top 50 products, rollup": lambda db: sales_by_product(db, 50),
+    }
+    print(f"{'items':>9} {'rebuild s':>10}  " + "  ".join(f"{name:>{max(len(name), 8)}}" for name in reports)
+          + "   (median ms)", flush=True)
+    try:
+        for items in [int(size) for size in args.items.split(",")]:
+            seed(items)
+            started = time.perf_counter()
+            async with AsyncSessionLocal() as db:
+                await rebuild_rollups(db)
+            rebuild = time.perf_counter() - started
+            results = [await timed(query, args.repeat) for query in reports.values()]
+            print(f"{items:>9} {rebuild:>10.1f}  "
+                  + "  ".join(f"{ms:>{max(len(name), 8)}.1f}" for name, ms in zip(reports, results)), flush=True)
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,79 @@
+"""
+Catalog import/export benchmark: rows/sec and peak memory by file size.
+
+Usage:
+    python -m benchmarks.catalog_benchmark --rows 100000,1000000
+    DATABASE_URL=postgresql://... python -m benchmarks.catalog_benchmark --rows 1000000 --format ndjson
+
+For each size it writes a catalog file, recreates the schema in DATABASE_URL
+(a temporary SQLite database by default; never point it at real data), then
+runs `python -m app.catalog import` and `export` as child processes. It
+reports their wall time and peak RSS. Both commands stream, so peak memory
+should stay about the same from the smallest file to the largest. On Postgres
+the import uses COPY; elsewhere it falls back to batched inserts.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+
+def write_catalog(path: str, rows: int, fmt: str):
+    with open(path, "w", encoding="utf-8") as out:
+        if fmt == "csv":
+            out.write("name,description,price\n")
+        for i in range(rows):
+            name, description, price = f"Shade {i}", f"Bench shade {i}, size {i % 7}", f"{10 + i % 990}.{i % 100:02d}"
+            if fmt == "csv":
+                out.write(f'{name},"{description}",{price}\n')
+            else:
+                out.write(json.dumps({"name": name, "description": description, "price": price}) + "\n")
+
+
+def reset_schema():
+    from app.database import Base, engine
+    from app import search  # registers the products table and its search index
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+
+
+def run_child(args: list) -> tuple:
+    """Wall seconds and peak RSS (MiB) of `python -m app.catalog ARGS`."""
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", "app.catalog", *args], cwd=ROOT, stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    if status:
+        sys.exit(f"app.catalog {args[0]} failed")
+    return time.perf_counter() - started, usage.ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", default="100000,1000000", help="comma-separated catalog sizes")
+    parser.add_argument("--format", choices=("csv", "ndjson"), default="csv")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    print(f"{'rows':>9} {'file MiB':>9} {'import s':>9} {'rows/s':>9} {'RSS MiB':>8} "
+          f"{'export s':>9} {'rows/s':>9} {'RSS MiB':>8}", flush=True)
+    for rows in [int(size) for size in args.rows.split(",")]:
+        path = os.path.join(workdir, f"catalog.{args.format}")
+        write_catalog(path, rows, args.format)
+        reset_schema()
+        import_seconds, import_rss = run_child(["import", path])
+        export_seconds, export_rss = run_child(["export", "--format", args.format, "-o", os.devnull])
+        print(f"{rows:>9} {os.path.getsize(path) / 2**20:>9.1f} {import_seconds:>9.2f} {rows / import_seconds:>9.0f} "
+              f"{import_rss:>8.0f} {export_seconds:>9.2f} {rows / export_seconds:>9.0f} {export_rss:>8.0f}")
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
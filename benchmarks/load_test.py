@@ -0,0 +1,370 @@
+"""
+Load test: mixed shopper traffic with RPS, latency percentiles and queries/request.
+
+Usage:
+    python -m benchmarks.load_test --users 32 --seconds 20
+    python -m benchmarks.load_test --url http://localhost:8000 --no-seed
+    python -m benchmarks.load_test --baseline benchmarks/baseline.json
+    python -m benchmarks.load_test --save-baseline benchmarks/baseline.json
+
+Seeds DATABASE_URL (a temporary SQLite database by default; the tables are
+dropped and recreated, so never point it at real data) with shoppers, a
+catalog, carts and order histories. Each virtual user then logs in and loops
+over weighted scenarios (browse, search, add-to-cart, checkout, pay, cancel)
+until the time is up.
+
+By default the app runs in-process; with --url the same traffic goes to a
+running server (seed its database by sharing DATABASE_URL, or pass --no-seed
+if it already holds the load-test accounts). In-process runs also replay every
+scenario once on its own to count the SQL statements each endpoint issues.
+
+With --baseline the run exits non-zero if throughput drops, p95 latency grows
+beyond the tolerance, any endpoint issues more statements than recorded, or
+more than 0.1% of requests fail with a 5xx.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+# Every simulated client shares one address; per-IP limits would throttle the run
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import httpx
+from sqlalchemy import event, insert
+
+from app.auth import pwd_context
+from app.database import Base, async_engine, engine
+from app.main import app
+from app.models import Cart, Order, OrderItem, Product, User
+
+PASSWORD = "bench-password"
+BATCH = 10_000
+SEARCH_TERMS = ["lamp", "linen", "shade", "drum", "brass", "silk"]
+MATERIALS = ["linen", "silk", "paper", "brass", "cotton", "rattan"]
+SHAPES = ["drum", "empire", "bell", "square", "cone", "globe"]
+
+# Relative frequency of each scenario in the traffic mix
+WEIGHTS = {
+    "browse": 40,
+    "search": 10,
+    "add_to_cart": 25,
+    "order_history": 10,
+    "checkout": 7,
+    "pay": 5,
+    "cancel": 3,
+}
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def shopper_email(i: int) -> str:
+    return f"shopper{i}@example.com"
+
+
+def seed(users: int, products: int, orders_per_user: int, cart_lines: int):
+    """Recreate the schema and bulk-load shoppers, catalog, carts and order history."""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(42)
+    start = datetime(2025, 1, 1)
+    password_hash = pwd_context.hash(PASSWORD)
+    with engine.begin() as conn:
+        for offset in range(0, products, BATCH):
+            conn.execute(insert(Product), [
+                {"name": f"{MATERIALS[i % 6].title()} {SHAPES[i // 6 % 6]} lamp shade {i}",
+                 "description": f"Hand-made {MATERIALS[i % 6]} shade, {20 + i % 40} cm",
+                 "price": 10 + i % 90, "created_at": start + timedelta(seconds=i)}
+                for i in range(offset, min(products, offset + BATCH))
+            ])
+        user_ids = conn.execute(
+            insert(User).returning(User.id),
+            [{"email": shopper_email(i), "password_hash": password_hash} for i in range(users)],
+        ).scalars().all()
+
+        carts, orders = [], []
+        for user_id in user_ids:
+            for product_id in rng.sample(range(1, products + 1), min(cart_lines, products)):
+                carts.append({"user_id": user_id, "product_id": product_id, "quantity": rng.randint(1, 3)})
+            for n in range(orders_per_user):
+                orders.append({"user_id": user_id, "total_amount": 0,
+                               "status": rng.choice(["paid", "paid", "cancelled", "pending"]),
+                               "created_at": start + timedelta(hours=n, seconds=user_id)})
+        if carts:
+            conn.execute(insert(Cart), carts)
+        items = []
+        for offset in range(0, len(orders), BATCH):
+            created = conn.execute(
+                insert(Order).returning(Order.id, Order.created_at), orders[offset:offset + BATCH]
+            ).all()
+            for order_id, created_at in created:
+                for product_id in rng.sample(range(1, products + 1), min(3, products)):
+                    items.append({"order_id": order_id, "product_id": product_id,
+                                  "product_name": f"Lamp shade {product_id}",
+                                  "product_price": 10 + product_id % 90, "quantity": 1,
+                                  "created_at": created_at})
+        for offset in range(0, len(items), BATCH):
+            conn.execute(insert(OrderItem), items[offset:offset + BATCH])
+
+
+class StatementCounter:
+    """Counts SQL statements issued by the app's engine (in-process runs only)."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(async_engine.sync_engine, "before_cursor_execute", self)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(async_engine.sync_engine, "before_cursor_execute", self)
+
+
+class Recorder:
+    """Per-endpoint latency samples, status counts and statement counts."""
+
+    def __init__(self, counter=None):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.queries = {}
+        self.counter = counter
+
+    async def request(self, client, label, method, url, **kwargs):
+        before = self.counter.count if self.counter else 0
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.latencies[label].append(time.perf_counter() - started)
+        self.statuses[label][response.status_code] += 1
+        if self.counter:
+            self.queries[label] = self.counter.count - before
+        return response
+
+
+class Shopper:
+    """One virtual user: a logged-in client that runs scenarios."""
+
+    def __init__(self, client, recorder, index, products, rng):
+        self.client = client
+        self.recorder = recorder
+        self.index = index
+        self.products = products
+        self.rng = rng
+        self.headers = {}
+
+    async def call(self, label, method, url, **kwargs):
+        return await self.recorder.request(self.client, label, method, url, headers=self.headers, **kwargs)
+
+    async def login(self):
+        response = await self.call("POST /auth/login", "POST", "/auth/login",
+                                   json={"email": shopper_email(self.index), "password": PASSWORD})
+        response.raise_for_status()
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    def product_id(self):
+        return self.rng.randint(1, self.products)
+
+    async def browse(self):
+        response = await self.call("GET /products", "GET", "/products/", params={"limit": 50})
+        cursor = response.headers.get("x-next-cursor")
+        if cursor:
+            await self.call("GET /products?cursor", "GET", "/products/", params={"limit": 50, "cursor": cursor})
+
+    async def search(self):
+        await self.call("GET /products/search", "GET", "/products/search",
+                        params={"q": " ".join(self.rng.sample(SEARCH_TERMS, 2))})
+
+    async def add_to_cart(self):
+        await self.call("POST /cart/items", "POST", "/cart/items",
+                        json={"product_id": self.product_id(), "quantity": self.rng.randint(1, 3)})
+        await self.call("GET /cart", "GET", "/cart/")
+
+    async def order_history(self):
+        response = await self.call("GET /orders", "GET", "/orders/", params={"limit": 20})
+        orders = response.json() if response.status_code == 200 else []
+        if orders:
+            await self.call("GET /orders/{id}", "GET", f"/orders/{self.rng.choice(orders)['id']}")
+
+    async def checkout(self):
+        await self.call("POST /cart/items", "POST", "/cart/items",
+                        json={"product_id": self.product_id(), "quantity": 1})
+        response = await self.call("POST /orders", "POST", "/orders/")
+        return response.json()["id"] if response.status_code == 200 else None
+
+    async def pay(self):
+        order_id = await self.checkout()
+        if order_id:
+            await self.call("POST /orders/{id}/pay", "POST", f"/orders/{order_id}/pay")
+
+    async def cancel(self):
+        order_id = await self.checkout()
+        if order_id:
+            await self.call("POST /orders/{id}/cancel", "POST", f"/orders/{order_id}/cancel")
+
+    async def run(self, deadline):
+        names, weights = zip(*WEIGHTS.items())
+        while time.perf_counter() < deadline:
+            await getattr(self, self.rng.choices(names, weights)[0])()
+
+
+def make_client(url):
+    if url:
+        return httpx.AsyncClient(base_url=url, timeout=30)
+    # Unhandled errors become 500s, as they would behind a real server
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    return httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=30)
+
+
+async def profile_queries(client, products):
+    """Run each scenario alone and record the statements every endpoint issues."""
+    with StatementCounter() as counter:
+        recorder = Recorder(counter)
+        shopper = Shopper(client, recorder, 0, products, random.Random(0))
+        await shopper.login()
+        # The first pass warms the principal and catalog caches
+        for _ in range(2):
+            for name in WEIGHTS:
+                await getattr(shopper, name)()
+    return recorder.queries
+
+
+async def load(client, users, products, seconds):
+    recorder = Recorder()
+    shoppers = [Shopper(client, recorder, i, products, random.Random(i)) for i in range(users)]
+    await asyncio.gather(*(shopper.login() for shopper in shoppers))
+    # Logins are benchmarked separately (login_benchmark); measure the mix only
+    recorder.latencies.clear()
+    recorder.statuses.clear()
+    started = time.perf_counter()
+    await asyncio.gather(*(shopper.run(started + seconds) for shopper in shoppers))
+    return recorder, time.perf_counter() - started
+
+
+def summarize(recorder, elapsed, queries):
+    endpoints = {}
+    for label, samples in sorted(recorder.latencies.items()):
+        statuses = recorder.statuses[label]
+        endpoints[label] = {
+            "requests": len(samples),
+            "rps": round(len(samples) / elapsed, 1),
+            "p50_ms": round(percentile(samples, 50) * 1000, 2),
+            "p95_ms": round(percentile(samples, 95) * 1000, 2),
+            "p99_ms": round(percentile(samples, 99) * 1000, 2),
+            "errors": sum(n for code, n in statuses.items() if code >= 500),
+            "queries": queries.get(label),
+        }
+    samples = [s for values in recorder.latencies.values() for s in values]
+    total = {
+        "requests": len(samples),
+        "rps": round(len(samples) / elapsed, 1),
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p95_ms": round(percentile(samples, 95) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        "errors": sum(e["errors"] for e in endpoints.values()),
+    }
+    return {"total": total, "endpoints": endpoints}
+
+
+def print_report(report):
+    print(f"{'endpoint':<26} {'reqs':>7} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'5xx':>5} {'queries':>8}")
+    rows = list(report["endpoints"].items()) + [("TOTAL", report["total"])]
+    for label, row in rows:
+        queries = row.get("queries")
+        print(f"{label:<26} {row['requests']:>7} {row['rps']:>8.1f} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} "
+              f"{row['p99_ms']:>8.2f} {row['errors']:>5} {'-' if queries is None else queries:>8}")
+
+
+def compare(report, baseline, tolerance=0.25, slack_ms=2.0, min_samples=100, max_error_rate=0.001):
+    """Return the regressions of report against baseline as readable strings.
+
+    Statement counts must not grow at all; throughput and p95 latency may drift
+    by tolerance (latency also by slack_ms, so sub-millisecond noise is ignored).
+    Latency is only judged for endpoints with at least min_samples requests.
+    """
+    problems = []
+    errors, requests = report["total"]["errors"], report["total"]["requests"]
+    if errors > max_error_rate * requests:
+        problems.append(f"{errors} of {requests} requests failed with 5xx")
+    expected_rps = baseline["total"]["rps"]
+    if report["total"]["rps"] < expected_rps * (1 - tolerance):
+        problems.append(f"throughput {report['total']['rps']} rps < baseline {expected_rps} rps")
+    for label, expected in baseline["endpoints"].items():
+        current = report["endpoints"].get(label)
+        if current is None:
+            continue
+        if expected.get("queries") is not None and current.get("queries") is not None \
+                and current["queries"] > expected["queries"]:
+            problems.append(f"{label}: {current['queries']} queries > baseline {expected['queries']}")
+        if min(current["requests"], expected["requests"]) < min_samples:
+            continue
+        limit = max(expected["p95_ms"] * (1 + tolerance), expected["p95_ms"] + slack_ms)
+        if current["p95_ms"] > limit:
+            problems.append(f"{label}: p95 {current['p95_ms']} ms > baseline {expected['p95_ms']} ms")
+    return problems
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", help="base URL of a running server (default: in-process)")
+    parser.add_argument("--users", type=int, default=16, help="concurrent virtual users")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--products", type=int, default=10_000)
+    parser.add_argument("--orders-per-user", type=int, default=50)
+    parser.add_argument("--cart-lines", type=int, default=5)
+    parser.add_argument("--no-seed", action="store_true", help="reuse an already seeded database")
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--baseline", help="fail if the run regresses against this report")
+    parser.add_argument("--save-baseline", help="write this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed rps/p95 drift (fraction)")
+    args = parser.parse_args()
+
+    if not args.no_seed:
+        started = time.perf_counter()
+        seed(args.users, args.products, args.orders_per_user, args.cart_lines)
+        print(f"seeded in {time.perf_counter() - started:.1f}s")
+
+    try:
+        async with make_client(args.url) as client:
+            queries = {} if args.url else await profile_queries(client, args.products)
+            recorder, elapsed = await load(client, args.users, args.products, args.seconds)
+    finally:
+        await async_engine.dispose()
+
+    report = summarize(recorder, elapsed, queries)
+    report["config"] = {k: getattr(args, k) for k in ("url", "users", "seconds", "products", "orders_per_user")}
+    print_report(report)
+
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+                f.write("\n")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(report, json.load(f), args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION: {problem}")
+        if problems:
+            sys.exit(1)
+        print("no regressions against baseline")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,104 @@
+"""
+Login throughput benchmark: logins/sec and catalog p99 under login load.
+
+Usage:
+    python -m benchmarks.login_benchmark --logins 16 --browsers 8 --seconds 10
+
+Runs the FastAPI app in-process against DATABASE_URL (a temporary SQLite
+database by default). Login loops hammer POST /auth/login while browser loops
+read GET /products; catalog latency is reported with and without the login
+load so the effect of bcrypt on unrelated traffic is visible.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+# Every simulated client shares one address; per-IP limits would throttle the run
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import httpx
+
+from app.auth import pwd_context
+from app.database import Base, SessionLocal, async_engine, engine
+from app.main import app
+from app.models import Product, User
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def seed(users: int, products: int):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    password_hash = pwd_context.hash("bench-password")
+    db = SessionLocal()
+    try:
+        db.add_all(User(email=f"user{i}@example.com", password_hash=password_hash) for i in range(users))
+        db.add_all(Product(name=f"Lamp {i}", description="Bench lamp", price=10 + i % 90) for i in range(products))
+        db.commit()
+    finally:
+        db.close()
+
+
+async def run(client, logins: int, browsers: int, users: int, seconds: float):
+    deadline = time.perf_counter() + seconds
+    results = {"logins": 0, "rejected": 0, "catalog": []}
+
+    async def login_loop(worker):
+        i = worker
+        while time.perf_counter() < deadline:
+            response = await client.post(
+                "/auth/login", json={"email": f"user{i % users}@example.com", "password": "bench-password"}
+            )
+            if response.status_code == 200:
+                results["logins"] += 1
+            elif response.status_code == 503:
+                results["rejected"] += 1
+            i += logins
+
+    async def browse_loop():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            await client.get("/products/")
+            results["catalog"].append(time.perf_counter() - started)
+
+    await asyncio.gather(
+        *(login_loop(worker) for worker in range(logins)),
+        *(browse_loop() for _ in range(browsers)),
+    )
+    return results
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--logins", type=int, default=16, help="concurrent login clients")
+    parser.add_argument("--browsers", type=int, default=8, help="concurrent catalog clients")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--products", type=int, default=100)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    seed(args.users, args.products)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        idle = await run(client, 0, args.browsers, args.users, args.seconds / 2)
+        loaded = await run(client, args.logins, args.browsers, args.users, args.seconds)
+    await async_engine.dispose()
+
+    print(f"bcrypt rounds={pwd_context.handler('bcrypt').default_rounds}")
+    print(f"logins/sec={loaded['logins'] / args.seconds:.1f} rejected(503)={loaded['rejected']}")
+    print(f"catalog p50/p99 idle   = {percentile(idle['catalog'], 50) * 1000:.1f} / {percentile(idle['catalog'], 99) * 1000:.1f} ms")
+    print(f"catalog p50/p99 loaded = {percentile(loaded['catalog'], 50) * 1000:.1f} / {percentile(loaded['catalog'], 99) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
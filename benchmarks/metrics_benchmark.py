@@ -0,0 +1,108 @@
+"""
+Metrics overhead benchmark: per-request cost of MetricsMiddleware and query timing.
+
+Usage:
+    python -m benchmarks.metrics_benchmark --requests 5000
+
+Runs the app in-process twice in fresh interpreters, once with
+METRICS_ENABLED=false and once with it on, against a temporary SQLite
+database (or DATABASE_URL). Each run times sequential requests to an endpoint
+without database work (GET /health), a cached one (GET /products) and one
+that queries (GET /cart), then the cost of rendering /metrics.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ENDPOINTS = ["/health", "/products/", "/cart/"]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def measure(requests: int):
+    import httpx
+    from app.database import Base, SessionLocal, async_engine, engine
+    from app.main import app
+    from app.metrics import render_metrics
+    from app.models import Product
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.add_all(Product(name=f"Lamp {i}", description="Bench lamp", price=10 + i % 90) for i in range(100))
+    db.commit()
+    db.close()
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        account = {"email": "metrics@example.com", "password": "bench-password"}
+        await client.post("/auth/register", json=account)
+        token = (await client.post("/auth/login", json=account)).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        await client.post("/cart/items", json={"product_id": 1, "quantity": 2}, headers=headers)
+
+        for path in ENDPOINTS:
+            for _ in range(requests // 10):  # warm up
+                await client.get(path, headers=headers)
+            samples = []
+            for _ in range(requests):
+                started = time.perf_counter()
+                await client.get(path, headers=headers)
+                samples.append(time.perf_counter() - started)
+            results[path] = {"mean_us": sum(samples) / len(samples) * 1e6, "p99_us": percentile(samples, 99) * 1e6}
+
+    started = time.perf_counter()
+    for _ in range(100):
+        render_metrics()
+    results["render"] = (time.perf_counter() - started) / 100 * 1e6
+    await async_engine.dispose()
+    return results
+
+
+def run_child(enabled: bool, requests: int) -> dict:
+    env = dict(os.environ, METRICS_ENABLED="true" if enabled else "false")
+    env.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+    env.setdefault("RATE_LIMIT_ENABLED", "false")
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.metrics_benchmark", "--child", "--requests", str(requests)],
+        env=env, check=True, capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=5000, help="requests per endpoint")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(measure(args.requests))))
+        return
+
+    off = run_child(False, args.requests)
+    on = run_child(True, args.requests)
+    print(f"{'endpoint':<12} {'off mean us':>12} {'on mean us':>11} {'overhead us':>12} {'overhead':>9} {'on p99 us':>10}")
+    for path in ENDPOINTS:
+        delta = on[path]["mean_us"] - off[path]["mean_us"]
+        print(f"{path:<12} {off[path]['mean_us']:>12.1f} {on[path]['mean_us']:>11.1f} {delta:>12.1f} "
+              f"{delta / off[path]['mean_us'] * 100:>8.1f}% {on[path]['p99_us']:>10.1f}")
+    print(f"rendering /metrics: {on['render']:.0f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Order export benchmark: throughput and peak memory of the streaming export
+as one user's history grows.
+
+Usage:
+    python -m benchmarks.order_export_benchmark --orders 10000,100000
+    DATABASE_URL=postgresql://... python -m benchmarks.order_export_benchmark --format csv
+
+For each size it recreates the schema in DATABASE_URL (a temporary SQLite
+database by default; never point it at real data) with one user owning
+--orders orders of --items items each. It then runs the export behind
+GET /orders/export and reports orders/sec, bytes written and the peak
+Python heap during the export (tracemalloc). The peak should stay about the
+same whatever the history size.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+from sqlalchemy import insert
+
+from app.database import AsyncSessionLocal, Base, async_engine, engine
+from app.models import Order, OrderItem, Product, User
+from app.order_export import export_orders
+
+BATCH = 10_000
+
+
+def seed(orders: int, items: int) -> int:
+    """Recreate the schema with one user's order history; returns their id."""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    start = datetime(2025, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(Product), [
+            {"name": f"Lamp {i}", "description": "Bench lamp", "price": 10 + i} for i in range(items)
+        ])
+        user_id = conn.execute(
+            insert(User).values(email="reports@example.com", password_hash="unused").returning(User.id)
+        ).scalar_one()
+        for offset in range(0, orders, BATCH):
+            count = min(BATCH, orders - offset)
+            created = [start + timedelta(minutes=offset + i) for i in range(count)]
+            order_ids = conn.execute(insert(Order).returning(Order.id, sort_by_parameter_order=True), [
+                {"user_id": user_id, "total_amount": 10 * items, "status": "paid", "created_at": created_at}
+                for created_at in created
+            ]).scalars().all()
+            conn.execute(insert(OrderItem), [
+                {"order_id": order_id, "product_id": i + 1, "product_name": f"Lamp {i}",
+                 "product_price": 10 + i, "quantity": 1, "created_at": created_at}
+                for order_id, created_at in zip(order_ids, created) for i in range(items)
+            ])
+    return user_id
+
+
+async def export(user_id: int, fmt: str) -> int:
+    # Straight off the generator the endpoint streams: httpx's ASGI transport
+    # would buffer the whole body and measure that instead
+    written = 0
+    async with AsyncSessionLocal() as db:
+        async for chunk in export_orders(db, fmt, user_id=user_id):
+            written += len(chunk)
+    return written
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--orders", default="10000,100000", help="comma-separated history sizes")
+    parser.add_argument("--items", type=int, default=3, help="items per order")
+    parser.add_argument("--format", choices=("ndjson", "csv"), default="ndjson")
+    args = parser.parse_args()
+
+    print(f"{'orders':>8} {'seconds':>8} {'orders/s':>9} {'MiB out':>8} {'peak heap MiB':>14}")
+    try:
+        for orders in [int(size) for size in args.orders.split(",")]:
+            user_id = seed(orders, args.items)
+            tracemalloc.start()
+            started = time.perf_counter()
+            written = await export(user_id, args.format)
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{orders:>8} {elapsed:>8.2f} {orders / elapsed:>9.0f} {written / 2**20:>8.1f} {peak / 2**20:>14.1f}")
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
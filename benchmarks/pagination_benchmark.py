@@ -0,0 +1,107 @@
+"""
+Pagination benchmark: OFFSET paging vs keyset (cursor) paging at depth.
+
+Usage:
+    python -m benchmarks.pagination_benchmark --products 1000000 --orders 100000
+
+Seeds DATABASE_URL (a temporary SQLite database by default) with a large
+catalog and one user with a long order history, then times fetching page 1
+and pages deep into each listing with both strategies. Keyset pages should
+cost the same at any depth; OFFSET pages grow with the rows skipped.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+# Every simulated client shares one address; per-IP limits would throttle the run
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+from sqlalchemy import insert, select
+
+from app.database import Base, engine
+from app.models import Order, Product, User
+from app.pagination import encode_cursor, keyset_page, split_page
+
+BATCH = 50_000
+
+
+def seed(products: int, orders: int):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    start = datetime(2025, 1, 1)
+    with engine.begin() as conn:
+        for offset in range(0, products, BATCH):
+            conn.execute(insert(Product), [
+                {"name": f"Lamp {i}", "description": "Bench lamp", "price": 10 + i % 90,
+                 "created_at": start + timedelta(seconds=i)}
+                for i in range(offset, min(products, offset + BATCH))
+            ])
+        user_id = conn.execute(
+            insert(User).values(email="history@example.com", password_hash="x").returning(User.id)
+        ).scalar_one()
+        for offset in range(0, orders, BATCH):
+            conn.execute(insert(Order), [
+                {"user_id": user_id, "total_amount": 10, "status": "paid",
+                 "created_at": start + timedelta(minutes=i)}
+                for i in range(offset, min(orders, offset + BATCH))
+            ])
+    return user_id
+
+
+def timed(conn, stmt, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = conn.execute(stmt).all()
+        best = min(best, time.perf_counter() - started)
+    return best, rows
+
+
+def compare(conn, label, base, model, total, limit, descending=False):
+    print(f"\n{label} ({total:,} rows, limit {limit})")
+    print(f"{'page':>10} {'offset ms':>10} {'keyset ms':>10}")
+    for page in (1, 10, 100, 1_000, 10_000):
+        skip = (page - 1) * limit
+        if skip >= total:
+            break
+        order = (model.created_at.desc(), model.id.desc()) if descending else (model.created_at, model.id)
+        offset_time, rows = timed(conn, base.order_by(*order).offset(skip).limit(limit))
+        # The cursor a client would hold after reading the previous page
+        cursor = None
+        if skip:
+            anchor = conn.execute(base.order_by(*order).offset(skip - 1).limit(1)).one()
+            cursor = encode_cursor(anchor.created_at, anchor.id)
+        keyset_time, keyset_rows = timed(conn, keyset_page(base, model, cursor, limit, descending))
+        assert [row.id for row in split_page(keyset_rows, limit)[0]] == [row.id for row in rows]
+        print(f"{page:>10} {offset_time * 1000:>10.2f} {keyset_time * 1000:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--no-seed", action="store_true", help="reuse an already seeded database")
+    args = parser.parse_args()
+
+    if args.no_seed:
+        with engine.connect() as conn:
+            user_id = conn.execute(select(User.id).where(User.email == "history@example.com")).scalar_one()
+    else:
+        started = time.perf_counter()
+        user_id = seed(args.products, args.orders)
+        print(f"seeded in {time.perf_counter() - started:.1f}s")
+
+    with engine.connect() as conn:
+        compare(conn, "products", select(Product), Product, args.products, args.limit)
+        compare(conn, "orders", select(Order).where(Order.user_id == user_id), Order,
+                args.orders, args.limit, descending=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Worker scaling benchmark: catalog and cart throughput for 1..N server workers.
+
+Usage:
+    python -m benchmarks.scaling_benchmark --workers 1,2,4 --seconds 10
+
+Seeds DATABASE_URL (a temporary SQLite database by default), then for each
+worker count starts `python -m app.server` and drives GET /products and
+GET /cart from several load-generator processes. Reports requests/sec and
+speed-up over one worker. The load generators share the machine with the
+server, so speed-up flattens once workers and generators compete for cores;
+size --workers and --generators to leave room for both.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+# Every simulated client shares one address; per-IP limits would throttle the run
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import httpx
+
+ENDPOINTS = {"catalog": "/products/", "cart": "/cart/"}
+PASSWORD = "bench-password"
+
+
+def seed(users: int, products: int):
+    from sqlalchemy import insert
+    from app.auth import pwd_context
+    from app.database import Base, engine
+    from app.models import Cart, Product, User
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    password_hash = pwd_context.hash(PASSWORD)
+    with engine.begin() as conn:
+        conn.execute(insert(Product), [
+            {"name": f"Lamp {i}", "description": "Bench lamp", "price": 10 + i % 90} for i in range(products)
+        ])
+        conn.execute(insert(User), [
+            {"email": f"scale{i}@example.com", "password_hash": password_hash} for i in range(users)
+        ])
+        conn.execute(insert(Cart), [
+            {"user_id": u + 1, "product_id": p + 1, "quantity": 1} for u in range(users) for p in range(5)
+        ])
+
+
+def start_server(workers: int, port: int):
+    env = dict(os.environ, DB_CREATE_ALL="true")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "app.server", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/ready").status_code == 200:
+                return process
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("server did not become ready")
+
+
+def stop_server(process):
+    process.send_signal(signal.SIGTERM)
+    process.wait(timeout=60)
+
+
+def generate(url, path, tokens, connections, seconds):
+    """Load-generator process: returns completed requests."""
+    async def run():
+        done = 0
+        limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+        async with httpx.AsyncClient(base_url=url, limits=limits) as client:
+            deadline = time.perf_counter() + seconds
+
+            async def loop(i):
+                nonlocal done
+                headers = {"Authorization": f"Bearer {tokens[i % len(tokens)]}"}
+                while time.perf_counter() < deadline:
+                    response = await client.get(path, headers=headers)
+                    if response.status_code == 200:
+                        done += 1
+
+            await asyncio.gather(*(loop(i) for i in range(connections)))
+        return done
+    return asyncio.run(run())
+
+
+def measure(url, path, tokens, generators, connections, seconds):
+    with multiprocessing.get_context("spawn").Pool(generators) as pool:
+        counts = pool.starmap(generate, [(url, path, tokens, connections, seconds)] * generators)
+    return sum(counts) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", default=None, help="comma-separated worker counts (default 1,2,4..cpus)")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--generators", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="load-generator processes")
+    parser.add_argument("--connections", type=int, default=16, help="connections per generator")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    counts = [int(n) for n in args.workers.split(",")] if args.workers else \
+        sorted({n for n in (1, 2, 4, 8, 16, 32) if n <= cpus} | {cpus})
+
+    seed(args.users, args.products)
+    url = f"http://127.0.0.1:{args.port}"
+    print(f"{'workers':>8}" + "".join(f"{name + ' rps':>14}{'speed-up':>10}" for name in ENDPOINTS))
+    baseline = {}
+    for workers in counts:
+        process = start_server(workers, args.port)
+        try:
+            tokens = [
+                httpx.post(f"{url}/auth/login", json={"email": f"scale{i}@example.com", "password": PASSWORD})
+                .json()["access_token"]
+                for i in range(min(args.users, 20))
+            ]
+            row = f"{workers:>8}"
+            for name, path in ENDPOINTS.items():
+                rps = measure(url, path, tokens, args.generators, args.connections, args.seconds)
+                baseline.setdefault(name, rps)
+                row += f"{rps:>14.0f}{rps / baseline[name]:>9.2f}x"
+            print(row)
+        finally:
+            stop_server(process)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Product search benchmark: /products/search query latency by catalog size.
+
+Usage:
+    python -m benchmarks.search_benchmark --sizes 10000,100000,1000000
+
+For each size the products table in DATABASE_URL (a temporary SQLite
+database by default, using the FTS5 fallback) is reseeded with synthetic
+names and descriptions, then a fixed set of single-term, multi-term and
+prefix queries is timed for the first page and the page after it.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+# Every simulated client shares one address; per-IP limits would throttle the run
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+from sqlalchemy import insert
+
+from app.database import Base, engine
+from app.models import Product
+from app.search import search_statement, search_terms
+
+BATCH = 50_000
+STYLES = ["classic", "modern", "vintage", "minimalist", "rustic", "industrial", "smart", "art deco",
+          "nordic", "bohemian", "coastal", "farmhouse", "mid-century", "japanese", "brass", "ceramic"]
+KINDS = ["table lamp", "desk lamp", "floor lamp", "pendant light", "bedside lamp", "wall sconce",
+         "chandelier", "lampshade", "ceiling light", "reading light"]
+WORDS = ["warm", "dimmable", "linen", "glass", "oak", "walnut", "marble", "adjustable", "led",
+         "cordless", "woven", "matte", "glossy", "handmade", "textured", "frosted", "copper", "velvet"]
+QUERIES = ["lamp", "brass desk", "vint", "nordic pendant light", "walnut dimm", "chandelier velvet"]
+
+
+def seed(size: int, rng: random.Random):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for offset in range(0, size, BATCH):
+            conn.execute(insert(Product), [
+                {
+                    "name": f"{rng.choice(STYLES).title()} {rng.choice(KINDS)} {i}",
+                    "description": " ".join(rng.sample(WORDS, 6)),
+                    "price": 10 + i % 90,
+                }
+                for i in range(offset, min(size, offset + BATCH))
+            ])
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def time_query(conn, terms, limit, repeat):
+    first, second = [], []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = conn.execute(search_statement(engine.dialect.name, terms, None, limit)).all()
+        first.append(time.perf_counter() - started)
+        if len(rows) > limit:
+            after = [rows[limit - 1].rank, rows[limit - 1].id]
+            started = time.perf_counter()
+            conn.execute(search_statement(engine.dialect.name, terms, after, limit)).all()
+            second.append(time.perf_counter() - started)
+    return first, second
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    print(f"backend={engine.dialect.name}")
+    print(f"{'size':>9} {'query':<24} {'p50 ms':>8} {'p99 ms':>8} {'page2 p50':>10}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        started = time.perf_counter()
+        seed(size, rng)
+        print(f"{size:>9} (seeded in {time.perf_counter() - started:.1f}s)")
+        with engine.connect() as conn:
+            for query in QUERIES:
+                first, second = time_query(conn, search_terms(query), args.limit, args.repeat)
+                page2 = f"{percentile(second, 50) * 1000:>10.2f}" if second else f"{'-':>10}"
+                print(f"{'':>9} {query:<24} {percentile(first, 50) * 1000:>8.2f} {percentile(first, 99) * 1000:>8.2f} {page2}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Load shedding benchmark: latency of served requests under overload, with
+and without the concurrency limiter.
+
+Usage:
+    python -m benchmarks.shedding_benchmark --clients 200 --seconds 10
+    python -m benchmarks.shedding_benchmark --limit 16 --max-wait-ms 100
+
+Seeds DATABASE_URL (a temporary SQLite database by default; the tables are
+dropped and recreated) with a catalog. --clients closed-loop clients then
+search it in-process for --seconds, first against the bare app, then
+behind a limiter of --limit concurrent requests that sheds anything queued
+longer than --max-wait-ms. A shed client backs off for --backoff-ms before
+retrying. Without shedding, every request waits behind the whole crowd, so
+p99 grows with --clients. With shedding, served requests stay near the
+service time plus --max-wait-ms, and the excess is turned away with 503.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+# The limiter is wrapped explicitly below
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import httpx
+from sqlalchemy import insert
+
+from app.database import Base, async_engine, engine
+from app.main import app
+from app.models import Product
+from app.ratelimit import LocalBuckets, RateLimitMiddleware
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def seed(products: int):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Product), [
+            {"name": f"Lamp shade {i}", "description": "Bench lamp", "price": 10 + i % 90}
+            for i in range(products)
+        ])
+
+
+async def run(asgi_app, clients: int, seconds: float, backoff: float):
+    statuses, latencies = Counter(), []
+    transport = httpx.ASGITransport(app=asgi_app, raise_app_exceptions=False)
+    deadline = time.perf_counter() + seconds
+
+    async def shopper(api):
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = await api.get("/products/search", params={"q": "lamp", "limit": 20})
+            statuses[response.status_code] += 1
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                await asyncio.sleep(backoff)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as api:
+        await asyncio.gather(*(shopper(api) for _ in range(clients)))
+    return statuses, latencies
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--limit", type=int, default=16, help="concurrent requests served by the limiter")
+    parser.add_argument("--max-wait-ms", type=float, default=100)
+    parser.add_argument("--backoff-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    seed(args.products)
+    shedding = RateLimitMiddleware(
+        app, routes=app.router.routes, rules=[], buckets=LocalBuckets(),
+        max_concurrent=args.limit, max_wait=args.max_wait_ms / 1000, max_queue=args.clients,
+    )
+    print(f"{'mode':<12} {'served/s':>9} {'503':>7} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    try:
+        for mode, asgi_app in (("unlimited", app), ("shedding", shedding)):
+            statuses, latencies = await run(asgi_app, args.clients, args.seconds, args.backoff_ms / 1000)
+            print(f"{mode:<12} {statuses[200] / args.seconds:>9.0f} {statuses[503]:>7} "
+                  f"{percentile(latencies, 50) * 1000:>8.1f} {percentile(latencies, 99) * 1000:>8.1f} "
+                  f"{max(latencies, default=0) * 1000:>8.1f}")
+            other = sum(statuses.values()) - statuses[200] - statuses[503]
+            if other:
+                print(f"{'':<12} unexpected statuses: {dict(statuses)}")
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
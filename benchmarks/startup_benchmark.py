@@ -0,0 +1,94 @@
+"""
+Startup benchmark: import time, lifespan startup and time to first request.
+
+Usage:
+    python -m benchmarks.startup_benchmark --runs 5
+
+Prepares DATABASE_URL (a temporary SQLite database by default) with the full
+schema stamped at the Alembic head, then starts the app in fresh interpreters,
+once verifying the revision (the default) and once with DB_CREATE_ALL=true
+(the old create_all-on-boot behaviour). Reports the median of each phase.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+MODES = {"revision check": "false", "create_all": "true"}
+
+
+def prepare(products: int):
+    from sqlalchemy import insert, text
+    from app.database import Base, engine
+    from app.models import Product
+    from app.startup import expected_heads
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Product), [
+            {"name": f"Lamp {i}", "description": "Bench lamp", "price": 10 + i % 90} for i in range(products)
+        ])
+        conn.execute(text("DROP TABLE IF EXISTS alembic_version"))
+        conn.execute(text("CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL)"))
+        for head in expected_heads():
+            conn.execute(text("INSERT INTO alembic_version VALUES (:head)"), {"head": head})
+
+
+async def measure(started: float):
+    import httpx
+    from app.main import app
+    imported = time.perf_counter()
+    async with app.router.lifespan_context(app):
+        ready = time.perf_counter()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            response = await client.get("/products/")
+            response.raise_for_status()
+        first = time.perf_counter()
+    return {"import": imported - started, "startup": ready - imported, "first_request": first - ready,
+            "total": first - started}
+
+
+def run_child(create_all: str) -> dict:
+    env = dict(os.environ, DB_CREATE_ALL=create_all)
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.startup_benchmark", "--child"],
+        env=env, check=True, capture_output=True, text=True, cwd=ROOT,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    started = time.perf_counter()
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(measure(started))))
+        return
+
+    prepare(args.products)
+    phases = ["import", "startup", "first_request", "total"]
+    print(f"{'mode':<16}" + "".join(f"{phase + ' ms':>18}" for phase in phases))
+    for mode, create_all in MODES.items():
+        runs = [run_child(create_all) for _ in range(args.runs)]
+        print(f"{mode:<16}" + "".join(
+            f"{statistics.median(run[phase] for run in runs) * 1000:>18.1f}" for phase in phases
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Flash-sale stress test: concurrent checkouts of hot products.
+
+Usage:
+    python -m benchmarks.stock_benchmark --buyers 2000 --stock 500 --concurrency 50
+    python -m benchmarks.stock_benchmark --shards 1,8 --products 1,3
+    DATABASE_URL=postgresql://... python -m benchmarks.stock_benchmark --url http://localhost:8000
+
+Seeds DATABASE_URL (a temporary SQLite database by default; the tables are
+dropped and recreated, so never point it at real data) with --products hot
+products, --buyers shoppers with all of them in their carts (half the carts
+list them in reverse order), and --stock units of each. All shoppers then
+check out at once, --concurrency at a time.
+
+After each run it checks the no-oversell property for every product. No more
+checkouts succeed than there were units. Each success holds exactly its
+reservation. The stock left plus the units reserved equals the stock loaded.
+On Postgres a checkout failing with 5xx also counts: with several products
+per cart, that is how a lock-order deadlock surfaces. It exits non-zero if
+any of these fail. It also reports errors, undersold units (buyers turned
+away while stock was left), checkouts/sec and latency percentiles. Pass
+several shard and product counts to compare them. Sharding pays off on
+Postgres, where each stock row is a separate lock; SQLite serializes all
+writers anyway.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+# Every simulated client shares one address; per-IP limits would throttle the run
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import httpx
+from sqlalchemy import func, insert, select
+
+from app.auth import create_access_token
+from app.database import AsyncSessionLocal, Base, SessionLocal, async_engine, engine
+from app.inventory import set_stock
+from app.main import app
+from app.models import Cart, Product, ProductStock, StockReservation, User
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def seed(buyers: int, products: int):
+    """Recreate the schema with the hot products in every buyer's cart; returns their ids and tokens."""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        product_ids = conn.execute(
+            insert(Product).returning(Product.id),
+            [{"name": f"Limited edition shade {i}", "description": "Flash sale", "price": 99} for i in range(products)],
+        ).scalars().all()
+        emails = [f"buyer{i}@example.com" for i in range(buyers)]
+        user_ids = conn.execute(
+            insert(User).returning(User.id),
+            [{"email": email, "password_hash": "unused"} for email in emails],
+        ).scalars().all()
+        # Opposite insertion orders, so row order cannot line the checkouts' locks up
+        conn.execute(insert(Cart), [
+            {"user_id": user_id, "product_id": product_id, "quantity": 1}
+            for i, user_id in enumerate(user_ids)
+            for product_id in (product_ids if i % 2 else reversed(product_ids))
+        ])
+    # Minted directly: logging thousands of shoppers in would measure bcrypt instead
+    return product_ids, [create_access_token({"sub": email}) for email in emails]
+
+
+async def run(client, tokens, concurrency: int):
+    statuses, latencies = Counter(), []
+    limit = asyncio.Semaphore(concurrency)
+
+    async def checkout(token):
+        async with limit:
+            started = time.perf_counter()
+            response = await client.post("/orders/", headers={"Authorization": f"Bearer {token}"})
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(checkout(token) for token in tokens))
+    return statuses, latencies, time.perf_counter() - started
+
+
+def verify(product_ids: list, stock: int, statuses: Counter) -> list:
+    """Ways the run oversold, lost stock or deadlocked; an empty list means it held."""
+    db = SessionLocal()
+    try:
+        left = dict(db.execute(
+            select(ProductStock.product_id, func.sum(ProductStock.quantity)).group_by(ProductStock.product_id)
+        ).all())
+        reserved = dict(db.execute(
+            select(StockReservation.product_id, func.sum(StockReservation.quantity))
+            .group_by(StockReservation.product_id)
+        ).all())
+    finally:
+        db.close()
+    problems = []
+    if statuses[200] > stock:
+        problems.append(f"oversold: {statuses[200]} checkouts for {stock} units")
+    for product_id in product_ids:
+        product_left, product_reserved = left[product_id], reserved.get(product_id, 0)
+        if product_left < 0:
+            problems.append(f"product {product_id}: stock went negative: {product_left}")
+        if product_reserved != statuses[200]:
+            problems.append(f"product {product_id}: {product_reserved} units reserved for {statuses[200]} checkouts")
+        if product_left + product_reserved != stock:
+            problems.append(f"product {product_id}: {product_left} left + {product_reserved} reserved != {stock} loaded")
+    errors = sum(count for status, count in statuses.items() if status >= 500)
+    if errors and engine.dialect.name == "postgresql":
+        problems.append(f"{errors} checkouts failed with 5xx (deadlocks?)")
+    return problems
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--buyers", type=int, default=2000)
+    parser.add_argument("--stock", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50, help="checkouts in flight at once")
+    parser.add_argument("--shards", default="1", help="comma-separated stock shard counts to run")
+    parser.add_argument("--products", default="1,3", help="comma-separated hot products per cart to run")
+    parser.add_argument("--url", help="run against a server sharing DATABASE_URL instead of in-process")
+    args = parser.parse_args()
+
+    if args.url:
+        transport, base_url = None, args.url
+    else:
+        transport, base_url = httpx.ASGITransport(app=app, raise_app_exceptions=False), "http://bench"
+    limits = httpx.Limits(max_connections=args.concurrency)
+
+    failed = False
+    print(f"{'products':>8} {'shards':>6} {'ok':>6} {'409':>6} {'other':>6} {'checkouts/s':>12} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  result")
+    try:
+        runs = [(int(products), int(shards)) for products in args.products.split(",") for shards in args.shards.split(",")]
+        for products, shards in runs:
+            product_ids, tokens = seed(args.buyers, products)
+            async with AsyncSessionLocal() as db:
+                for product_id in product_ids:
+                    await set_stock(db, product_id, args.stock, shards)
+            async with httpx.AsyncClient(transport=transport, base_url=base_url, limits=limits, timeout=60) as client:
+                statuses, latencies, elapsed = await run(client, tokens, args.concurrency)
+            problems = verify(product_ids, args.stock, statuses)
+            failed = failed or bool(problems)
+            other = sum(statuses.values()) - statuses[200] - statuses[409]
+            print(f"{products:>8} {shards:>6} {statuses[200]:>6} {statuses[409]:>6} {other:>6} {args.buyers / elapsed:>12.0f} "
+                  f"{percentile(latencies, 50) * 1000:>8.1f} {percentile(latencies, 95) * 1000:>8.1f} "
+                  f"{percentile(latencies, 99) * 1000:>8.1f}  {'; '.join(problems) or 'no oversell'}")
+            # Not oversells, but worth knowing: errors (e.g. SQLite lock
+            # timeouts) and buyers turned away while units were left
+            if other:
+                print(f"         unexpected statuses: {dict(statuses)}")
+            expected = min(args.buyers - other, args.stock)
+            if statuses[200] < expected:
+                print(f"         undersold: {statuses[200]} of {expected} possible checkouts succeeded")
+    finally:
+        await async_engine.dispose()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
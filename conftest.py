@@ -0,0 +1,97 @@
+"""
+Shared pytest fixtures: run the API against a throwaway SQLite database
+"""
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Must be set before app.database is imported anywhere
+_db_dir = tempfile.mkdtemp(prefix="lampshades-test-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("DB_CREATE_ALL", "true")
+# Tests share one client address; test_ratelimit.py exercises the limiter itself
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import pytest
+from decimal import Decimal
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.database import engine, async_engine, Base, SessionLocal
+from app.main import app
+from app.models import Product
+
+
+@pytest.fixture
+def db():
+    from app.api.products import catalog_cache
+    from app.auth import principal_cache, token_cache
+    principal_cache.cache.clear()
+    token_cache.clear()
+    catalog_cache.invalidate()
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def client(db):
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def products(db):
+    """Create a small catalog and return the product ids"""
+    items = [
+        Product(name=f"Lamp {i}", description=f"Test lamp {i}", price=Decimal("10.50") + i)
+        for i in range(40)
+    ]
+    db.add_all(items)
+    db.commit()
+    return [product.id for product in items]
+
+
+@pytest.fixture
+def auth_headers(client):
+    """Register (if needed) and log in a user, returning bearer headers"""
+    def login(email="buyer@example.com", password="secret-password"):
+        client.post("/auth/register", json={"email": email, "password": password})
+        response = client.post("/auth/login", json={"email": email, "password": password})
+        assert response.status_code == 200, response.text
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+    return login
+
+
+class QueryCounter:
+    """Counts SQL statements executed by the API engine while active"""
+
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def __enter__(self):
+        self.statements = []
+        event.listen(async_engine.sync_engine, "before_cursor_execute", self)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(async_engine.sync_engine, "before_cursor_execute", self)
+
+
+@pytest.fixture
+def count_queries():
+    return QueryCounter
@@ -0,0 +1,110 @@
+"""
+Tests for the sales rollups and /admin/analytics (app.analytics)
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app import analytics, auth
+from app.database import ASYNC_DATABASE_URL
+from app.inventory import expire_reservations, set_stock
+from app.models import DailySales, StockReservation
+from test_archive import age_orders, place_order, run_archive
+
+
+def run(work):
+    async def scenario():
+        # own engine: pooled API connections belong to the TestClient's loop
+        engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=NullPool)
+        try:
+            async with AsyncSession(engine, expire_on_commit=False) as session:
+                return await work(session)
+        finally:
+            await engine.dispose()
+    return asyncio.run(scenario())
+
+
+@pytest.fixture
+def admin(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(auth, "ADMIN_EMAILS", frozenset(["admin@example.com"]))
+    return auth_headers("admin@example.com")
+
+
+def report(client, admin, name, **params):
+    response = client.get(f"/admin/analytics/{name}", params=params, headers=admin)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_payments_and_cancellations_update_rollups(client, auth_headers, products, admin, monkeypatch):
+    """Paid and cancelled orders are counted as they change; pending ones are not"""
+    monkeypatch.setattr(analytics, "SALES_ROLLUP_SHARDS", 3)
+    headers = auth_headers()
+    for _ in range(3):
+        client.post(f"/orders/{place_order(client, headers, products[0], quantity=2)}/pay", headers=headers)
+    client.post("/cart/items", json={"product_id": products[0], "quantity": 1}, headers=headers)
+    client.post("/cart/items", json={"product_id": products[1], "quantity": 4}, headers=headers)
+    cancelled = client.post("/orders/", headers=headers).json()["id"]
+    client.post(f"/orders/{cancelled}/cancel", headers=headers)
+    place_order(client, headers, products[2])  # pending
+
+    [today] = report(client, admin, "sales-by-day")
+    assert today["day"] == datetime.utcnow().date().isoformat()
+    assert (today["paid_orders"], today["paid_units"], today["paid_revenue"]) == (3, 6, "63.00")
+    assert (today["cancelled_orders"], today["cancelled_units"], today["cancelled_revenue"]) == (1, 5, "56.50")
+
+    by_product = report(client, admin, "sales-by-product")
+    assert [row["product_id"] for row in by_product] == [products[0], products[1]]
+    lamp = by_product[0]
+    assert lamp["product_name"] == "Lamp 0"
+    assert (lamp["paid_orders"], lamp["paid_units"], lamp["paid_revenue"]) == (3, 6, "63.00")
+    assert (lamp["cancelled_orders"], lamp["cancelled_units"], lamp["cancelled_revenue"]) == (1, 1, "10.50")
+    assert report(client, admin, "sales-by-product", limit=1) == [lamp]
+
+
+def test_expired_orders_count_as_cancelled(client, auth_headers, products, admin, db):
+    run(lambda session: set_stock(session, products[0], 5))
+    place_order(client, auth_headers(), products[0], quantity=2)
+    db.execute(update(StockReservation).values(expires_at=datetime.utcnow() - timedelta(minutes=1)))
+    db.commit()
+    assert run(expire_reservations) == 1
+
+    [today] = report(client, admin, "sales-by-day")
+    assert (today["cancelled_orders"], today["cancelled_units"], today["paid_orders"]) == (1, 2, 0)
+
+
+def test_day_range_and_rebuild(client, auth_headers, products, admin, db):
+    """Orders count on the day they were placed; a full rebuild (archive
+    included) gives the same totals as the incremental updates"""
+    headers = auth_headers()
+    old, recent = place_order(client, headers, products[0]), place_order(client, headers, products[1], quantity=3)
+    age_orders(db, [old], days=400)
+    age_orders(db, [recent], days=3)
+    client.post(f"/orders/{old}/pay", headers=headers)
+    client.post(f"/orders/{recent}/cancel", headers=headers)
+    assert run_archive(older_than=timedelta(days=365)) == 1
+
+    by_day = report(client, admin, "sales-by-day")
+    assert [row["paid_orders"] for row in by_day] == [1, 0]
+    old_day = (datetime.utcnow() - timedelta(days=400)).date()
+    recent_day = (datetime.utcnow() - timedelta(days=3)).date()
+    assert [row["day"] for row in by_day] == [old_day.isoformat(), recent_day.isoformat()]
+    since = report(client, admin, "sales-by-day", since=(old_day + timedelta(days=1)).isoformat())
+    assert [row["day"] for row in since] == [recent_day.isoformat()]
+    assert report(client, admin, "sales-by-day", until=recent_day.isoformat()) == by_day[:1]
+    by_product = report(client, admin, "sales-by-product")
+
+    db.query(DailySales).delete()
+    db.commit()
+    run(analytics.rebuild_rollups)
+    assert report(client, admin, "sales-by-day") == by_day
+    assert report(client, admin, "sales-by-product") == by_product
+
+
+def test_analytics_requires_admin(client, auth_headers):
+    for name in ("sales-by-day", "sales-by-product"):
+        assert client.get(f"/admin/analytics/{name}", headers=auth_headers()).status_code == 403
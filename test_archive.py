@@ -0,0 +1,81 @@
+"""
+Tests for archiving closed orders (app.archive)
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.archive import archive_closed_orders
+from app.database import ASYNC_DATABASE_URL
+from app.models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+
+def place_order(client, headers, product_id, quantity=1):
+    client.post("/cart/items", json={"product_id": product_id, "quantity": quantity}, headers=headers)
+    response = client.post("/orders/", headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def age_orders(db, order_ids, days):
+    created_at = datetime.utcnow() - timedelta(days=days)
+    db.execute(update(Order).where(Order.id.in_(order_ids)).values(created_at=created_at))
+    db.execute(update(OrderItem).where(OrderItem.order_id.in_(order_ids)).values(created_at=created_at))
+    db.commit()
+
+
+def run_archive(**kwargs):
+    async def run():
+        # own engine: pooled API connections belong to the TestClient's loop
+        engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=NullPool)
+        try:
+            async with AsyncSession(engine, expire_on_commit=False) as session:
+                return await archive_closed_orders(session, **kwargs)
+        finally:
+            await engine.dispose()
+    return asyncio.run(run())
+
+
+def test_archives_only_old_closed_orders(client, auth_headers, products, db):
+    """Old paid and cancelled orders move; pending and recent ones stay"""
+    headers = auth_headers()
+    paid, cancelled, pending, recent = (place_order(client, headers, products[i]) for i in range(4))
+    client.post(f"/orders/{paid}/pay", headers=headers)
+    client.post(f"/orders/{cancelled}/cancel", headers=headers)
+    client.post(f"/orders/{recent}/pay", headers=headers)
+    age_orders(db, [paid, cancelled, pending], days=400)
+
+    assert run_archive(older_than=timedelta(days=365), batch_size=1) == 2
+
+    assert {order.id for order in db.query(Order)} == {pending, recent}
+    assert {order.id for order in db.query(ArchivedOrder)} == {paid, cancelled}
+    assert {item.order_id for item in db.query(ArchivedOrderItem)} == {paid, cancelled}
+    assert {item.order_id for item in db.query(OrderItem)} == {pending, recent}
+    assert run_archive(older_than=timedelta(days=365)) == 0
+
+
+def test_archived_orders_stay_readable(client, auth_headers, products, db):
+    """Detail and history cover archived orders, newest first across both"""
+    headers = auth_headers()
+    old = place_order(client, headers, products[0], quantity=3)
+    client.post(f"/orders/{old}/pay", headers=headers)
+    new = place_order(client, headers, products[1])
+    age_orders(db, [old], days=400)
+    run_archive(older_than=timedelta(days=365))
+
+    detail = client.get(f"/orders/{old}", headers=headers)
+    assert detail.status_code == 200
+    assert detail.json()["status"] == "paid"
+    assert [(item["product_id"], item["quantity"]) for item in detail.json()["items"]] == [(products[0], 3)]
+
+    first = client.get("/orders/?limit=1", headers=headers)
+    assert [order["id"] for order in first.json()] == [new]
+    rest = client.get(f"/orders/?limit=1&cursor={first.headers['X-Next-Cursor']}", headers=headers)
+    assert [order["id"] for order in rest.json()] == [old]
+    assert "X-Next-Cursor" not in rest.headers
+
+    # Other users still cannot see it
+    assert client.get(f"/orders/{old}", headers=auth_headers("other@example.com")).status_code == 404
@@ -0,0 +1,136 @@
+"""
+Tests for authentication and the principal cache
+"""
+import asyncio
+
+from app.auth import decode_token, principal_cache, token_cache
+from app.cache import RedisBackend, TTLCache
+from app.models import User
+
+
+def test_register_and_login(client):
+    """Registered users can log in; bad passwords are rejected"""
+    credentials = {"email": "new@example.com", "password": "pw-123456"}
+    assert client.post("/auth/register", json=credentials).status_code == 200
+    assert client.post("/auth/register", json=credentials).status_code == 400
+    assert client.post("/auth/login", json=credentials).status_code == 200
+    bad = {"email": "new@example.com", "password": "wrong"}
+    assert client.post("/auth/login", json=bad).status_code == 401
+
+
+def test_principal_lookup_is_cached(client, auth_headers, count_queries):
+    """Repeat requests with the same token skip the users query"""
+    headers = auth_headers()
+    with count_queries() as first:
+        client.get("/orders/", headers=headers)
+    with count_queries() as second:
+        client.get("/orders/", headers=headers)
+    assert first.count == 2
+    assert second.count == 1
+
+
+def test_token_verification_is_memoized(client, auth_headers):
+    """Verified claims are reused until the token's exp"""
+    token = auth_headers()["Authorization"].split()[1]
+    claims = decode_token(token)
+    assert token_cache.get(token) is claims
+    assert decode_token(token) is claims
+
+
+def test_user_change_invalidates_principal(client, auth_headers, db):
+    """Updating or deleting a user drops the cached principal"""
+    headers = auth_headers()
+    assert client.get("/cart/", headers=headers).status_code == 200
+    assert principal_cache.cache.get("buyer@example.com") is not None
+
+    user = db.query(User).filter(User.email == "buyer@example.com").one()
+    db.delete(user)
+    db.commit()
+    assert principal_cache.cache.get("buyer@example.com") is None
+    assert client.get("/cart/", headers=headers).status_code == 401
+
+
+def test_ttl_cache_bounds():
+    """Entries expire after their TTL and the LRU entry is evicted first"""
+    now = [0.0]
+    cache = TTLCache(maxsize=2, ttl=10, timer=lambda: now[0])
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None and cache.get("a") == 1
+    now[0] = 11
+    assert cache.get("a") is None and len(cache) == 1
+
+
+class FakeRedis:
+    """Just enough of the Redis protocol for the shared backend"""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, px=None):
+        self.data[key] = value
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+
+def test_shared_backend_round_trip():
+    """Workers sharing a backend see each other's entries and deletes"""
+    redis = FakeRedis()
+    worker_a = RedisBackend(redis, prefix="principal:")
+    worker_b = RedisBackend(redis, prefix="principal:")
+
+    async def scenario():
+        await worker_a.set("x@example.com", {"id": 1, "email": "x@example.com"})
+        assert await worker_b.get("x@example.com") == {"id": 1, "email": "x@example.com"}
+        await worker_b.delete("x@example.com")
+        assert await worker_a.get("x@example.com") is None
+
+    asyncio.run(scenario())
+
+
+def test_login_rehashes_on_cost_change(client, db):
+    """Hashes made with another bcrypt cost are upgraded on login"""
+    from passlib.context import CryptContext
+    from app.auth import BCRYPT_ROUNDS
+
+    old_context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=BCRYPT_ROUNDS + 1)
+    db.add(User(email="legacy@example.com", password_hash=old_context.hash("pw-legacy")))
+    db.commit()
+
+    response = client.post("/auth/login", json={"email": "legacy@example.com", "password": "pw-legacy"})
+    assert response.status_code == 200
+    db.expire_all()
+    user = db.query(User).filter(User.email == "legacy@example.com").one()
+    assert user.password_hash.startswith(f"$2b${BCRYPT_ROUNDS:02d}$")
+
+
+def test_password_hasher_sheds_load():
+    """A full hashing queue answers 503 instead of waiting"""
+    import threading
+    import pytest
+    from fastapi import HTTPException
+    from app.auth import PasswordHasher
+
+    hasher = PasswordHasher(workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def scenario():
+        busy = [asyncio.ensure_future(hasher.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as rejected:
+            await hasher.run(release.wait)
+        release.set()
+        await asyncio.gather(*busy)
+        return rejected.value
+
+    rejected = asyncio.run(scenario())
+    assert rejected.status_code == 503
+    assert rejected.headers["Retry-After"] == "1"
+    assert hasher.in_flight == 0
@@ -0,0 +1,28 @@
+"""
+Tests for the load-test baseline comparison
+"""
+from benchmarks.load_test import compare
+
+
+def report(rps=300.0, p95=40.0, queries=3, requests=500, errors=0):
+    return {
+        "total": {"requests": requests, "rps": rps, "errors": errors},
+        "endpoints": {"POST /cart/items": {"requests": requests, "p95_ms": p95, "queries": queries}},
+    }
+
+
+def test_compare_accepts_noise_within_tolerance():
+    """Small drifts in throughput and latency are not regressions"""
+    assert compare(report(rps=260.0, p95=48.0), report()) == []
+
+
+def test_compare_flags_regressions():
+    """Extra statements, slower p95, lower throughput and 5xx responses fail"""
+    problems = compare(report(rps=150.0, p95=90.0, queries=4, errors=5), report())
+    assert len(problems) == 4
+    assert any("queries" in problem for problem in problems)
+
+
+def test_compare_ignores_latency_of_rare_endpoints():
+    """p95 of a handful of samples is too noisy to judge"""
+    assert compare(report(p95=500.0, requests=20), report(requests=20)) == []
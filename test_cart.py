@@ -0,0 +1,168 @@
+"""
+Tests for the /cart endpoints
+"""
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from app.models import Product
+
+
+def test_empty_cart(client, auth_headers):
+    """An empty cart returns no items and a zero total"""
+    response = client.get("/cart/", headers=auth_headers())
+    assert response.status_code == 200
+    assert response.json() == {"items": [], "total_amount": "0.00"}
+
+
+def test_cart_totals(client, auth_headers, products):
+    """Line and cart totals are computed from current product prices"""
+    headers = auth_headers()
+    client.post("/cart/items", json={"product_id": products[0], "quantity": 2}, headers=headers)
+    client.post("/cart/items", json={"product_id": products[3], "quantity": 1}, headers=headers)
+
+    body = client.get("/cart/", headers=headers).json()
+    assert [item["product_id"] for item in body["items"]] == [products[0], products[3]]
+    assert Decimal(body["items"][0]["total_price"]) == Decimal("21.00")
+    assert Decimal(body["items"][1]["total_price"]) == Decimal("13.50")
+    assert Decimal(body["total_amount"]) == Decimal("34.50")
+
+
+def test_get_cart_query_count_is_constant(client, auth_headers, products, count_queries):
+    """GET /cart costs the same number of statements for 1 or 30 lines"""
+    headers = auth_headers()
+    client.post("/cart/items", json={"product_id": products[0], "quantity": 1}, headers=headers)
+    with count_queries() as small:
+        assert client.get("/cart/", headers=headers).status_code == 200
+
+    for product_id in products[1:30]:
+        client.post("/cart/items", json={"product_id": product_id, "quantity": 3}, headers=headers)
+    with count_queries() as large:
+        body = client.get("/cart/", headers=headers).json()
+
+    assert len(body["items"]) == 30
+    # the principal is cached, leaving the cart version lookup (the ETag)
+    # and the joined cart query
+    assert small.count == large.count == 2
+
+
+def test_replace_cart(client, auth_headers, products, count_queries):
+    """PUT /cart replaces every line in a constant number of statements"""
+    headers = auth_headers()
+    client.post("/cart/items", json={"product_id": products[0], "quantity": 5}, headers=headers)
+
+    items = [{"product_id": product_id, "quantity": 2} for product_id in products[1:21]]
+    with count_queries() as counter:
+        response = client.put("/cart/", json=items, headers=headers)
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert [item["product_id"] for item in body["items"]] == products[1:21]
+    assert Decimal(body["total_amount"]) == sum(Decimal(item["total_price"]) for item in body["items"])
+    # summary lock, upsert, delete, summary recount and the cart read
+    assert counter.count == 5
+
+    assert client.put("/cart/", json=[], headers=headers).json()["items"] == []
+
+
+def test_merge_cart(client, auth_headers, products):
+    """PATCH /cart upserts lines and removes those set to zero"""
+    headers = auth_headers()
+    client.put("/cart/", json=[
+        {"product_id": products[0], "quantity": 1},
+        {"product_id": products[1], "quantity": 1},
+    ], headers=headers)
+
+    body = client.patch("/cart/", json=[
+        {"product_id": products[1], "quantity": 4},
+        {"product_id": products[2], "quantity": 2},
+        {"product_id": products[0], "quantity": 0},
+    ], headers=headers).json()
+    assert {(item["product_id"], item["quantity"]) for item in body["items"]} == {
+        (products[1], 4), (products[2], 2)
+    }
+
+
+def test_bulk_cart_rejects_unknown_products(client, auth_headers, products):
+    """Unknown products fail the whole request and leave the cart untouched"""
+    headers = auth_headers()
+    client.put("/cart/", json=[{"product_id": products[0], "quantity": 1}], headers=headers)
+
+    response = client.patch("/cart/", json=[
+        {"product_id": products[1], "quantity": 1},
+        {"product_id": 999999, "quantity": 1},
+    ], headers=headers)
+    assert response.status_code == 404
+    assert [item["product_id"] for item in client.get("/cart/", headers=headers).json()["items"]] == [products[0]]
+    response = client.post("/cart/items", json={"product_id": 999999, "quantity": 1}, headers=headers)
+    assert response.status_code == 404 and response.json()["detail"] == "Product not found"
+    assert client.delete(f"/cart/items/{products[1]}", headers=headers).status_code == 404
+    assert client.get("/cart/summary", headers=headers).json()["item_count"] == 1
+    assert client.put("/cart/", json=[{"product_id": products[0], "quantity": -1}], headers=headers).status_code == 422
+
+
+def summary_matches_cart(client, headers):
+    summary = client.get("/cart/summary", headers=headers).json()
+    cart = client.get("/cart/", headers=headers).json()
+    assert summary["item_count"] == len(cart["items"])
+    assert summary["quantity"] == sum(item["quantity"] for item in cart["items"])
+    assert Decimal(summary["total_amount"]) == Decimal(cart["total_amount"])
+    return summary
+
+
+def test_cart_summary_follows_every_change(client, auth_headers, products, count_queries):
+    """Adds, removals, bulk edits and checkout keep the summary equal to the cart"""
+    headers = auth_headers()
+    assert client.get("/cart/summary", headers=headers).json() == {
+        "item_count": 0, "quantity": 0, "total_amount": "0.00", "version": 0
+    }
+    client.post("/cart/items", json={"product_id": products[0], "quantity": 2}, headers=headers)
+    client.post("/cart/items", json={"product_id": products[3], "quantity": 1}, headers=headers)
+    summary = summary_matches_cart(client, headers)
+    assert (summary["item_count"], summary["quantity"], summary["total_amount"]) == (2, 3, "34.50")
+
+    client.post("/cart/items", json={"product_id": products[0], "quantity": 5}, headers=headers)
+    client.delete(f"/cart/items/{products[3]}", headers=headers)
+    assert summary_matches_cart(client, headers)["quantity"] == 5
+    client.patch("/cart/", json=[{"product_id": products[1], "quantity": 4}], headers=headers)
+    client.put("/cart/", json=[{"product_id": products[2], "quantity": 1}], headers=headers)
+    before_checkout = summary_matches_cart(client, headers)
+    assert before_checkout["total_amount"] == "12.50"
+
+    client.post("/orders/", headers=headers)
+    after_checkout = summary_matches_cart(client, headers)
+    assert after_checkout["item_count"] == 0 and after_checkout["version"] > before_checkout["version"]
+
+    with count_queries() as counter:
+        response = client.get("/cart/summary", headers=headers)
+    assert counter.count == 1  # the summary row
+    etag = response.headers["etag"]
+    assert client.get("/cart/summary", headers={**headers, "If-None-Match": etag}).status_code == 304
+
+
+def test_cart_summary_follows_product_changes(client, auth_headers, products, db):
+    """Repricing or deleting a product recounts the carts holding it"""
+    holder, other = auth_headers(), auth_headers("other@example.com")
+    client.post("/cart/items", json={"product_id": products[0], "quantity": 2}, headers=holder)
+    client.post("/cart/items", json={"product_id": products[1], "quantity": 1}, headers=holder)
+    client.post("/cart/items", json={"product_id": products[2], "quantity": 1}, headers=other)
+
+    db.get(Product, products[0]).price = Decimal("20.00")
+    db.commit()
+    assert summary_matches_cart(client, holder)["total_amount"] == "51.50"
+    assert summary_matches_cart(client, other)["version"] == 1
+
+    db.delete(db.get(Product, products[1]))
+    db.commit()
+    summary = summary_matches_cart(client, holder)
+    assert (summary["item_count"], summary["total_amount"]) == (1, "40.00")
+
+
+def test_concurrent_adds_keep_the_summary_exact(client, auth_headers, products):
+    """Simultaneous adds to one cart serialize on the summary; none is lost"""
+    headers = auth_headers()
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        list(pool.map(
+            lambda product_id: client.post("/cart/items", json={"product_id": product_id, "quantity": 1}, headers=headers),
+            products[:20],
+        ))
+    summary = summary_matches_cart(client, headers)
+    assert (summary["item_count"], summary["version"]) == (20, 20)
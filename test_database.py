@@ -0,0 +1,47 @@
+"""
+Tests for database configuration helpers
+"""
+from app.database import get_async_url
+
+
+def test_async_url_mapping():
+    """Sync URLs are mapped onto the matching async drivers"""
+    assert get_async_url("postgresql://user:pw@db:5432/shop") == "postgresql+asyncpg://user:pw@db:5432/shop"
+    assert get_async_url("postgresql+psycopg2://user:pw@db/shop") == "postgresql+asyncpg://user:pw@db/shop"
+    assert get_async_url("sqlite:///./local.db") == "sqlite+aiosqlite:///./local.db"
+
+
+def test_pool_options_from_settings():
+    """Queue pool settings apply to file databases, not in-memory SQLite"""
+    from app.database import DB_SQLITE_BUSY_TIMEOUT, TimedAsyncQueuePool, get_engine_options
+
+    options = get_engine_options("postgresql+asyncpg://user:pw@db/shop", pgbouncer=False)
+    assert options["poolclass"] is TimedAsyncQueuePool
+    assert {"pool_size", "max_overflow", "pool_timeout", "pool_recycle", "pool_pre_ping"} <= set(options)
+    assert get_engine_options("sqlite+aiosqlite://", pgbouncer=False) == {}
+    sqlite_file = get_engine_options("sqlite+aiosqlite:///shop.db", pgbouncer=False)
+    assert sqlite_file["connect_args"] == {"timeout": DB_SQLITE_BUSY_TIMEOUT}
+
+
+def test_pgbouncer_mode():
+    """PgBouncer mode disables pooling and server-side prepared statements"""
+    from sqlalchemy.pool import NullPool
+    from app.database import get_engine_options
+
+    options = get_engine_options("postgresql+asyncpg://user:pw@bouncer/shop", pgbouncer=True)
+    assert options["poolclass"] is NullPool
+    assert options["connect_args"]["statement_cache_size"] == 0
+    assert options["connect_args"]["prepared_statement_cache_size"] == 0
+
+
+def test_pool_stats_endpoint(client, products):
+    """Pool checkouts and waits are exposed for monitoring"""
+    from app.database import DB_POOL_SIZE
+
+    before = client.get("/health/pool").json()
+    client.get("/products/")
+    stats = client.get("/health/pool").json()
+    assert stats["pool"] == "TimedAsyncQueuePool"
+    assert stats["checkouts"] > before["checkouts"]
+    assert stats["checked_out"] == 0
+    assert stats["size"] == DB_POOL_SIZE
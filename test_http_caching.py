@@ -0,0 +1,147 @@
+"""
+Tests for response compression (app.compression) and conditional GETs of
+orders and carts
+"""
+import gzip
+import json
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+
+from app.api import products as products_api
+from app.compression import choose_encoding
+from app.models import Product
+from test_archive import age_orders, place_order, run_archive
+
+
+def test_large_responses_are_gzipped(client, products):
+    """Compressed above the size threshold when accepted; Vary either way"""
+    catalog = client.get("/products/", headers={"Accept-Encoding": "gzip"})
+    assert catalog.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in catalog.headers["vary"]
+    assert len(catalog.json()) == 40
+
+    plain = client.get("/products/", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.json() == catalog.json()
+
+    small = client.get("/products/", params={"limit": 1}, headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+    assert "Accept-Encoding" in small.headers["vary"]
+
+
+def test_cached_catalog_compressed_once(client, products, monkeypatch):
+    """Catalog pages are compressed once per encoding, each with a strong ETag"""
+    compressed = []
+    compress = products_api.compress
+
+    def counted(body, encoding):
+        compressed.append(encoding)
+        return compress(body, encoding)
+
+    monkeypatch.setattr(products_api, "compress", counted)
+    gzipped = {"Accept-Encoding": "gzip"}
+    first, second = (client.get("/products/", headers=gzipped) for _ in range(2))
+    assert compressed == ["gzip"]
+    assert first.content == second.content and first.headers["content-encoding"] == "gzip"
+    etag = first.headers["etag"]
+    assert etag == second.headers["etag"] and etag.endswith('-gzip"') and not etag.startswith("W/")
+
+    plain = client.get("/products/", headers={"Accept-Encoding": "identity"})
+    assert plain.headers["etag"] != etag and not plain.headers["etag"].startswith("W/")
+    revalidated = client.get("/products/", headers={**gzipped, "If-None-Match": etag})
+    assert revalidated.status_code == 304 and revalidated.headers["etag"] == etag
+    assert client.get("/products/", headers={**gzipped, "If-None-Match": plain.headers["etag"]}).status_code == 200
+
+
+def test_streamed_exports_are_compressed_incrementally(client, auth_headers, products):
+    headers = auth_headers()
+    for product_id in products[:3]:
+        place_order(client, headers, product_id)
+    stream = client.stream(
+        "GET", "/orders/export", headers={**headers, "Accept-Encoding": "gzip"}
+    )
+    with stream as response:
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        raw = b"".join(response.iter_raw())
+    lines = gzip.decompress(raw).decode().splitlines()
+    assert [json.loads(line)["items"][0]["product_id"] for line in lines] == products[:3]
+
+
+def test_choose_encoding():
+    assert choose_encoding("gzip, deflate, br", brotli_available=False) == "gzip"
+    assert choose_encoding("br;q=0.5, gzip", brotli_available=True) == "gzip"
+    assert choose_encoding("br, gzip;q=0.9", brotli_available=True) == "br"
+    assert choose_encoding("*", brotli_available=False) == "gzip"
+    assert choose_encoding("gzip;q=0, identity") is None
+    assert choose_encoding("") is None
+
+
+def test_brotli_when_installed(client, products):
+    pytest.importorskip("brotli")  # optional; httpx decodes br with it too
+    response = client.get("/products/", headers={"Accept-Encoding": "br, gzip"})
+    assert response.headers["content-encoding"] == "br"
+    assert len(response.json()) == 40
+
+
+def test_order_conditional_get(client, auth_headers, products):
+    """Unchanged orders answer 304; paying changes the ETag"""
+    headers = auth_headers()
+    order_id = place_order(client, headers, products[0])
+    first = client.get(f"/orders/{order_id}", headers=headers)
+    etag, last_modified = first.headers["etag"], first.headers["last-modified"]
+    assert first.headers["cache-control"] == "private, no-cache"
+
+    again = client.get(f"/orders/{order_id}", headers={**headers, "If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b""
+    assert again.headers["etag"] == etag
+    since = client.get(f"/orders/{order_id}", headers={**headers, "If-Modified-Since": last_modified})
+    assert since.status_code == 304
+
+    client.post(f"/orders/{order_id}/pay", headers=headers)
+    paid = client.get(f"/orders/{order_id}", headers={**headers, "If-None-Match": etag})
+    assert paid.status_code == 200 and paid.json()["status"] == "paid"
+    assert paid.headers["etag"] != etag
+    # If-None-Match wins over a still-matching If-Modified-Since
+    both = {**headers, "If-None-Match": etag, "If-Modified-Since": paid.headers["last-modified"]}
+    assert client.get(f"/orders/{order_id}", headers=both).status_code == 200
+
+
+def test_archived_order_keeps_its_etag(client, auth_headers, products, db):
+    headers = auth_headers()
+    order_id = place_order(client, headers, products[0])
+    client.post(f"/orders/{order_id}/pay", headers=headers)
+    etag = client.get(f"/orders/{order_id}", headers=headers).headers["etag"]
+    age_orders(db, [order_id], days=400)
+    assert run_archive(older_than=timedelta(days=365)) == 1
+    assert client.get(f"/orders/{order_id}", headers={**headers, "If-None-Match": etag}).status_code == 304
+
+
+def test_cart_conditional_get(client, auth_headers, products, db):
+    """Every cart change, and a price change of a product in it, changes the ETag"""
+    headers = auth_headers()
+
+    def etag_after(change=None):
+        previous = client.get("/cart/", headers=headers).headers["etag"]
+        assert client.get("/cart/", headers={**headers, "If-None-Match": previous}).status_code == 304
+        if change is None:
+            return previous
+        change()
+        response = client.get("/cart/", headers={**headers, "If-None-Match": previous})
+        assert response.status_code == 200
+        return response.json()
+
+    assert etag_after().endswith('-0"')  # never changed
+    etag_after(lambda: client.post("/cart/items", json={"product_id": products[0], "quantity": 1}, headers=headers))
+    etag_after(lambda: client.patch("/cart/", json=[{"product_id": products[1], "quantity": 2}], headers=headers))
+
+    def reprice():
+        db.get(Product, products[1]).price = Decimal("99.00")
+        db.get(Product, products[5]).price = Decimal("1.00")  # not in the cart
+        db.commit()
+    assert etag_after(reprice)["items"][1]["product_price"] == "99.00"
+
+    etag_after(lambda: client.delete(f"/cart/items/{products[0]}", headers=headers))
+    assert etag_after(lambda: client.post("/orders/", headers=headers))["items"] == []
@@ -0,0 +1,124 @@
+"""
+Tests for stock tracking and reservations (app.inventory)
+"""
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.database import ASYNC_DATABASE_URL
+from app.inventory import expire_reservations, set_stock
+from app.models import Order, OutboxEvent, ProductStock, StockReservation
+
+
+def run(work):
+    async def scenario():
+        # own engine: pooled API connections belong to the TestClient's loop
+        engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=NullPool)
+        try:
+            async with AsyncSession(engine, expire_on_commit=False) as session:
+                return await work(session)
+        finally:
+            await engine.dispose()
+    return asyncio.run(scenario())
+
+
+def stock(db, product_id):
+    db.expire_all()
+    return db.query(func.sum(ProductStock.quantity)).filter(ProductStock.product_id == product_id).scalar()
+
+
+def checkout(client, headers, product_id, quantity=1):
+    client.post("/cart/items", json={"product_id": product_id, "quantity": quantity}, headers=headers)
+    return client.post("/orders/", headers=headers)
+
+
+def test_checkout_reserves_and_rejects_shortfall(client, auth_headers, products, db):
+    """Stock drops on checkout; a line that does not fit fails the whole checkout"""
+    run(lambda session: set_stock(session, products[0], 5))
+    headers = auth_headers()
+
+    assert checkout(client, headers, products[0], quantity=3).status_code == 200
+    assert stock(db, products[0]) == 2
+
+    client.post("/cart/items", json={"product_id": products[1], "quantity": 1}, headers=headers)
+    response = checkout(client, headers, products[0], quantity=3)
+    assert response.status_code == 409
+    assert str(products[0]) in response.json()["detail"]
+    assert stock(db, products[0]) == 2
+    assert len(client.get("/cart/", headers=headers).json()["items"]) == 2  # cart kept
+    assert db.query(Order).count() == 1
+
+
+def test_cancel_returns_stock_and_payment_keeps_it(client, auth_headers, products, db):
+    """Cancelling releases the reservation; paying consumes it"""
+    run(lambda session: set_stock(session, products[0], 4))
+    headers = auth_headers()
+    cancelled = checkout(client, headers, products[0], quantity=2).json()["id"]
+    paid = checkout(client, headers, products[0], quantity=2).json()["id"]
+    assert stock(db, products[0]) == 0
+
+    client.post(f"/orders/{cancelled}/cancel", headers=headers)
+    client.post(f"/orders/{paid}/pay", headers=headers)
+    assert stock(db, products[0]) == 2
+    assert db.query(StockReservation).count() == 0
+
+
+def test_untracked_products_are_unlimited(client, auth_headers, products, db):
+    """Products without stock rows check out as before"""
+    assert checkout(client, auth_headers(), products[0], quantity=1000).status_code == 200
+    assert db.query(ProductStock).count() == 0
+
+
+def test_expired_reservations_cancel_unpaid_orders(client, auth_headers, products, db):
+    """Unpaid orders past the reservation TTL are cancelled and their stock returned"""
+    run(lambda session: set_stock(session, products[0], 3))
+    headers = auth_headers()
+    stale = checkout(client, headers, products[0]).json()["id"]
+    fresh = checkout(client, headers, products[0]).json()["id"]
+    db.execute(
+        update(StockReservation)
+        .where(StockReservation.order_id == stale)
+        .values(expires_at=datetime.utcnow() - timedelta(minutes=1))
+    )
+    db.commit()
+
+    assert run(expire_reservations) == 1
+    assert stock(db, products[0]) == 2
+    assert db.get(Order, stale).status == "cancelled"
+    assert db.get(Order, fresh).status == "pending"
+    event = db.query(OutboxEvent).order_by(OutboxEvent.id.desc()).first()
+    assert event.topic == "order.cancelled" and json.loads(event.payload)["reason"] == "expired"
+    assert client.post(f"/orders/{stale}/pay", headers=headers).status_code == 400
+    assert run(expire_reservations) == 0
+
+
+def test_sharded_stock_sells_every_unit(client, auth_headers, products, db):
+    """Shards split the stock without losing or inventing units"""
+    run(lambda session: set_stock(session, products[0], 10, shards=4))
+    assert sorted(row.quantity for row in db.query(ProductStock)) == [2, 2, 3, 3]
+    headers = auth_headers()
+
+    statuses = [checkout(client, headers, products[0]).status_code for _ in range(12)]
+    assert statuses.count(200) == 10 and statuses.count(409) == 2
+    assert stock(db, products[0]) == 0
+
+
+def test_concurrent_checkouts_never_oversell(client, auth_headers, products, db):
+    """Many buyers racing for a few units: exactly the stock is sold"""
+    run(lambda session: set_stock(session, products[0], 7, shards=2))
+    buyers = [auth_headers(f"buyer{i}@example.com") for i in range(20)]
+    for headers in buyers:
+        client.post("/cart/items", json={"product_id": products[0], "quantity": 1}, headers=headers)
+
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        statuses = list(pool.map(lambda headers: client.post("/orders/", headers=headers).status_code, buyers))
+
+    assert statuses.count(200) == 7
+    assert statuses.count(409) == 13
+    assert stock(db, products[0]) == 0
+    assert db.query(func.sum(StockReservation.quantity)).scalar() == 7
@@ -0,0 +1,79 @@
+"""
+Tests for request metrics and the /metrics endpoint
+"""
+import logging
+
+from app import metrics
+
+
+def sample(text, name):
+    """Value of the exposition line starting with name"""
+    for line in text.splitlines():
+        if line.startswith(name + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def test_metrics_endpoint_reports_routes(client, products):
+    """Requests are counted by route template and status in Prometheus format"""
+    client.get("/products/")
+    client.get(f"/orders/{products[0]}")
+    client.get("/does-not-exist")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    assert "# TYPE http_request_duration_seconds histogram" in text
+    assert sample(text, 'http_requests_total{method="GET",route="/products/",status="200"}') >= 1
+    assert sample(text, 'http_requests_total{method="GET",route="/orders/{order_id}",status="403"}') >= 1
+    assert sample(text, 'http_requests_total{method="GET",route="unmatched",status="404"}') >= 1
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/products/",le="+Inf"}' in text
+    assert sample(text, "http_requests_in_flight") == 1  # the scrape itself
+    assert "db_pool_checkouts_total" in text
+
+
+def test_db_queries_are_attributed_to_routes(client, auth_headers, products):
+    """Statements issued while serving a request are counted against its route"""
+    headers = auth_headers()
+    client.get("/cart/", headers=headers)  # caches the principal
+    labels = ("GET", "/cart/")
+    before = metrics.REQUEST_QUERIES.values.get(labels, [[0], 0.0])[1]
+    client.get("/cart/", headers=headers)
+    total = metrics.REQUEST_QUERIES.values[labels][1]
+    # only the cart version lookup and the joined cart query remain
+    assert total - before == 2
+    assert metrics.REQUEST_DB_TIME.values[labels][1] > 0
+
+
+def test_slow_query_log(client, products, monkeypatch, caplog):
+    """Statements slower than SLOW_QUERY_MS are logged"""
+    monkeypatch.setattr(metrics, "SLOW_QUERY_MS", 1e-6)
+    with caplog.at_level(logging.WARNING, logger="app.metrics"):
+        client.get("/products/search", params={"q": "lamp"})
+    assert any("slow query" in record.message and "products" in record.message for record in caplog.records)
+
+
+def test_n_plus_one_warning(monkeypatch, caplog):
+    """A statement repeated N_PLUS_ONE_THRESHOLD times in one request is logged"""
+    monkeypatch.setattr(metrics, "N_PLUS_ONE_THRESHOLD", 3)
+    stats = metrics.RequestStats()
+    for _ in range(3):
+        stats.statements["SELECT * FROM products WHERE id = ?"] += 1
+    with caplog.at_level(logging.WARNING, logger="app.metrics"):
+        metrics.record_request("GET", "/test", 200, 0.01, stats)
+    assert "possible N+1 on GET /test: statement ran 3 times" in caplog.text
+
+
+def test_histogram_rendering():
+    """Buckets are cumulative and end with +Inf, _sum and _count"""
+    histogram = metrics.Histogram("latency", "Latency.", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value, ("/a",))
+    assert histogram.render()[2:] == [
+        'latency_bucket{route="/a",le="0.1"} 1',
+        'latency_bucket{route="/a",le="1"} 3',
+        'latency_bucket{route="/a",le="+Inf"} 4',
+        'latency_sum{route="/a"} 6.05',
+        'latency_count{route="/a"} 4',
+    ]
@@ -0,0 +1,97 @@
+"""
+Tests for the streaming order export (app.order_export)
+"""
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from app import auth, order_export
+from app.models import Order, OrderItem
+from test_archive import age_orders, place_order, run_archive
+
+
+@pytest.fixture
+def history(client, auth_headers, products, db):
+    """Three orders for the buyer (one archived, one with three items) and one for someone else"""
+    buyer = auth_headers()
+    archived = place_order(client, buyer, products[0])
+    client.post(f"/orders/{archived}/pay", headers=buyer)
+    for product_id in products[1:4]:
+        client.post("/cart/items", json={"product_id": product_id, "quantity": 2}, headers=buyer)
+    large = client.post("/orders/", headers=buyer).json()["id"]
+    client.post(f"/orders/{large}/cancel", headers=buyer)
+    pending = place_order(client, buyer, products[4], quantity=3)
+    other = place_order(client, auth_headers("other@example.com"), products[5])
+
+    # Distinct ages so the export order is unambiguous
+    age_orders(db, [archived], days=400)
+    for order_id, days in ((large, 2), (pending, 1)):
+        created_at = datetime.utcnow() - timedelta(days=days)
+        db.execute(update(Order).where(Order.id == order_id).values(created_at=created_at))
+        db.execute(update(OrderItem).where(OrderItem.order_id == order_id).values(created_at=created_at))
+    db.commit()
+    assert run_archive(older_than=timedelta(days=365)) == 1
+    return buyer, {"archived": archived, "large": large, "pending": pending, "other": other}
+
+
+def ndjson(response):
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_user_export_streams_own_orders_with_items(client, history, products, monkeypatch):
+    """Live and archived orders, oldest first, items nested even across batches"""
+    monkeypatch.setattr(order_export, "ORDER_EXPORT_BATCH_SIZE", 2)
+    headers, orders = history
+    exported = ndjson(client.get("/orders/export", headers=headers))
+
+    assert [order["id"] for order in exported] == [orders["archived"], orders["large"], orders["pending"]]
+    large = exported[1]
+    assert large["status"] == "cancelled" and large["total_amount"] == "75.00"
+    assert [(item["product_id"], item["quantity"]) for item in large["items"]] == [
+        (product_id, 2) for product_id in products[1:4]
+    ]
+    assert exported[2]["items"] == [
+        {"product_id": products[4], "product_name": "Lamp 4", "product_price": "14.50", "quantity": 3}
+    ]
+
+
+def test_export_filters(client, history):
+    headers, orders = history
+    day = datetime.utcnow() - timedelta(days=1, hours=12)
+
+    paid_or_pending = client.get("/orders/export", params={"status": ["paid", "pending"]}, headers=headers)
+    assert [order["id"] for order in ndjson(paid_or_pending)] == [orders["archived"], orders["pending"]]
+    recent = client.get("/orders/export", params={"since": day.isoformat()}, headers=headers)
+    assert [order["id"] for order in ndjson(recent)] == [orders["pending"]]
+    older = client.get("/orders/export", params={"until": day.isoformat()}, headers=headers)
+    assert [order["id"] for order in ndjson(older)] == [orders["archived"], orders["large"]]
+    assert client.get("/orders/export", params={"status": "shipped"}, headers=headers).status_code == 422
+
+
+def test_csv_has_one_row_per_item(client, history):
+    headers, orders = history
+    response = client.get("/orders/export", params={"format": "csv"}, headers=headers)
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [int(row["order_id"]) for row in rows] == [orders["archived"]] + [orders["large"]] * 3 + [orders["pending"]]
+    assert rows[-1]["quantity"] == "3" and rows[-1]["status"] == "pending"
+
+
+def test_admin_export_covers_every_user(client, history, auth_headers, monkeypatch):
+    headers, orders = history
+    assert client.get("/admin/orders/export", headers=headers).status_code == 403
+
+    monkeypatch.setattr(auth, "ADMIN_EMAILS", frozenset(["admin@example.com"]))
+    admin = auth_headers("admin@example.com")
+    everything = ndjson(client.get("/admin/orders/export", headers=admin))
+    assert sorted(order["id"] for order in everything) == sorted(orders.values())
+
+    other_user = next(order["user_id"] for order in everything if order["id"] == orders["other"])
+    only_other = client.get("/admin/orders/export", params={"user_id": other_user}, headers=admin)
+    assert [order["id"] for order in ndjson(only_other)] == [orders["other"]]
@@ -0,0 +1,193 @@
+"""
+Tests for the /orders endpoints
+"""
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from app.models import Cart, Order, OrderItem
+
+
+def test_checkout_snapshots_cart(client, auth_headers, products, db):
+    """Checkout copies cart lines into order_items and clears the cart"""
+    headers = auth_headers()
+    client.post("/cart/items", json={"product_id": products[0], "quantity": 2}, headers=headers)
+    client.post("/cart/items", json={"product_id": products[1], "quantity": 1}, headers=headers)
+
+    response = client.post("/orders/", headers=headers)
+    assert response.status_code == 200, response.text
+    order = response.json()
+    assert order["status"] == "pending"
+    assert Decimal(order["total_amount"]) == Decimal("32.50")
+
+    detail = client.get(f"/orders/{order['id']}", headers=headers).json()
+    assert {(item["product_id"], item["quantity"]) for item in detail["items"]} == {
+        (products[0], 2), (products[1], 1)
+    }
+    assert client.get("/cart/", headers=headers).json()["items"] == []
+
+
+def test_checkout_empty_cart(client, auth_headers):
+    """Checking out an empty cart is rejected"""
+    response = client.post("/orders/", headers=auth_headers())
+    assert response.status_code == 400
+
+
+def test_checkout_query_count_is_constant(client, auth_headers, products, count_queries):
+    """Checkout costs the same number of statements for 1 or 30 lines"""
+    headers = auth_headers()
+    client.post("/cart/items", json={"product_id": products[0], "quantity": 1}, headers=headers)
+    with count_queries() as small:
+        assert client.post("/orders/", headers=headers).status_code == 200
+
+    for product_id in products[:30]:
+        client.post("/cart/items", json={"product_id": product_id, "quantity": 2}, headers=headers)
+    with count_queries() as large:
+        assert client.post("/orders/", headers=headers).status_code == 200
+
+    assert small.count == large.count
+
+
+def test_concurrent_checkouts_and_cart_edits(client, auth_headers, products, db):
+    """Parallel checkouts and edits never lose, duplicate or misprice a line"""
+    headers = auth_headers()
+    for product_id in products[:5]:
+        client.post("/cart/items", json={"product_id": product_id, "quantity": 1}, headers=headers)
+
+    def checkout(_):
+        return client.post("/orders/", headers=headers).status_code
+
+    def add_item(product_id):
+        return client.post(
+            "/cart/items", json={"product_id": product_id, "quantity": 1}, headers=headers
+        ).status_code
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        checkouts = [pool.submit(checkout, i) for i in range(10)]
+        edits = [pool.submit(add_item, product_id) for product_id in products[5:25]]
+        assert all(future.result() in (200, 400) for future in checkouts)
+        assert all(future.result() == 200 for future in edits)
+
+    db.expire_all()
+    ordered = [item.product_id for item in db.query(OrderItem).all()]
+    remaining = [line.product_id for line in db.query(Cart).all()]
+    # every line ends up in exactly one order or is still in the cart
+    assert sorted(ordered + remaining) == sorted(products[:25])
+
+    for order in db.query(Order).all():
+        items = db.query(OrderItem).filter(OrderItem.order_id == order.id).all()
+        assert items
+        assert order.total_amount == sum(item.product_price * item.quantity for item in items)
+
+
+def test_pay_and_cancel(client, auth_headers, products):
+    """Only pending orders can be paid or cancelled"""
+    headers = auth_headers()
+    order_ids = []
+    for _ in range(2):
+        client.post("/cart/items", json={"product_id": products[0], "quantity": 1}, headers=headers)
+        order_ids.append(client.post("/orders/", headers=headers).json()["id"])
+
+    paid = client.post(f"/orders/{order_ids[0]}/pay", headers=headers)
+    assert paid.status_code == 200 and paid.json()["status"] == "paid"
+    assert client.post(f"/orders/{order_ids[0]}/cancel", headers=headers).status_code == 400
+
+    cancelled = client.post(f"/orders/{order_ids[1]}/cancel", headers=headers)
+    assert cancelled.status_code == 200 and cancelled.json()["status"] == "cancelled"
+    assert client.post(f"/orders/{order_ids[1]}/pay", headers=headers).status_code == 400
+
+    listed = client.get("/orders/", headers=headers).json()
+    assert {order["status"] for order in listed} == {"paid", "cancelled"}
+
+
+def test_order_history_pagination(client, auth_headers, products):
+    """Order history is paged newest first via X-Next-Cursor"""
+    headers = auth_headers()
+    created = []
+    for product_id in products[:5]:
+        client.post("/cart/items", json={"product_id": product_id, "quantity": 1}, headers=headers)
+        created.append(client.post("/orders/", headers=headers).json()["id"])
+
+    first = client.get("/orders/", params={"limit": 3}, headers=headers)
+    assert [order["id"] for order in first.json()] == created[::-1][:3]
+    rest = client.get(
+        "/orders/", params={"limit": 3, "cursor": first.headers["X-Next-Cursor"]}, headers=headers
+    )
+    assert [order["id"] for order in rest.json()] == created[::-1][3:]
+    assert "X-Next-Cursor" not in rest.headers
+
+
+def test_checkout_idempotency_key_replays(client, auth_headers, products, db):
+    """A retried checkout returns the first order instead of a new one"""
+    headers = {**auth_headers(), "Idempotency-Key": "checkout-1"}
+    client.post("/cart/items", json={"product_id": products[0], "quantity": 1}, headers=headers)
+
+    first = client.post("/orders/", headers=headers)
+    retry = client.post("/orders/", headers=headers)
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json()
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert db.query(Order).count() == 1
+
+
+def test_pay_idempotency_key_replays(client, auth_headers, products):
+    """A retried payment gets the stored 200, not 'cannot be paid'"""
+    headers = auth_headers()
+    client.post("/cart/items", json={"product_id": products[0], "quantity": 1}, headers=headers)
+    order_id = client.post("/orders/", headers=headers).json()["id"]
+
+    pay_headers = {**headers, "Idempotency-Key": "pay-1"}
+    first = client.post(f"/orders/{order_id}/pay", headers=pay_headers)
+    retry = client.post(f"/orders/{order_id}/pay", headers=pay_headers)
+    assert first.status_code == retry.status_code == 200
+    assert retry.json()["status"] == "paid"
+    assert client.post(f"/orders/{order_id}/pay", headers=headers).status_code == 400
+
+
+def test_idempotency_key_reuse_and_failures(client, auth_headers, products):
+    """Failed attempts are not stored; reusing a key elsewhere is rejected"""
+    headers = {**auth_headers(), "Idempotency-Key": "k-1"}
+    assert client.post("/orders/", headers=headers).status_code == 400  # empty cart, not stored
+
+    client.post("/cart/items", json={"product_id": products[0], "quantity": 1}, headers=headers)
+    order_id = client.post("/orders/", headers=headers).json()["id"]
+    assert client.post(f"/orders/{order_id}/pay", headers=headers).status_code == 422
+
+
+def test_concurrent_idempotent_checkouts(client, auth_headers, products, db):
+    """Parallel retries of one checkout create a single order"""
+    headers = {**auth_headers(), "Idempotency-Key": "race-1"}
+    client.post("/cart/items", json={"product_id": products[0], "quantity": 1}, headers=headers)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        responses = list(pool.map(lambda _: client.post("/orders/", headers=headers), range(8)))
+    assert {response.status_code for response in responses} == {200}
+    assert len({response.json()["id"] for response in responses}) == 1
+    assert db.query(Order).count() == 1
+
+
+def test_expired_idempotency_keys_are_purged(client, auth_headers, products, db):
+    """Keys past their TTL are removed and can be reused"""
+    import asyncio
+    from datetime import datetime, timedelta
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.pool import NullPool
+    from app.database import ASYNC_DATABASE_URL
+    from app.idempotency import purge_expired_keys
+    from app.models import IdempotencyKey
+
+    headers = {**auth_headers(), "Idempotency-Key": "old"}
+    client.post("/cart/items", json={"product_id": products[0], "quantity": 1}, headers=headers)
+    client.post("/orders/", headers=headers)
+    db.query(IdempotencyKey).update({"expires_at": datetime.utcnow() - timedelta(minutes=1)})
+    db.commit()
+
+    async def purge():
+        # own engine: pooled API connections belong to the TestClient's loop
+        purge_engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=NullPool)
+        async with AsyncSession(purge_engine) as session:
+            removed = await purge_expired_keys(session)
+        await purge_engine.dispose()
+        return removed
+
+    assert asyncio.run(purge()) == 1
+    assert db.query(IdempotencyKey).count() == 0
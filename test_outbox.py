@@ -0,0 +1,168 @@
+"""
+Tests for the transactional outbox (app.outbox)
+"""
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app import outbox
+from app.database import ASYNC_DATABASE_URL
+from app.models import OutboxEvent
+
+
+def add_events(db, count, topic="test.event"):
+    now = datetime.utcnow()
+    db.add_all([
+        OutboxEvent(topic=topic, payload=json.dumps({"n": n}), created_at=now, available_at=now, attempts=0)
+        for n in range(count)
+    ])
+    db.commit()
+
+
+def run_workers(handlers, workers=1, **kwargs):
+    """Run one batch on each of `workers` workers at once; returns claimed counts."""
+    async def run():
+        # own engine: pooled API connections belong to the TestClient's loop
+        engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=NullPool)
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+        try:
+            return await asyncio.gather(*(
+                outbox.OutboxWorker(sessions, handlers, **kwargs).run_once() for _ in range(workers)
+            ))
+        finally:
+            await engine.dispose()
+    return asyncio.run(run())
+
+
+def test_order_changes_write_events(client, auth_headers, products, db):
+    """Checkout, pay and cancel each commit one event; rejected changes none"""
+    headers = auth_headers()
+    order_ids = []
+    for product_id in products[:2]:
+        client.post("/cart/items", json={"product_id": product_id, "quantity": 1}, headers=headers)
+        order_ids.append(client.post("/orders/", headers=headers).json()["id"])
+    client.post(f"/orders/{order_ids[0]}/pay", headers=headers)
+    client.post(f"/orders/{order_ids[1]}/cancel", headers=headers)
+    assert client.post(f"/orders/{order_ids[0]}/pay", headers=headers).status_code == 400
+
+    events = [(event.topic, json.loads(event.payload)) for event in db.query(OutboxEvent).order_by(OutboxEvent.id)]
+    assert [(topic, payload["order_id"]) for topic, payload in events] == [
+        ("order.created", order_ids[0]),
+        ("order.created", order_ids[1]),
+        ("order.paid", order_ids[0]),
+        ("order.cancelled", order_ids[1]),
+    ]
+    assert events[2][1]["status"] == "paid"
+
+
+def test_worker_handles_and_deletes_events(db):
+    """Handled events are removed and their lag recorded"""
+    add_events(db, 5)
+    seen = []
+
+    async def record(payload):
+        seen.append(payload["n"])
+
+    assert run_workers({"test.event": record}) == [5]
+    assert sorted(seen) == [0, 1, 2, 3, 4]
+    assert db.query(OutboxEvent).count() == 0
+    assert outbox.EVENTS.values[("test.event", "done")] >= 5
+    assert run_workers({"test.event": record}) == [0]
+
+
+def test_failing_handler_backs_off_then_gives_up(db, monkeypatch):
+    """Failures are retried later, then parked once attempts run out"""
+    monkeypatch.setattr(outbox, "OUTBOX_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(outbox, "OUTBOX_BACKOFF_BASE", 60)
+    add_events(db, 1)
+
+    async def fail(payload):
+        raise RuntimeError("downstream unavailable")
+
+    assert run_workers({"test.event": fail}) == [1]
+    event = db.query(OutboxEvent).one()
+    assert event.attempts == 1 and event.failed_at is None
+    assert event.available_at > datetime.utcnow()
+    assert event.last_error == "RuntimeError: downstream unavailable"
+    assert run_workers({"test.event": fail}) == [0]  # not due yet
+
+    db.execute(update(OutboxEvent).values(available_at=datetime.utcnow() - timedelta(seconds=1)))
+    db.commit()
+    assert run_workers({"test.event": fail}) == [1]
+    db.expire_all()
+    event = db.query(OutboxEvent).one()
+    assert event.attempts == 2 and event.failed_at is not None
+    db.execute(update(OutboxEvent).values(available_at=datetime.utcnow() - timedelta(seconds=1)))
+    db.commit()
+    assert run_workers({"test.event": fail}) == [0]  # parked events are never claimed
+
+
+def test_worker_survives_database_errors(db):
+    """A failing claim is logged and retried after the poll interval"""
+    add_events(db, 1)
+
+    async def run():
+        engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=NullPool)
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+        outages = [ConnectionError("database unavailable")] * 2
+        stop = asyncio.Event()
+
+        def flaky_sessions():
+            if outages:
+                raise outages.pop()
+            return sessions()
+
+        async def record(payload):
+            stop.set()
+
+        try:
+            worker = outbox.OutboxWorker(flaky_sessions, {"test.event": record})
+            await asyncio.wait_for(worker.run(stop, poll_interval=0.01), 5)
+        finally:
+            await engine.dispose()
+        return outages
+
+    assert asyncio.run(run()) == []
+    assert db.query(OutboxEvent).count() == 0
+
+
+def test_concurrent_workers_claim_each_event_once(db):
+    """Workers polling together split the backlog without overlap"""
+    add_events(db, 60)
+    seen = []
+
+    async def record(payload):
+        await asyncio.sleep(0)
+        seen.append(payload["n"])
+
+    claimed = run_workers({"test.event": record}, workers=3, batch_size=25)
+    assert sum(claimed) == len(seen)
+    assert len(seen) == len(set(seen))
+    while sum(run_workers({"test.event": record}, batch_size=25)):
+        pass
+    assert sorted(seen) == list(range(60))
+
+
+def test_backlog_metrics(db):
+    """Scrapes report pending and parked events and the oldest one's age"""
+    add_events(db, 3)
+    db.execute(update(OutboxEvent).values(created_at=datetime.utcnow() - timedelta(seconds=30)))
+    db.execute(update(OutboxEvent).where(OutboxEvent.id == 1).values(failed_at=datetime.utcnow()))
+    db.commit()
+
+    async def scrape():
+        engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=NullPool)
+        try:
+            return await outbox.OutboxWorker(async_sessionmaker(engine)).render_metrics()
+        finally:
+            await engine.dispose()
+
+    text = asyncio.run(scrape())
+    assert "outbox_pending_events 2" in text
+    assert "outbox_failed_events 1" in text
+    oldest = next(line for line in text.splitlines() if line.startswith("outbox_oldest_pending_seconds "))
+    assert float(oldest.split()[1]) >= 30
@@ -0,0 +1,167 @@
+"""
+Tests for the /products endpoints
+"""
+import asyncio
+from decimal import Decimal
+
+from app.cache import LocalBackend, VersionedCache
+from app.models import Product
+
+
+def test_list_products(client, products):
+    """The catalog is listed in id order with skip/limit paging"""
+    body = client.get("/products/", params={"skip": 2, "limit": 3}).json()
+    assert [product["id"] for product in body] == products[2:5]
+    assert body[0]["price"] == "12.50"
+
+
+def test_catalog_served_from_cache(client, products, count_queries):
+    """Repeat catalog reads do not touch the database"""
+    client.get("/products/")
+    with count_queries() as cached:
+        response = client.get("/products/")
+    assert response.status_code == 200
+    assert cached.count == 0
+
+
+def test_catalog_etag_not_modified(client, products):
+    """If-None-Match with the current ETag answers 304 without a body"""
+    etag = client.get("/products/").headers["ETag"]
+    response = client.get("/products/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+
+def test_catalog_invalidated_on_product_change(client, products, db):
+    """Changing a product drops cached pages and changes the ETag"""
+    first = client.get("/products/")
+    product = db.get(Product, products[0])
+    product.price = Decimal("99.00")
+    db.commit()
+
+    second = client.get("/products/", headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 200
+    assert second.headers["ETag"] != first.headers["ETag"]
+    assert second.json()[0]["price"] == "99.00"
+
+
+def test_cache_fill_is_single_flight():
+    """Concurrent misses share one loader call"""
+    cache = VersionedCache()
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "page"
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_or_load("key", loader) for _ in range(50)))
+
+    assert asyncio.run(scenario()) == ["page"] * 50
+    assert len(calls) == 1
+
+
+def test_invalidation_reaches_other_workers():
+    """With a shared backend, a change in one worker drops every worker's pages once"""
+    shared = LocalBackend()
+    workers = [VersionedCache(shared=shared), VersionedCache(shared=shared)]
+    renders = []
+
+    async def render():
+        renders.append(1)
+        return f"page {len(renders)}"
+
+    async def pages():
+        for cache in workers:
+            await cache.sync()
+        return [await cache.get_or_load("key", render) for cache in workers]
+
+    async def scenario():
+        before = await pages()
+        workers[0].invalidate()
+        await asyncio.sleep(0)  # let the publish run
+        return before, await pages(), await pages()
+
+    before, after, again = asyncio.run(scenario())
+    assert before == ["page 1", "page 2"]
+    assert after == again == ["page 3", "page 4"]
+    assert len(renders) == 4
+
+
+def test_cursor_pagination_walks_catalog(client, products):
+    """Following X-Next-Cursor visits every product exactly once"""
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 7, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/products/", params=params)
+        seen += [product["id"] for product in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert seen == products
+
+
+def test_cursor_orders_by_created_at(client, db):
+    """Pages follow (created_at, id), not insertion order"""
+    from datetime import datetime
+    db.add_all([
+        Product(name="Newest", price=Decimal("1.00"), created_at=datetime(2026, 3, 1)),
+        Product(name="Oldest", price=Decimal("1.00"), created_at=datetime(2026, 1, 1)),
+        Product(name="Middle", price=Decimal("1.00"), created_at=datetime(2026, 2, 1)),
+    ])
+    db.commit()
+    first = client.get("/products/", params={"limit": 2})
+    assert [product["name"] for product in first.json()] == ["Oldest", "Middle"]
+    rest = client.get("/products/", params={"limit": 2, "cursor": first.headers["X-Next-Cursor"]})
+    assert [product["name"] for product in rest.json()] == ["Newest"]
+    assert "X-Next-Cursor" not in rest.headers
+
+
+def test_invalid_cursor(client):
+    """Malformed cursors are rejected"""
+    assert client.get("/products/", params={"cursor": "not-a-cursor"}).status_code == 400
+
+
+def test_search_ranks_and_prefix_matches(client, db):
+    """Search matches term prefixes across name and description, name first"""
+    db.add_all([
+        Product(name="Brass reading lamp", description="Warm light", price=Decimal("30.00")),
+        Product(name="Desk organiser", description="Fits next to any reading lamp", price=Decimal("12.00")),
+        Product(name="Floor rug", description="Soft wool", price=Decimal("80.00")),
+    ])
+    db.commit()
+
+    names = [product["name"] for product in client.get("/products/search", params={"q": "read lam"}).json()]
+    assert names == ["Brass reading lamp", "Desk organiser"]
+    assert client.get("/products/search", params={"q": "wool"}).json()[0]["name"] == "Floor rug"
+    assert client.get("/products/search", params={"q": "nothing"}).json() == []
+
+
+def test_search_tracks_product_changes(client, db):
+    """Renamed and deleted products are reflected in search"""
+    product = Product(name="Copper pendant", description="Hanging light", price=Decimal("45.00"))
+    db.add(product)
+    db.commit()
+    product.name = "Copper sconce"
+    db.commit()
+    assert client.get("/products/search", params={"q": "pendant"}).json() == []
+    assert len(client.get("/products/search", params={"q": "sconce"}).json()) == 1
+    db.delete(product)
+    db.commit()
+    assert client.get("/products/search", params={"q": "sconce"}).json() == []
+
+
+def test_search_pagination(client, products):
+    """Search pages follow X-Next-Cursor without repeats"""
+    seen, cursor = [], None
+    while True:
+        params = {"q": "lamp", "limit": 6, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/products/search", params=params)
+        seen += [product["id"] for product in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert sorted(seen) == products
+    assert len(seen) == len(set(seen))
@@ -0,0 +1,165 @@
+"""
+Tests for rate limiting and load shedding (app.ratelimit)
+"""
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.auth import create_access_token
+from app.main import app
+from app.ratelimit import (
+    LocalBuckets, RateLimitMiddleware, RedisBuckets, TOKEN_BUCKET_SCRIPT, parse_rules, refill,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRedis:
+    """Runs the token bucket script with the same arithmetic, on a fake clock"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.hashes = {}
+        self.down = False
+
+    def register_script(self, script):
+        assert script == TOKEN_BUCKET_SCRIPT
+
+        async def run(keys, args):
+            if self.down:
+                raise ConnectionError("connection refused")
+            rate, capacity = float(args[0]), float(args[1])
+            tokens, at = self.hashes.get(keys[0], (None, self.clock()))
+            tokens, wait = refill(tokens, at, self.clock(), rate, capacity)
+            self.hashes[keys[0]] = (tokens, self.clock())
+            return str(wait).encode()
+        return run
+
+
+def take_all(buckets, key, count, rate=1.0, capacity=3):
+    return [asyncio.run(buckets.take(key, rate, capacity)) for _ in range(count)]
+
+
+def test_bucket_bursts_then_refills():
+    """A full bucket allows a burst, then one request per 1/rate seconds"""
+    clock = FakeClock()
+    buckets = LocalBuckets(timer=clock)
+    assert take_all(buckets, "a", 4) == [0, 0, 0, 1.0]
+    clock.now += 0.5
+    assert take_all(buckets, "a", 1) == [0.5]
+    clock.now += 0.5
+    assert take_all(buckets, "a", 2) == [0, 1.0]
+    assert take_all(buckets, "b", 1) == [0]  # buckets are independent
+    clock.now += 60
+    assert take_all(buckets, "a", 4) == [0, 0, 0, 1.0]  # refills only up to capacity
+
+
+def test_shared_buckets_span_workers():
+    """Workers on one Redis draw from the same bucket; an outage fails open"""
+    redis = FakeRedis(FakeClock())
+    worker_a, worker_b = RedisBuckets(redis), RedisBuckets(redis)
+    assert take_all(worker_a, "ip:1.2.3.4:GET /", 2) == [0, 0]
+    assert take_all(worker_b, "ip:1.2.3.4:GET /", 2) == [0, 1.0]
+    assert list(redis.hashes) == ["lampshades:ratelimit:ip:1.2.3.4:GET /"]
+
+    redis.down = True
+    assert take_all(worker_a, "ip:1.2.3.4:GET /", 1) == [0]
+
+
+def test_parse_rules():
+    rules = parse_rules("post /auth/login ip 10/60; * * user 5/0.5;")
+    assert [(rule.method, rule.route, rule.key, rule.rate) for rule in rules] == [
+        ("POST", "/auth/login", "ip", 10 / 60),
+        ("*", "*", "user", 10.0),
+    ]
+    for bad in ["GET / ip", "GET / session 1/1", "GET / ip 0/1", "GET / ip ten/1"]:
+        with pytest.raises(ValueError):
+            parse_rules(bad)
+
+
+def test_limits_per_route_and_user(db, products):
+    """Buckets are per route template and identity; over the limit is 429 with Retry-After"""
+    rules = parse_rules("GET /orders/{order_id} ip 2/60; GET /products/ ip 1/60; GET / user 2/60")
+    limited = RateLimitMiddleware(app, routes=app.router.routes, rules=rules, buckets=LocalBuckets())
+    alice = {"Authorization": f"Bearer {create_access_token({'sub': 'alice@example.com'})}"}
+    bob = {"Authorization": f"Bearer {create_access_token({'sub': 'bob@example.com'})}"}
+
+    with TestClient(limited) as api:
+        # Different ids, one template: one bucket (rejected requests count too)
+        assert [api.get(f"/orders/{order_id}").status_code for order_id in (1, 2, 3)] == [403, 403, 429]
+        response = api.get("/orders/4")
+        assert response.headers["Retry-After"] == "30"
+        assert response.json() == {"detail": "Too many requests"}
+
+        assert [api.get("/products/", params={"page": page}).status_code for page in (1, 2)] == [200, 429]
+        assert api.get("/products/search", params={"q": "lamp"}).status_code == 200  # no rule
+
+        assert [api.get("/", headers=alice).status_code for _ in range(3)] == [200, 200, 429]
+        assert api.get("/", headers=bob).status_code == 200
+
+
+def test_overlapping_rules_keep_separate_buckets(db):
+    """A route rule and a catch-all both apply, each with its own full limit"""
+    rules = parse_rules("POST /auth/login ip 4/60; * * ip 6/1")
+    limited = RateLimitMiddleware(app, routes=app.router.routes, rules=rules,
+                                  buckets=LocalBuckets(timer=FakeClock()))
+    bad = {"email": "nobody@example.com", "password": "wrong"}
+    with TestClient(limited) as api:
+        assert [api.post("/auth/login", json=bad).status_code for _ in range(5)] == [401] * 4 + [429]
+        # Other routes get the catch-all's own limit
+        assert [api.get("/").status_code for _ in range(7)] == [200] * 6 + [429]
+
+
+def test_user_rules_skip_anonymous_requests(db):
+    limited = RateLimitMiddleware(app, routes=app.router.routes, rules=parse_rules("GET / user 1/60"),
+                                  buckets=LocalBuckets())
+    bob = {"Authorization": f"Bearer {create_access_token({'sub': 'bob@example.com'})}"}
+    with TestClient(limited) as api:
+        assert [api.get("/").status_code for _ in range(3)] == [200, 200, 200]
+        assert [api.get("/", headers=bob).status_code for _ in range(2)] == [200, 429]
+        assert api.get("/", headers={"Authorization": "Bearer garbage"}).status_code == 200
+
+
+async def slow_app(scope, receive, send):
+    await asyncio.sleep(float(scope["query_string"] or 0))
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def test_load_shedding():
+    """Past the concurrency cap, requests queue up to max_wait and are then shed with 503"""
+    limited = RateLimitMiddleware(slow_app, routes=[], rules=[], buckets=LocalBuckets(),
+                                  max_concurrent=1, max_wait=0.1, max_queue=1)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=limited)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as api:
+            busy = asyncio.ensure_future(api.get("/?0.5"))
+            await asyncio.sleep(0.05)
+            queued = asyncio.ensure_future(api.get("/"))
+            await asyncio.sleep(0.01)
+            overflow = await api.get("/")  # queue full: shed at once
+            health = await api.get("/health")  # probes bypass the limiter
+            timed_out = await queued
+            assert (await busy).status_code == 200
+
+            quick = asyncio.ensure_future(api.get("/?0.02"))
+            await asyncio.sleep(0.005)
+            served = await api.get("/")  # waits for the quick request's slot
+            await quick
+        return overflow, health, timed_out, served
+
+    overflow, health, timed_out, served = asyncio.run(scenario())
+    assert overflow.status_code == 503 and overflow.headers["Retry-After"] == "1"
+    assert health.status_code == 200
+    assert timed_out.status_code == 503
+    assert served.status_code == 200
+    assert limited.limiter.active == 0 and not limited.limiter.waiters
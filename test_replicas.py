@@ -0,0 +1,113 @@
+"""
+Tests for read-replica routing, using a second SQLite database as the replica
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app import replicas
+from app.database import Base
+from app.models import Cart, User
+
+
+def make_replica(path):
+    return replicas.Replica(f"sqlite:///{path}", create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=NullPool))
+
+
+@pytest.fixture
+def replica(db, monkeypatch):
+    """An empty replica with the full schema; reads that reach it see no rows"""
+    path = os.path.join(tempfile.mkdtemp(), "replica.db")
+    sync_engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=sync_engine)
+    replica = make_replica(path)
+    monkeypatch.setattr(replicas, "read_replicas", replicas.ReplicaSet([replica]))
+    replicas.recent_writers.cache.clear()
+    yield replica
+    sync_engine.dispose()
+
+
+def test_reads_go_to_replica(client, auth_headers, products, replica, db):
+    """Read-only routes use the replica; writes and authentication use the primary"""
+    headers = auth_headers()
+    user = db.query(User).filter_by(email="buyer@example.com").one()
+    db.add(Cart(user_id=user.id, product_id=products[0], quantity=1))
+    db.commit()
+
+    assert client.get("/cart/", headers=headers).json()["items"] == []
+    assert client.get("/orders/", headers=headers).json() == []
+    assert client.get("/products/search", params={"q": "lamp"}).json() == []
+    assert client.get("/health/replicas").json()[0]["healthy"] is True
+
+
+def test_read_your_writes(client, auth_headers, products, replica):
+    """After writing, a user reads from the primary until the window passes"""
+    headers = auth_headers()
+    client.post("/cart/items", json={"product_id": products[0], "quantity": 2}, headers=headers)
+    assert [item["product_id"] for item in client.get("/cart/", headers=headers).json()["items"]] == [products[0]]
+
+    # Other users are not pinned to the primary
+    other = auth_headers("other@example.com")
+    assert client.get("/cart/", headers=other).json()["items"] == []
+
+    replicas.recent_writers.cache.clear()  # the window has passed
+    assert client.get("/cart/", headers=headers).json()["items"] == []
+
+
+def test_catalog_renders_from_primary_after_change(client, products, replica):
+    """A just-changed catalog is not cached from a replica that may lag"""
+    assert len(client.get("/products/").json()) == len(products)
+
+
+def test_falls_back_when_replica_is_down(client, auth_headers, products, monkeypatch):
+    """Unreachable replicas are skipped and reads go to the primary"""
+    broken = make_replica("/nonexistent/dir/replica.db")
+    monkeypatch.setattr(replicas, "read_replicas", replicas.ReplicaSet([broken]))
+    assert len(client.get("/products/search", params={"q": "lamp"}).json()) == 20
+    assert client.get("/health/replicas").json()[0]["healthy"] is False
+
+
+def test_falls_back_when_replica_fails_mid_read(client, auth_headers, products, monkeypatch):
+    """A replica that connects but errors on the query is dropped and the read retried on the primary"""
+    failing = make_replica(os.path.join(tempfile.mkdtemp(), "empty.db"))  # no tables
+    monkeypatch.setattr(replicas, "read_replicas", replicas.ReplicaSet([failing]))
+    assert len(client.get("/products/search", params={"q": "lamp"}).json()) == 20
+    assert failing.healthy is False
+
+    headers = auth_headers()
+    replicas.recent_writers.cache.clear()  # registering pinned the user to the primary
+    failing.healthy = True  # back in rotation, still failing: primary-key loads retry too
+    assert client.get("/cart/summary", headers=headers).json()["item_count"] == 0
+    assert failing.healthy is False
+
+
+def test_falls_back_when_replica_lags(client, products, replica, monkeypatch):
+    """Replicas further behind than DB_REPLICA_MAX_LAG leave the rotation"""
+    async def lagging(conn):
+        return replicas.DB_REPLICA_MAX_LAG + 30
+
+    monkeypatch.setattr(replicas, "measure_lag", lagging)
+    assert len(client.get("/products/search", params={"q": "lamp"}).json()) == 20
+    assert client.get("/health/replicas").json()[0] == {
+        "url": replica.snapshot()["url"], "healthy": False, "lag_seconds": replicas.DB_REPLICA_MAX_LAG + 30
+    }
+
+
+def test_round_robin_skips_unhealthy():
+    """Healthy replicas take turns; unhealthy ones are passed over"""
+    first, second, third = (make_replica(f"/tmp/replica-{i}.db") for i in range(3))
+    for replica in (first, second, third):
+        replica.checked_at = time.monotonic()  # skip live health checks
+    third.healthy = False
+    replica_set = replicas.ReplicaSet([first, second, third])
+
+    async def picks():
+        return [await replica_set.choose() for _ in range(4)]
+
+    assert asyncio.run(picks()) == [first, second, first, first]
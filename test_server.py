@@ -0,0 +1,83 @@
+"""
+Tests for the pre-forking production server
+"""
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import pytest
+
+from app import server
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, **env):
+    environment = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{tempfile.mkdtemp()}/server.db",
+        BCRYPT_ROUNDS="4",
+        **env,
+    )
+    return subprocess.Popen(
+        [sys.executable, "-m", "app.server", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", "2", "--graceful-timeout", "5"],
+        cwd=ROOT, env=environment, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_ready(port, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/ready").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.1)
+    pytest.fail("server did not become ready")
+
+
+def test_worker_count_defaults_to_cpus(monkeypatch):
+    """One worker per usable CPU unless WEB_CONCURRENCY says otherwise"""
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    assert server.worker_count() == server.cpu_count() >= 1
+    monkeypatch.setenv("WEB_CONCURRENCY", "3")
+    assert server.worker_count() == 3
+
+
+def test_serves_and_drains_on_sigterm():
+    """Workers share one socket and the supervisor exits cleanly on SIGTERM"""
+    port = free_port()
+    process = start_server(port, DB_CREATE_ALL="true")
+    try:
+        wait_ready(port)
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}") as client:
+            for _ in range(10):
+                assert client.get("/products/").status_code == 200
+        process.send_signal(signal.SIGTERM)
+        assert process.wait(timeout=15) == 0
+    finally:
+        if process.poll() is None:
+            process.kill()
+
+
+def test_exits_when_workers_cannot_start():
+    """An unmigrated database stops the whole server instead of crash-looping"""
+    process = start_server(free_port(), DB_CREATE_ALL="false")
+    try:
+        assert process.wait(timeout=20) == 3
+    finally:
+        if process.poll() is None:
+            process.kill()
@@ -0,0 +1,76 @@
+"""
+Tests for worker startup: schema revision check, warm-up and /ready
+"""
+import asyncio
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app import startup
+from app.database import ASYNC_DATABASE_URL
+
+
+def check_schema():
+    async def run():
+        # own engine: pooled API connections belong to the TestClient's loop
+        check_engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=NullPool)
+        try:
+            await startup.check_schema(check_engine)
+        finally:
+            await check_engine.dispose()
+    asyncio.run(run())
+
+
+def stamp(db, revision):
+    db.execute(text("CREATE TABLE IF NOT EXISTS alembic_version (version_num VARCHAR(32) NOT NULL)"))
+    db.execute(text("DELETE FROM alembic_version"))
+    db.execute(text("INSERT INTO alembic_version VALUES (:revision)"), {"revision": revision})
+    db.commit()
+
+
+def test_schema_check_requires_head_revision(db):
+    """Startup refuses an unmigrated or outdated database and accepts the head"""
+    with pytest.raises(startup.SchemaOutOfDate, match="alembic upgrade head"):
+        check_schema()
+
+    stamp(db, "7585f1246cf1")
+    with pytest.raises(startup.SchemaOutOfDate, match="7585f1246cf1"):
+        check_schema()
+
+    (head,) = startup.expected_heads()
+    stamp(db, head)
+    check_schema()
+    db.execute(text("DROP TABLE alembic_version"))
+    db.commit()
+
+
+def test_ready_after_startup(client):
+    """/ready reports the startup steps once the worker is warm"""
+    response = client.get("/ready")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["ready"] is True
+    assert set(body["startup_ms"]) == {"schema", "pool", "catalog"}
+    assert client.get("/health/pool").json()["idle"] >= startup.DB_WARM_CONNECTIONS
+
+
+def test_not_ready_before_startup(client, monkeypatch):
+    """/ready answers 503 while the worker is not accepting traffic"""
+    monkeypatch.setattr(startup.readiness, "ready", False)
+    assert client.get("/ready").status_code == 503
+    assert client.get("/health").status_code == 200
+
+
+def test_warm_catalog_fills_cache(client, count_queries):
+    """The first catalog page is already rendered when traffic arrives"""
+    with count_queries() as counter:
+        assert client.get("/products/").status_code == 200
+    assert counter.count == 0
+
+
+def test_expected_heads_match_alembic():
+    """Heads read from the scripts agree with Alembic's own revision map"""
+    from alembic.script import ScriptDirectory
+    assert startup.expected_heads() == set(ScriptDirectory(startup.ALEMBIC_SCRIPT_LOCATION).get_heads())